@@ -4,41 +4,73 @@
 FastAPI server for construction robotics patent-grounded design generation.
 """
 
+import time
+IMPORT_STARTED = time.perf_counter()
+
 import os
+import re
 import json
 import logging
 import importlib
+import threading
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Dict, Any, Optional, TYPE_CHECKING, cast
-from pydantic import BaseModel, Field
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import List, Dict, Any, AsyncIterator, Callable, Iterator, Optional, Tuple, TYPE_CHECKING, cast
+from pydantic import BaseModel, Field, ValidationError
 from dotenv import load_dotenv
 import numpy as np
 
-OpenAI = None  # type: ignore[assignment]
-SentenceTransformer = None  # type: ignore[assignment]
-CrossEncoderClass = None  # type: ignore[assignment]
+from serving import (
+    AdmissionController, AdmissionRejected, ComponentTracker, Deadline, LatencyEstimator,
+    MicroBatcher, SingleFlight, request_key
+)
+from model_server import ModelServerClient, RemoteBM25, RemoteEmbeddingModel, RemoteReranker
+from streaming import JSONSectionStream, format_sse
+from bm25_index import BM25Postings
+from telemetry import StageTimer, metrics, observe_stages
+from resilience import CircuitBreaker, CircuitOpenError, ResilientCaller, record_degradation
+from context_builder import ContextPacker, TokenCounter
+from profiling import PROFILE_MODES, MemoryTracker, RequestProfiler
+from query_log import QueryLog
+from vector_store import open_vector_store
+from patent_index import PatentIndex
+from index_snapshot import UNVERSIONED, IndexVersion, SnapshotWatcher, current_snapshot, load_bm25
+import tracing
 
 if TYPE_CHECKING:
-    from fastapi import FastAPI, HTTPException
+    from fastapi import FastAPI, Header, HTTPException, Response
+    from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+    from starlette.background import BackgroundTask
     from fastapi.middleware.cors import CORSMiddleware
-    import chromadb  # noqa: F401
-    from chromadb.config import Settings  # noqa: F401
+    from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
     from sentence_transformers import SentenceTransformer, CrossEncoder  # noqa: F401
-    from rank_bm25 import BM25Okapi  # noqa: F401
     from openai import OpenAI as OpenAIType  # noqa: F401
 else:
     fastapi_module = importlib.import_module("fastapi")
     FastAPI = getattr(fastapi_module, "FastAPI")
     HTTPException = getattr(fastapi_module, "HTTPException")
+    Header = getattr(fastapi_module, "Header")
+    Response = getattr(fastapi_module, "Response")
+    concurrency_module = importlib.import_module("fastapi.concurrency")
+    run_in_threadpool = getattr(concurrency_module, "run_in_threadpool")
+    iterate_in_threadpool = getattr(concurrency_module, "iterate_in_threadpool")
+    BackgroundTask = getattr(importlib.import_module("starlette.background"), "BackgroundTask")
     cors_module = importlib.import_module("fastapi.middleware.cors")
     CORSMiddleware = getattr(cors_module, "CORSMiddleware")
-    chromadb = importlib.import_module("chromadb")
-    Settings = getattr(importlib.import_module("chromadb.config"), "Settings")
-    sentence_transformers_module = importlib.import_module("sentence_transformers")
-    SentenceTransformer = getattr(sentence_transformers_module, "SentenceTransformer")
-    CrossEncoderClass = getattr(sentence_transformers_module, "CrossEncoder", None)
-    OpenAI = getattr(importlib.import_module("openai"), "OpenAI")
-    BM25Okapi = getattr(importlib.import_module("rank_bm25"), "BM25Okapi")
+    responses_module = importlib.import_module("fastapi.responses")
+    JSONResponse = getattr(responses_module, "JSONResponse")
+    StreamingResponse = getattr(responses_module, "StreamingResponse")
+    PlainTextResponse = getattr(responses_module, "PlainTextResponse")
+
+
+def _lazy_attr(module_name: str, attr: str, default: Any = None) -> Any:
+    """Import a heavy dependency on first use and return one of its attributes.
+
+    sentence_transformers (torch) and openai are only
+    needed once the pipeline is built, so they stay out of module import.
+    """
+    return getattr(importlib.import_module(module_name), attr, default)
 
 # Setup logging
 logging.basicConfig(
@@ -51,10 +83,92 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 # Configuration
-DATA_DIR = Path("data")
+DATA_DIR = Path(os.getenv("DATA_DIR", "data"))
 INDEX_DIR = DATA_DIR / "index"
+# Chunk vector store written by ingest.py: chroma, mmap or ivf (see vector_store.py)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma").lower()
+# IVF lists scanned per query by default (more = higher recall, slower); /retrieve can override
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+# With a vector codec (VECTOR_CODEC at ingest), rescore this many x k code-scan candidates with full vectors
+VECTOR_RESCORE = int(os.getenv("VECTOR_RESCORE", "4"))
+# Patent-first vector search: candidate patents looked up in the patent index before scoring
+# their chunks (at least 2 x top_k; 0 = search every chunk). Used with the mmap and ivf stores.
+PATENT_CANDIDATES = int(os.getenv("PATENT_CANDIDATES", "200"))
+# Seconds between checks for a newly published index snapshot (see index_snapshot.py); 0 = load once
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "5"))
 PROMPTS_DIR = Path("prompts")
 
+# Generation model and prompt context budget (tokens of retrieved patent text)
+GENERATION_MODEL = os.getenv("GENERATION_MODEL", "gpt-4o-mini")
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+
+# "single" writes the whole brief in one completion; "parallel" writes the
+# outline (overview + modules) first, then the remaining sections concurrently
+GENERATION_MODE = os.getenv("GENERATION_MODE", "single").lower()
+SECTION_MAX_TOKENS = int(os.getenv("SECTION_MAX_TOKENS", "700"))
+OUTLINE_SECTIONS = ["overview", "modules"]
+DETAIL_SECTIONS = ["actuation", "sensing", "control", "materials", "safety", "procedure", "bom"]
+
+# Load models and run a dummy inference in the background at startup
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+# Cross-request micro-batching for query embedding and reranking
+MICROBATCH_ENABLED = os.getenv("MICROBATCH_ENABLED", "true").lower() == "true"
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", "5"))
+MICROBATCH_EMBED_MAX_BATCH = int(os.getenv("MICROBATCH_EMBED_MAX_BATCH", "64"))
+MICROBATCH_RERANK_MAX_BATCH = int(os.getenv("MICROBATCH_RERANK_MAX_BATCH", "256"))
+
+# Batch design endpoint
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_EMBED_CHUNK = int(os.getenv("BATCH_EMBED_CHUNK", "256"))
+
+# Shared model server (see model_server.py); empty means load models in-process
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")
+
+# OpenAI resilience: per-call deadlines (seconds), hedging and circuit breaking
+OPENAI_EXPANSION_TIMEOUT = float(os.getenv("OPENAI_EXPANSION_TIMEOUT", "8"))
+OPENAI_EMBEDDING_TIMEOUT = float(os.getenv("OPENAI_EMBEDDING_TIMEOUT", "10"))
+OPENAI_CHAT_TIMEOUT = float(os.getenv("OPENAI_CHAT_TIMEOUT", "45"))
+# Hedge expansion/embedding calls slower than this until their p95 is known; 0 disables
+OPENAI_HEDGE_AFTER = float(os.getenv("OPENAI_HEDGE_AFTER", "1.5"))
+# Chat completions are long and billed per token, so they are only retried on failure by default
+OPENAI_HEDGE_CHAT = os.getenv("OPENAI_HEDGE_CHAT", "false").lower() == "true"
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+# Per-request latency budgets: each stage sizes its work to the time left
+DEFAULT_LATENCY_BUDGET_MS = int(os.getenv("DEFAULT_LATENCY_BUDGET_MS", "0"))  # 0 = unlimited
+FAST_GENERATION_MODEL = os.getenv("FAST_GENERATION_MODEL", GENERATION_MODEL)
+FAST_GENERATION_MAX_TOKENS = int(os.getenv("FAST_GENERATION_MAX_TOKENS", "1200"))
+MIN_GENERATION_SECONDS = float(os.getenv("MIN_GENERATION_SECONDS", "3"))
+RETRIEVAL_TOP_K = 50
+MIN_RETRIEVAL_TOP_K = 20
+RERANK_TOP_K = 10
+
+# Add a Server-Timing header with per-stage durations to /design and /retrieve
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+# Opt-in profiling: X-Profile request header on /design and /retrieve, /debug/memory endpoints
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+
+# Opt-in sampled capture of /design and /retrieve requests for replay_queries.py (0 = off)
+QUERY_LOG_SAMPLE_RATE = float(os.getenv("QUERY_LOG_SAMPLE_RATE", "0"))
+QUERY_LOG_FILE = os.getenv("QUERY_LOG_FILE", "data/query_log/queries.jsonl")
+QUERY_LOG_MAX_MB = float(os.getenv("QUERY_LOG_MAX_MB", "50"))
+QUERY_LOG_BACKUPS = int(os.getenv("QUERY_LOG_BACKUPS", "5"))
+
+# Admission control for the design endpoints (per worker process)
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "4"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "15"))
+
+# Request tracing (TRACE_EXPORTER, TRACE_SAMPLE_RATE, TRACE_FILE, OTEL_EXPORTER_OTLP_ENDPOINT)
+tracing.configure_from_env()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Construction Robotics Design Generator",
@@ -69,7 +183,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id", "Server-Timing", "X-Profile-Path"],
 )
+app.add_middleware(tracing.TraceMiddleware)
 
 
 # Request/Response models
@@ -79,6 +195,48 @@ class DesignRequest(BaseModel):
         default=None,
         description="Filters for patent retrieval (cpc, year_min, year_max)"
     )
+    latency_budget_ms: Optional[int] = Field(
+        default=None,
+        ge=100,
+        description="End-to-end latency budget; stages degrade to fit it"
+    )
+
+
+class BatchDesignRequest(BaseModel):
+    requests: List[DesignRequest] = Field(..., description="Design requests to run as one batch")
+    max_concurrency: int = Field(default=4, ge=1, le=32, description="Most concurrent LLM generations; limited to idle admission slots")
+
+
+class RetrieveRequest(BaseModel):
+    prompt: str = Field(..., description="Search query")
+    filters: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="Filters for patent retrieval (cpc, year_min, year_max)"
+    )
+    top_k: int = Field(default=50, ge=1, le=200, description="Candidates kept after fusion")
+    expand: bool = Field(default=True, description="Run LLM multi-query expansion")
+    rerank: bool = Field(default=True, description="Rerank candidates with the cross-encoder")
+    rerank_top_k: int = Field(default=10, ge=1, le=200, description="Results kept after reranking")
+    nprobe: Optional[int] = Field(default=None, ge=1, description="IVF lists to scan (ivf vector store only)")
+
+
+class RetrievedChunk(BaseModel):
+    chunk_id: str
+    patent_number: str
+    section: str
+    title: str
+    text: str
+    score: float
+    rerank_score: Optional[float] = None
+    metadata: Dict[str, Any]
+
+
+class RetrieveResponse(BaseModel):
+    chunks: List[RetrievedChunk]
+    timings_ms: Dict[str, float]
+    cpu_ms: Dict[str, float] = {}
+    counts: Dict[str, Dict[str, int]]
+    total_ms: float
 
 
 class Citation(BaseModel):
@@ -102,84 +260,259 @@ class DesignBrief(BaseModel):
     bom: List[Dict[str, Any]]
     citations: List[Citation]
     figures: Optional[List[str]] = None
+    degradations: Optional[List[str]] = None
 
 
 class DesignGenerator:
     """Handles RAG-based design generation."""
     
-    def __init__(self):
+    def __init__(self, components: Optional[ComponentTracker] = None):
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.openai_client = None
         self.use_openai = self.openai_api_key is not None
+        self.components = components or ComponentTracker()
         
-        # Initialize embedding model
-        if self.use_openai:
-            self.openai_client = OpenAI(api_key=self.openai_api_key)
-            logger.info("Using OpenAI embeddings: text-embedding-3-large")
-        else:
-            logger.info("Using local embeddings: sentence-transformers/all-MiniLM-L6-v2")
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Collapse identical concurrent sub-stage work
+        self.embedding_flight = SingleFlight("embedding")
+        self.rerank_flight = SingleFlight("rerank")
         
-        # Initialize ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path=str(INDEX_DIR),
-            settings=Settings(anonymized_telemetry=False)
-        )
-        try:
-            self.collection = self.chroma_client.get_collection("construction_robotics_patents")
-        except Exception as e:
-            logger.error(f"Collection not found: {e}")
-            logger.error("Please run ingest.py first to create the index")
-            raise
+        # Heavy models and BM25 live in the shared model server when configured
+        self.model_client = None
+        server_info: Dict[str, Any] = {}
+        if MODEL_SERVER_SOCKET:
+            with self.components.track("model_server"):
+                self.model_client = ModelServerClient(MODEL_SERVER_SOCKET)
+                server_info = self.model_client.call("ping")
+                logger.info(f"Using shared model server at {MODEL_SERVER_SOCKET}: {server_info}")
         
-        # Initialize BM25 (will be built from corpus)
-        self.bm25 = None
-        self.corpus_texts = []
-        self.corpus_ids = []
-        self._build_bm25_index()
+        # Initialize embedding model
+        with self.components.track("embedding_model"):
+            if self.use_openai:
+                OpenAI = _lazy_attr("openai", "OpenAI")
+                # Retries are handled by the resilient callers below
+                self.openai_client = OpenAI(api_key=self.openai_api_key, max_retries=0)
+                self._init_upstream_callers()
+                logger.info("Using OpenAI embeddings: text-embedding-3-large")
+            elif self.model_client is not None:
+                self.embedding_model = RemoteEmbeddingModel(self.model_client)
+            else:
+                logger.info("Using local embeddings: sentence-transformers/all-MiniLM-L6-v2")
+                SentenceTransformer = _lazy_attr("sentence_transformers", "SentenceTransformer")
+                self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        
+        # Open the published index snapshot (vector store, patent index, BM25); requests read
+        # self.index once, and the watcher swaps in newer snapshots as ingest.py publishes them
+        name, path = current_snapshot(INDEX_DIR)
+        self.index = self._load_index(name, path, components=self.components)
+        self.previous_index: Optional[IndexVersion] = None
+        self.components.set("index", "ready", **self.index.describe())
+        self.index_watcher = SnapshotWatcher(INDEX_DIR, self.swap_index, loaded=name, interval=INDEX_RELOAD_INTERVAL)
+        self.index_watcher.start()
         
         # Initialize reranker
-        if CrossEncoderClass is not None:
-            try:
-                self.reranker = CrossEncoderClass('BAAI/bge-reranker-large')
-                logger.info("Using BAAI/bge-reranker-large for reranking")
-            except Exception as e:
-                logger.warning(f"Could not load reranker: {e}. Using no reranking.")
-                logger.warning("Install with: pip install sentence-transformers")
+        with self.components.track("reranker"):
+            CrossEncoderClass = None if self.model_client else _lazy_attr("sentence_transformers", "CrossEncoder")
+            if self.model_client is not None:
+                self.reranker = RemoteReranker(self.model_client) if server_info.get("reranker") else None
+            elif CrossEncoderClass is not None:
+                try:
+                    self.reranker = CrossEncoderClass('BAAI/bge-reranker-large')
+                    logger.info("Using BAAI/bge-reranker-large for reranking")
+                except Exception as e:
+                    logger.warning(f"Could not load reranker: {e}. Using no reranking.")
+                    logger.warning("Install with: pip install sentence-transformers")
+                    self.reranker = None
+            else:
+                logger.warning("CrossEncoder not available. Install sentence-transformers for reranking.")
                 self.reranker = None
-        else:
-            logger.warning("CrossEncoder not available. Install sentence-transformers for reranking.")
-            self.reranker = None
+            if self.reranker is None:
+                self.components.set("reranker", "disabled")
+        
+        # Batch embedding and rerank work across concurrent requests
+        # (the model server batches across workers itself)
+        self.embedding_batcher = None
+        self.rerank_batcher = None
+        if MICROBATCH_ENABLED and self.model_client is None:
+            self.embedding_batcher = MicroBatcher(
+                self._compute_embeddings,
+                max_batch=MICROBATCH_EMBED_MAX_BATCH,
+                max_wait_ms=MICROBATCH_MAX_WAIT_MS,
+                name="embedding"
+            )
+            if self.reranker is not None:
+                self.rerank_batcher = MicroBatcher(
+                    lambda pairs: list(self.reranker.predict(pairs)),
+                    max_batch=MICROBATCH_RERANK_MAX_BATCH,
+                    max_wait_ms=MICROBATCH_MAX_WAIT_MS,
+                    name="rerank"
+                )
         
         # Load prompts
         self.system_prompt = self._load_prompt("system.md")
         self.designer_prompt = self._load_prompt("designer.md")
+        self.section_prompt = self._load_prompt("section.md")
+        self.section_specs = self._parse_section_specs(self.designer_prompt)
+        
+        # Pack retrieved passages into a token budget for the generation model
+        self.token_counter = TokenCounter(GENERATION_MODEL)
+        self.context_packer = ContextPacker(
+            self.token_counter,
+            token_budget=CONTEXT_TOKEN_BUDGET,
+            idf=self._term_idf
+        )
+        
+        # Observed stage latencies, used to fit requests into their budget
+        self.latency = LatencyEstimator(self._default_latencies())
     
-    def _build_bm25_index(self):
-        """Build BM25 index from ChromaDB corpus."""
-        logger.info("Building BM25 index...")
-        try:
-            results = self.collection.get()
-            
-            if not results["documents"]:
-                logger.warning("No documents in collection. BM25 index will be empty.")
-                self.corpus_texts = []
-                self.corpus_ids = []
-                self.bm25 = None
-                return
-            
-            self.corpus_texts = results["documents"]
-            self.corpus_ids = results["ids"]
-            
-            # Tokenize for BM25
-            tokenized_corpus = [doc.split() for doc in self.corpus_texts]
-            self.bm25 = BM25Okapi(tokenized_corpus)
-            logger.info(f"Built BM25 index with {len(self.corpus_texts)} documents")
-        except Exception as e:
-            logger.error(f"Error building BM25 index: {e}")
-            self.corpus_texts = []
-            self.corpus_ids = []
-            self.bm25 = None
+    def _default_latencies(self) -> Dict[str, float]:
+        """Stage latency guesses (seconds) used until real ones are observed."""
+        upstream = self.use_openai
+        return {
+            "expansion": 1.5 if upstream else 0.0,
+            "bm25": 0.05,
+            "embedding": 0.4 if upstream else 0.05,
+            "patent_query": 0.01 if self.index.patent_index is not None else 0.0,
+            "vector_query": 0.1,
+            "fusion": 0.01,
+            "doc_fetch": 0.05,
+            "rerank_pair": 0.02 if self.reranker else 0.0,
+            "prompt_build": 0.02,
+            "generation": 20.0 if upstream else 0.01,
+            "generation_fast": 10.0 if upstream else 0.01
+        }
+    
+    def _term_idf(self, term: str) -> float:
+        """IDF from the BM25 index, used to weight query terms when trimming passages."""
+        bm25 = self.index.bm25
+        if isinstance(bm25, BM25Postings):
+            return bm25.idf_of(term) or 1.0
+        return 1.0
+    
+    def warm_up(self):
+        """Run a dummy inference through each local model so first requests are fast."""
+        if not self.use_openai:
+            self.get_embeddings(["construction robot warm-up"])
+        self._warm_index(self.index)
+        if self.reranker is not None:
+            self.reranker.predict([["construction robot", "A robotic arm for bricklaying."]])
+    
+    def _load_index(self, name: str, path: Path, components: Optional[ComponentTracker] = None) -> IndexVersion:
+        """Open one index version: chunk vector store, patent index and BM25 postings."""
+        track = components.track if components is not None else (lambda _: nullcontext())
+        with track("vector_index"):
+            try:
+                options: Dict[str, Any] = {"rescore": VECTOR_RESCORE} if VECTOR_STORE in ("mmap", "ivf") else {}
+                if VECTOR_STORE == "ivf":
+                    options["nprobe"] = IVF_NPROBE
+                vector_store = open_vector_store(VECTOR_STORE, path, **options)
+                patent_index = None
+                if PATENT_CANDIDATES > 0 and VECTOR_STORE != "chroma" and PatentIndex.exists(path):
+                    patent_index = PatentIndex(path)
+                    logger.info(f"Patent-first vector search over {patent_index.store.count()} patent vectors")
+            except Exception as e:
+                logger.error(f"Vector index not found ({VECTOR_STORE}, {path}): {e}")
+                logger.error("Please run ingest.py first to create the index")
+                raise
+        
+        with track("bm25_index"):
+            bm25, corpus_ids = self._load_bm25(name, path, vector_store)
+            if components is not None:
+                components.set("bm25_index", "ready" if bm25 else "disabled", documents=len(corpus_ids))
+        return IndexVersion(name, path, vector_store, patent_index=patent_index, bm25=bm25, corpus_ids=corpus_ids)
+    
+    def _load_bm25(self, name: str, path: Path, vector_store: Any) -> Tuple[Any, List[str]]:
+        """BM25 postings and corpus ids of an index version, from the model server when one is configured."""
+        if self.model_client is not None:
+            info = self.model_client.call("load_index", name)
+            if not info.get("bm25_documents"):
+                return None, []
+            return RemoteBM25(self.model_client, version=name), self.model_client.call("corpus_ids", name)
+        return load_bm25(path, lambda: vector_store, versioned=name != UNVERSIONED)
+    
+    @staticmethod
+    def _warm_index(index: IndexVersion):
+        """Touch the lazily built parts of an index version (BM25 pages, filter columns)."""
+        if index.bm25 is not None:
+            index.bm25.get_scores(["construction", "robot"])
+        store_filter = getattr(index.vector_store, "filter", None)
+        if store_filter is not None:
+            for field in ("cpc", "year"):
+                store_filter.column(field)
+            if index.patent_index is not None:
+                store_filter.postings("patent_number")
+    
+    def swap_index(self, name: str, path: Path):
+        """Load a newly published index version and switch new requests over to it.
+        
+        Runs on the watcher thread, the only writer. Requests in flight keep the
+        IndexVersion they started with; the replaced version stays loaded as
+        previous_index, so rolling CURRENT back to it switches instantly.
+        """
+        if self.previous_index is not None and self.previous_index.name == name:
+            index = self.previous_index
+        else:
+            start = time.perf_counter()
+            index = self._load_index(name, path)
+            self._warm_index(index)
+            logger.info(f"Loaded index snapshot {name} in {time.perf_counter() - start:.2f}s")
+        self.previous_index, self.index = self.index, index
+        self.components.set("index", "ready", **index.describe(), previous=self.previous_index.name)
+        logger.info(f"Serving index snapshot {name} (previous: {self.previous_index.name})")
+    
+    def _init_upstream_callers(self):
+        """Deadline, hedging and circuit breaker per kind of OpenAI call."""
+        hedge_after = OPENAI_HEDGE_AFTER or None
+        
+        def caller(operation: str, timeout: float, hedge: Optional[float]) -> ResilientCaller:
+            breaker = CircuitBreaker(
+                f"openai_{operation}",
+                failure_rate=BREAKER_FAILURE_RATE,
+                slow_call_rate=BREAKER_SLOW_CALL_RATE,
+                slow_call_seconds=0.75 * timeout,
+                open_seconds=BREAKER_OPEN_SECONDS
+            )
+            return ResilientCaller(operation, breaker, timeout=timeout, hedge_after=hedge)
+        
+        self.expansion_caller = caller("expansion", OPENAI_EXPANSION_TIMEOUT, hedge_after)
+        self.embedding_caller = caller("embedding", OPENAI_EMBEDDING_TIMEOUT, hedge_after)
+        self.chat_caller = caller("chat", OPENAI_CHAT_TIMEOUT, hedge_after if OPENAI_HEDGE_CHAT else None)
+    
+    def upstream_status(self) -> Dict[str, Any]:
+        """Breaker state of each OpenAI call type (empty without OpenAI)."""
+        if not self.openai_client:
+            return {}
+        return {
+            caller.operation: caller.snapshot()
+            for caller in (self.expansion_caller, self.embedding_caller, self.chat_caller)
+        }
+    
+    def _chat(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        model: str = GENERATION_MODEL,
+        deadline: Optional[Deadline] = None,
+        **kwargs: Any
+    ) -> Any:
+        """Chat completion through the chat circuit breaker with a per-call deadline."""
+        return self.chat_caller.call(
+            lambda timeout: self.openai_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                **kwargs
+            ),
+            timeout=max(deadline.remaining(), 0.1) if deadline else None
+        )
+    
+    @staticmethod
+    def _degrade(deadline: Optional[Deadline], step: str, reason: str = "deadline"):
+        """Note a degradation on the request (when it has a deadline) and in metrics."""
+        if deadline is not None:
+            deadline.degrade(step)
+        record_degradation(step, reason)
     
     def _load_prompt(self, filename: str) -> str:
         """Load prompt from file."""
@@ -191,18 +524,45 @@ class DesignGenerator:
             logger.warning(f"Prompt file not found: {prompt_path}. Using default.")
             return ""
     
+    @staticmethod
+    def _parse_section_specs(designer_prompt: str) -> Dict[str, str]:
+        """Per-section requirement text from the numbered list in designer.md."""
+        specs = {}
+        pattern = re.compile(r"^\d+\. (\*\*(\w+)\*\*:.*?)(?=^\d+\. \*\*|^## |\Z)", re.MULTILINE | re.DOTALL)
+        for match in pattern.finditer(designer_prompt):
+            specs[match.group(2).lower()] = match.group(1).strip()
+        return specs
+    
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Get embeddings for texts."""
+        """Get embeddings for texts, sharing identical in-flight requests."""
+        return self.embedding_flight.do(tuple(texts), lambda: self._embed(texts))
+    
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, going through the micro-batcher when enabled."""
+        if self.embedding_batcher is not None:
+            return self.embedding_batcher.submit(texts)
+        return self._compute_embeddings(texts)
+    
+    def _compute_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Compute embeddings for texts."""
         if self.use_openai and self.openai_client:
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-3-large",
-                input=texts
+            response = self.embedding_caller.call(
+                lambda timeout: self.openai_client.embeddings.create(
+                    model="text-embedding-3-large",
+                    input=texts,
+                    timeout=timeout
+                )
             )
             return [item.embedding for item in response.data]
         else:
             return self.embedding_model.encode(texts, show_progress_bar=False).tolist()
     
-    def multi_query_expansion(self, query: str, num_queries: int = 3) -> List[str]:
+    def multi_query_expansion(
+        self,
+        query: str,
+        num_queries: int = 3,
+        deadline: Optional[Deadline] = None
+    ) -> List[str]:
         """Generate multiple query variations."""
         if not self.use_openai or not self.openai_client:
             # Simple expansion: return original query
@@ -216,78 +576,250 @@ Original query: {query}
 
 Generate {num_queries} diverse queries:"""
             
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a search query generator. Generate diverse search queries."},
-                    {"role": "user", "content": expansion_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=200
+            response = self.expansion_caller.call(
+                lambda timeout: self.openai_client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[
+                        {"role": "system", "content": "You are a search query generator. Generate diverse search queries."},
+                        {"role": "user", "content": expansion_prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=200,
+                    timeout=timeout
+                ),
+                timeout=max(deadline.remaining(), 0.1) if deadline else None
             )
             
             expanded_queries = response.choices[0].message.content.strip().split("\n")
             expanded_queries = [q.strip("- ").strip() for q in expanded_queries if q.strip()]
             return [query] + expanded_queries[:num_queries]
+        except CircuitOpenError:
+            self._degrade(deadline, "expansion_skipped", "circuit_open")
+            return [query]
         except Exception as e:
             logger.warning(f"Query expansion failed: {e}. Using original query.")
+            self._degrade(deadline, "expansion_skipped", "upstream_error")
             return [query]
     
     def hybrid_retrieve(
         self,
         query: str,
         filters: Optional[Dict[str, Any]] = None,
-        top_k: int = 50
+        top_k: int = 50,
+        expand: bool = True,
+        timer: Optional[StageTimer] = None,
+        deadline: Optional[Deadline] = None,
+        nprobe: Optional[int] = None
     ) -> List[Dict[str, Any]]:
-        """Hybrid retrieval: BM25 + Vector search."""
+        """Hybrid retrieval: BM25 + Vector search (nprobe tunes the ivf backend)."""
+        timer = timer or StageTimer()
+        # One index version for the whole request, even if a new snapshot is swapped in meanwhile
+        index = self.index
+        
         # Multi-query expansion
-        queries = self.multi_query_expansion(query, num_queries=3)
+        with timer.stage("expansion"):
+            queries = self.multi_query_expansion(query, num_queries=3, deadline=deadline) if expand else [query]
+        timer.count("expansion", queries=len(queries))
         
         # BM25 retrieval
-        bm25_scores = {}
-        if self.bm25 and self.corpus_ids:
-            for q in queries:
-                tokenized_query = q.split()
-                try:
-                    scores = self.bm25.get_scores(tokenized_query)
-                    for idx, score in enumerate(scores):
-                        if idx < len(self.corpus_ids):
-                            doc_id = self.corpus_ids[idx]
-                            if doc_id not in bm25_scores:
-                                bm25_scores[doc_id] = 0
-                            bm25_scores[doc_id] += score
-                except Exception as e:
-                    logger.warning(f"BM25 retrieval failed: {e}")
-                    break
+        with timer.stage("bm25"):
+            bm25_scores = self._bm25_scores(index, [queries])[0]
         
         # Vector retrieval
         try:
-            query_embeddings = self.get_embeddings(queries)
-            avg_embedding = np.mean(query_embeddings, axis=0).tolist()
-            
-            # Build where clause for filters
-            where_clause = {}
-            if filters:
-                if "cpc" in filters:
-                    where_clause["cpc"] = {"$in": filters["cpc"]}
-                if "year_min" in filters:
-                    where_clause["year"] = {"$gte": str(filters["year_min"])}
-                if "year_max" in filters:
-                    if "year" in where_clause:
-                        where_clause["year"]["$lte"] = str(filters["year_max"])
-                    else:
-                        where_clause["year"] = {"$lte": str(filters["year_max"])}
+            with timer.stage("embedding"):
+                query_embeddings = self.get_embeddings(queries)
+                avg_embedding = np.mean(query_embeddings, axis=0).tolist()
+            where_clause = self._build_where(filters)
+            if index.patent_index is not None:
+                with timer.stage("patent_query"):
+                    where_clause = self._restrict_to_patents(index, avg_embedding, where_clause, top_k)
             
             # Vector search
-            vector_results = self.collection.query(
-                query_embeddings=[avg_embedding],
-                n_results=top_k * 2,  # Get more for filtering
-                where=where_clause if where_clause else None
-            )
+            with timer.stage("vector_query"):
+                with tracing.span("vector_store.query", backend=VECTOR_STORE, index=index.name, n_results=top_k * 2, queries=1):
+                    vector_results = index.vector_store.query(
+                        query_embeddings=[avg_embedding],
+                        n_results=top_k * 2,  # Get more for filtering
+                        where=where_clause,
+                        nprobe=nprobe
+                    )
+            timer.count("vector_query", candidates=len(vector_results["ids"][0]) if vector_results["ids"] else 0)
+        except CircuitOpenError:
+            # Local embeddings can't query an index built with OpenAI's, so fall back to BM25 only
+            self._degrade(deadline, "vector_search_skipped", "circuit_open")
+            vector_results = {"ids": [[]], "distances": [[]], "documents": [[]], "metadatas": [[]]}
         except Exception as e:
             logger.error(f"Vector retrieval failed: {e}")
             vector_results = {"ids": [[]], "distances": [[]], "documents": [[]], "metadatas": [[]]}
         
+        return self._fuse_results(index, bm25_scores, vector_results, top_k, timer=timer)
+    
+    def hybrid_retrieve_batch(
+        self,
+        prompts: List[str],
+        filters_list: List[Optional[Dict[str, Any]]],
+        top_k: int = 50,
+        max_workers: int = 4
+    ) -> List[List[Dict[str, Any]]]:
+        """Hybrid retrieval for many prompts, sharing embedding, BM25 and vector calls."""
+        index = self.index
+        # Query expansion is one LLM call per prompt; run them side by side
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            expand = tracing.bind(lambda p: self.multi_query_expansion(p, num_queries=3))
+            query_sets = list(pool.map(expand, prompts))
+        
+        # BM25: every query of every prompt scored in one matrix operation
+        bm25_per_prompt = self._bm25_scores(index, query_sets)
+        
+        # Vector: one embedding pass for all queries, one vector store query per distinct filter
+        empty_results = {"ids": [[]], "distances": [[]]}
+        vector_per_prompt: List[Dict[str, Any]] = [empty_results for _ in prompts]
+        try:
+            flat_queries = [q for queries in query_sets for q in queries]
+            flat_embeddings: List[List[float]] = []
+            for i in range(0, len(flat_queries), BATCH_EMBED_CHUNK):
+                flat_embeddings.extend(self._compute_embeddings(flat_queries[i:i + BATCH_EMBED_CHUNK]))
+            avg_embeddings = []
+            offset = 0
+            for queries in query_sets:
+                avg_embeddings.append(np.mean(flat_embeddings[offset:offset + len(queries)], axis=0).tolist())
+                offset += len(queries)
+        except CircuitOpenError:
+            self._degrade(None, "vector_search_skipped", "circuit_open")
+            avg_embeddings = []
+        except Exception as e:
+            logger.error(f"Batch embedding failed: {e}")
+            avg_embeddings = []
+        
+        groups: Dict[str, List[int]] = {}
+        for idx in range(len(avg_embeddings)):
+            where_clause = self._build_where(filters_list[idx])
+            if index.patent_index is not None:
+                where_clause = self._restrict_to_patents(index, avg_embeddings[idx], where_clause, top_k)
+            groups.setdefault(json.dumps(where_clause, sort_keys=True), []).append(idx)
+        for where_json, indices in groups.items():
+            try:
+                with tracing.span("vector_store.query", backend=VECTOR_STORE, index=index.name, n_results=top_k * 2,
+                                  queries=len(indices)):
+                    results = index.vector_store.query(
+                        query_embeddings=[avg_embeddings[idx] for idx in indices],
+                        n_results=top_k * 2,
+                        where=json.loads(where_json)
+                    )
+                for row, idx in enumerate(indices):
+                    vector_per_prompt[idx] = {"ids": [results["ids"][row]], "distances": [results["distances"][row]]}
+            except Exception as e:
+                logger.error(f"Vector retrieval failed for {len(indices)} prompt(s): {e}")
+        
+        return [
+            self._fuse_results(index, bm25_per_prompt[idx], vector_per_prompt[idx], top_k)
+            for idx in range(len(prompts))
+        ]
+    
+    @staticmethod
+    def _restrict_to_patents(
+        index: IndexVersion,
+        embedding: List[float],
+        where: Optional[Dict[str, Any]],
+        top_k: int
+    ) -> Dict[str, Any]:
+        """Narrow the chunk query to the nearest patents in the patent index."""
+        n_patents = max(PATENT_CANDIDATES, 2 * top_k)
+        with tracing.span("patent_index.query", n_patents=n_patents):
+            patents = index.patent_index.candidates(embedding, n_patents, where)
+        return PatentIndex.restrict(where, patents)
+    
+    @staticmethod
+    def _build_where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Build the Chroma-style where clause for request filters."""
+        where_clause: Dict[str, Any] = {}
+        if filters:
+            if "cpc" in filters:
+                where_clause["cpc"] = {"$in": filters["cpc"]}
+            if "year_min" in filters:
+                where_clause["year"] = {"$gte": str(filters["year_min"])}
+            if "year_max" in filters:
+                if "year" in where_clause:
+                    where_clause["year"]["$lte"] = str(filters["year_max"])
+                else:
+                    where_clause["year"] = {"$lte": str(filters["year_max"])}
+        return where_clause if where_clause else None
+    
+    @staticmethod
+    def _bm25_scores(index: IndexVersion, query_sets: List[List[str]]) -> List[Dict[str, float]]:
+        """BM25 scores per corpus id of one index version, summed over each set of queries."""
+        if not (index.bm25 and index.corpus_ids):
+            return [{} for _ in query_sets]
+        try:
+            matrix = index.bm25.get_scores_matrix([q.split() for queries in query_sets for q in queries])
+        except Exception as e:
+            logger.warning(f"BM25 retrieval failed: {e}")
+            return [{} for _ in query_sets]
+        
+        results = []
+        row = 0
+        for queries in query_sets:
+            summed = np.asarray(matrix[row:row + len(queries)]).sum(axis=0)
+            row += len(queries)
+            results.append(dict(zip(index.corpus_ids, summed.tolist())))
+        return results
+    
+    def _fuse_results(
+        self,
+        index: IndexVersion,
+        bm25_scores: Dict[str, float],
+        vector_results: Dict[str, Any],
+        top_k: int,
+        timer: Optional[StageTimer] = None
+    ) -> List[Dict[str, Any]]:
+        """Fuse BM25 and vector scores, fetch the top documents and dedupe by patent."""
+        timer = timer or StageTimer()
+        with timer.stage("fusion"):
+            sorted_ids = self._fuse_scores(bm25_scores, vector_results, top_k)
+        timer.count("fusion", candidates=len(sorted_ids))
+        if not sorted_ids:
+            return []
+        
+        # Retrieve documents
+        retrieved_docs = []
+        retrieved_ids = [doc_id for doc_id, _ in sorted_ids]
+        
+        # Get documents from the store (results are not guaranteed to follow the id order)
+        with timer.stage("doc_fetch"):
+            with tracing.span("vector_store.get", backend=VECTOR_STORE, index=index.name, ids=len(retrieved_ids)):
+                results = index.vector_store.get(ids=retrieved_ids)
+        positions = {doc_id: idx for idx, doc_id in enumerate(results["ids"])}
+        
+        for doc_id, score in sorted_ids:
+            idx = positions.get(doc_id)
+            if idx is None:
+                continue
+            retrieved_docs.append({
+                "chunk_id": doc_id,
+                "text": results["documents"][idx],
+                "metadata": results["metadatas"][idx],
+                "score": score
+            })
+        
+        # Dedupe by patent_number
+        seen_patents = set()
+        deduped_docs = []
+        for doc in retrieved_docs:
+            patent_num = doc["metadata"]["patent_number"]
+            if patent_num not in seen_patents:
+                seen_patents.add(patent_num)
+                deduped_docs.append(doc)
+        
+        return deduped_docs[:top_k]
+    
+    @staticmethod
+    def _fuse_scores(
+        bm25_scores: Dict[str, float],
+        vector_results: Dict[str, Any],
+        top_k: int
+    ) -> List[Tuple[str, float]]:
+        """Weighted fusion of min-max normalized BM25 and vector scores; best top_k ids."""
         # Combine scores
         combined_scores = {}
         if vector_results["ids"] and len(vector_results["ids"][0]) > 0:
@@ -341,49 +873,43 @@ Generate {num_queries} diverse queries:"""
                 return []
         
         # Get top K
-        sorted_ids = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
-        
-        # Retrieve documents
-        retrieved_docs = []
-        retrieved_ids = [doc_id for doc_id, _ in sorted_ids]
-        
-        # Get documents from ChromaDB
-        results = self.collection.get(ids=retrieved_ids)
-        
-        for doc_id, score in sorted_ids:
-            idx = retrieved_ids.index(doc_id)
-            retrieved_docs.append({
-                "chunk_id": doc_id,
-                "text": results["documents"][idx],
-                "metadata": results["metadatas"][idx],
-                "score": score
-            })
-        
-        # Dedupe by patent_number
-        seen_patents = set()
-        deduped_docs = []
-        for doc in retrieved_docs:
-            patent_num = doc["metadata"]["patent_number"]
-            if patent_num not in seen_patents:
-                seen_patents.add(patent_num)
-                deduped_docs.append(doc)
-        
-        return deduped_docs[:top_k]
+        return sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
     
-    def rerank(self, query: str, documents: List[Dict[str, Any]], top_k: int = 10) -> List[Dict[str, Any]]:
+    def rerank(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]],
+        top_k: int = 10,
+        timer: Optional[StageTimer] = None
+    ) -> List[Dict[str, Any]]:
         """Rerank documents using cross-encoder."""
         if not self.reranker or len(documents) == 0:
             return documents[:top_k]
         
+        timer = timer or StageTimer()
+        key = (query, tuple(doc["chunk_id"] for doc in documents), top_k)
+        with timer.stage("rerank"):
+            tracing.set_attributes(pairs=len(documents), max_chars=max(len(doc["text"]) for doc in documents))
+            reranked = self.rerank_flight.do(key, lambda: self._rerank(query, documents, top_k))
+        timer.count("rerank", pairs=len(documents))
+        return reranked
+    
+    def _rerank(self, query: str, documents: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """Score query/document pairs with the cross-encoder and keep the best."""
         try:
             # Prepare pairs for reranking
             pairs = [[query, doc["text"]] for doc in documents]
             
             # Rerank
-            scores = self.reranker.predict(pairs)
+            if self.rerank_batcher is not None:
+                scores = self.rerank_batcher.submit(pairs)
+            else:
+                scores = self.reranker.predict(pairs)
             
             # Sort by score
             scored_docs = [(doc, score) for doc, score in zip(documents, scores)]
+            for doc, score in scored_docs:
+                doc["rerank_score"] = float(score)
             scored_docs.sort(key=lambda x: x[1], reverse=True)
             
             return [doc for doc, _ in scored_docs[:top_k]]
@@ -391,29 +917,69 @@ Generate {num_queries} diverse queries:"""
             logger.warning(f"Reranking failed: {e}. Returning original documents.")
             return documents[:top_k]
     
-    def generate_design(
+    def rerank_batch(
+        self,
+        queries: List[str],
+        document_lists: List[List[Dict[str, Any]]],
+        top_k: int = 10
+    ) -> List[List[Dict[str, Any]]]:
+        """Rerank candidates for many queries with one shared cross-encoder pass."""
+        if not self.reranker:
+            return [documents[:top_k] for documents in document_lists]
+        
+        pairs = [[query, doc["text"]] for query, documents in zip(queries, document_lists) for doc in documents]
+        try:
+            scores = list(self.reranker.predict(pairs)) if pairs else []
+        except Exception as e:
+            logger.warning(f"Batch reranking failed: {e}. Returning original documents.")
+            return [documents[:top_k] for documents in document_lists]
+        
+        reranked = []
+        offset = 0
+        for documents in document_lists:
+            scored_docs = list(zip(documents, scores[offset:offset + len(documents)]))
+            offset += len(documents)
+            for doc, score in scored_docs:
+                doc["rerank_score"] = float(score)
+            scored_docs.sort(key=lambda x: x[1], reverse=True)
+            reranked.append([doc for doc, _ in scored_docs[:top_k]])
+        return reranked
+    
+    @staticmethod
+    def _citation_header(doc: Dict[str, Any]) -> str:
+        """Citation label that precedes a passage in the LLM context."""
+        patent_num = doc["metadata"]["patent_number"]
+        section = doc["metadata"]["section"]
+        claim_no = doc["metadata"].get("claim_no", "")
+        
+        citation_key = f"US{patent_num}"
+        if claim_no:
+            citation_key += f", {section}, claim_{claim_no}"
+        else:
+            citation_key += f", {section}"
+        return f"[{citation_key}]"
+    
+    def build_context(
         self,
         prompt: str,
-        retrieved_docs: List[Dict[str, Any]]
-    ) -> Dict[str, Any]:
-        """Generate design brief using LLM."""
-        # Build context from retrieved documents
+        retrieved_docs: List[Dict[str, Any]],
+        timer: Optional[StageTimer] = None,
+        token_budget: Optional[int] = None
+    ) -> Tuple[str, List[Dict[str, Any]], List[str]]:
+        """Build token-budgeted LLM context, citations and figure list from retrieved documents."""
+        timer = timer or StageTimer()
         context_parts = []
         citations_map: Dict[str, Dict[str, Any]] = {}
         figure_paths: List[str] = []
         
-        for doc in retrieved_docs:
+        packed, stats = self.context_packer.pack(
+            prompt, retrieved_docs, self._citation_header, token_budget=token_budget
+        )
+        timer.count("prompt_build", context_tokens=stats["context_tokens"], trimmed=stats["trimmed"])
+        
+        for doc, text in packed:
             patent_num = doc["metadata"]["patent_number"]
-            section = doc["metadata"]["section"]
-            claim_no = doc["metadata"].get("claim_no", "")
-            
-            citation_key = f"US{patent_num}"
-            if claim_no:
-                citation_key += f", {section}, claim_{claim_no}"
-            else:
-                citation_key += f", {section}"
-            
-            context_parts.append(f"[{citation_key}]\n{doc['text']}")
+            context_parts.append(f"{self._citation_header(doc)}\n{text}")
             if patent_num not in citations_map:
                 citations_map[patent_num] = {
                     "patent_number": f"US{patent_num}",
@@ -428,55 +994,379 @@ Generate {num_queries} diverse queries:"""
                 if figure_path not in figure_paths:
                     figure_paths.append(figure_path)
         
-        context = "\n\n".join(context_parts)
+        return "\n\n".join(context_parts), list(citations_map.values()), figure_paths
+    
+    def build_prompt(
+        self,
+        prompt: str,
+        retrieved_docs: List[Dict[str, Any]],
+        timer: Optional[StageTimer] = None,
+        token_budget: Optional[int] = None
+    ) -> Tuple[str, List[Dict[str, Any]], List[str]]:
+        """Build the full designer prompt; logs its token count."""
+        timer = timer or StageTimer()
+        token_budget = token_budget or CONTEXT_TOKEN_BUDGET
+        with timer.stage("prompt_build"):
+            context, citations, figure_paths = self.build_context(
+                prompt, retrieved_docs, timer=timer, token_budget=token_budget
+            )
+            full_prompt = self.designer_prompt.format(
+                user_prompt=prompt,
+                context=context
+            )
+            prompt_tokens = self.token_counter.count(self.system_prompt) + self.token_counter.count(full_prompt)
+        timer.count("prompt_build", prompt_tokens=prompt_tokens)
+        logger.info(
+            f"Prompt tokens: {prompt_tokens} (context budget {token_budget}, "
+            f"{len(citations)} patents cited from {len(retrieved_docs)} passages)"
+        )
+        return full_prompt, citations, figure_paths
+    
+    def generate_design(
+        self,
+        prompt: str,
+        retrieved_docs: List[Dict[str, Any]],
+        timer: Optional[StageTimer] = None,
+        mode: Optional[str] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """Generate design brief using LLM, in one completion or section by section."""
+        timer = timer or StageTimer()
+        plan = self._generation_plan(deadline)
+        if plan is None:
+            # Not enough time left for any completion
+            _, citations, figure_paths = self.build_context(prompt, retrieved_docs, timer=timer)
+            design_json = self._generate_mock_design_json(prompt, retrieved_docs)
+            return self._attach_citations(design_json, citations, figure_paths)
+        if (mode or GENERATION_MODE) == "parallel" and plan["stage"] == "generation" and self.use_openai and self.openai_client:
+            return self._generate_design_parallel(prompt, retrieved_docs, timer, plan, deadline)
         
-        # Build full prompt
-        full_prompt = self.designer_prompt.format(
-            user_prompt=prompt,
-            context=context
+        # Build token-budgeted prompt from retrieved documents
+        full_prompt, citations, figure_paths = self.build_prompt(
+            prompt, retrieved_docs, timer=timer, token_budget=plan["token_budget"]
         )
         
         # Generate design
-        if self.use_openai and self.openai_client:
+        with timer.stage("generation"):
+            if self.use_openai and self.openai_client:
+                try:
+                    start = time.perf_counter()
+                    response = self._chat(
+                        [
+                            {"role": "system", "content": self.system_prompt},
+                            {"role": "user", "content": full_prompt}
+                        ],
+                        max_tokens=plan["max_tokens"],
+                        model=plan["model"],
+                        deadline=deadline
+                    )
+                    self.latency.observe(plan["stage"], time.perf_counter() - start)
+                    self._count_usage(timer, response)
+                    design_text = response.choices[0].message.content
+                except CircuitOpenError:
+                    self._degrade(deadline, "generation_fallback", "circuit_open")
+                    design_text = self._generate_mock_design(prompt, retrieved_docs)
+                except Exception as e:
+                    logger.error(f"OpenAI API error: {e}")
+                    self._degrade(deadline, "generation_fallback", "upstream_error")
+                    design_text = self._generate_mock_design(prompt, retrieved_docs)
+            else:
+                # Fallback: mock design
+                design_text = self._generate_mock_design(prompt, retrieved_docs)
+        
+        with timer.stage("parse"):
+            design_json = self.parse_design_text(design_text, prompt, retrieved_docs)
+        return self._attach_citations(design_json, citations, figure_paths)
+    
+    @staticmethod
+    def _count_usage(timer: StageTimer, response: Any):
+        """Record the completion's token usage on the generation stage."""
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            tracing.set_attributes(
+                input_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                output_tokens=getattr(usage, "completion_tokens", 0) or 0
+            )
+            timer.count(
+                "generation",
+                input_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                output_tokens=getattr(usage, "completion_tokens", 0) or 0
+            )
+    
+    def _generation_plan(self, deadline: Optional[Deadline]) -> Optional[Dict[str, Any]]:
+        """Model, output cap and context budget that fit the time left; None means use the template design."""
+        full = {
+            "stage": "generation",
+            "model": GENERATION_MODEL,
+            "max_tokens": 2000,
+            "token_budget": CONTEXT_TOKEN_BUDGET
+        }
+        if deadline is None or not (self.use_openai and self.openai_client):
+            return full
+        remaining = deadline.remaining()
+        if remaining >= self.latency.estimate("generation"):
+            return full
+        if remaining >= MIN_GENERATION_SECONDS:
+            self._degrade(deadline, "generation_fast")
+            return {
+                "stage": "generation_fast",
+                "model": FAST_GENERATION_MODEL,
+                "max_tokens": FAST_GENERATION_MAX_TOKENS,
+                "token_budget": CONTEXT_TOKEN_BUDGET // 2
+            }
+        self._degrade(deadline, "generation_skipped")
+        return None
+    
+    def _generate_design_parallel(
+        self,
+        prompt: str,
+        retrieved_docs: List[Dict[str, Any]],
+        timer: StageTimer,
+        plan: Dict[str, Any],
+        deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """Write the outline first, then the remaining sections concurrently.
+        
+        Every sub-request shares the same packed context; detail sections also
+        see the outline so the brief stays consistent. Sections that fail, are
+        still pending when the deadline expires, or do not validate against
+        DesignBrief are filled from the fallback design.
+        """
+        with timer.stage("prompt_build"):
+            context, citations, figure_paths = self.build_context(prompt, retrieved_docs, timer=timer)
+        
+        with timer.stage("generation"):
+            start = time.perf_counter()
+            design_json = self._complete_sections(prompt, context, OUTLINE_SECTIONS, None, timer, plan, deadline)
+            outline = json.dumps({key: design_json.get(key) for key in OUTLINE_SECTIONS}, indent=2)
+            pool = ThreadPoolExecutor(max_workers=len(DETAIL_SECTIONS))
             try:
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
+                futures = {
+                    pool.submit(
+                        tracing.bind(self._complete_sections), prompt, context, [section], outline, timer, plan, deadline
+                    ): section
+                    for section in DETAIL_SECTIONS
+                }
+                done, pending = wait(futures, timeout=max(deadline.remaining(), 0.0) if deadline else None)
+                for future in done:
+                    design_json.update(future.result())
+                if pending:
+                    # Out of time: don't wait for the stragglers, their sections come from the template
+                    logger.warning(f"Deadline reached with sections pending: {', '.join(futures[f] for f in pending)}")
+                    self._degrade(deadline, "generation_fallback")
+                else:
+                    # Outline plus the slowest section: what a deadline has to leave for generation
+                    self.latency.observe(plan["stage"], time.perf_counter() - start)
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+        timer.count("generation", requests=1 + len(DETAIL_SECTIONS))
+        
+        design_json = self._validate_sections(design_json, prompt, retrieved_docs)
+        return self._attach_citations(design_json, citations, figure_paths)
+    
+    def _complete_sections(
+        self,
+        prompt: str,
+        context: str,
+        sections: List[str],
+        outline: Optional[str],
+        timer: StageTimer,
+        plan: Dict[str, Any],
+        deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """Ask the LLM for some sections of the brief within the plan and deadline; returns {} on failure."""
+        requirements = "\n\n".join(
+            f"{number}. {self.section_specs.get(section, f'**{section.title()}**')}"
+            for number, section in enumerate(sections, 1)
+        )
+        section_prompt = self.section_prompt.format(
+            user_prompt=prompt,
+            context=context,
+            outline=outline or "Not written yet: you are writing the outline.",
+            requirements=requirements,
+            keys=", ".join(f'"{section}"' for section in sections)
+        )
+        timer.count(
+            "prompt_build",
+            prompt_tokens=self.token_counter.count(self.system_prompt) + self.token_counter.count(section_prompt)
+        )
+        try:
+            with tracing.span("section", sections=",".join(sections)):
+                response = self._chat(
+                    [
                         {"role": "system", "content": self.system_prompt},
-                        {"role": "user", "content": full_prompt}
+                        {"role": "user", "content": section_prompt}
                     ],
-                    temperature=0.7,
-                    max_tokens=2000
+                    max_tokens=min(SECTION_MAX_TOKENS, plan["max_tokens"]),
+                    model=plan["model"],
+                    deadline=deadline,
+                    response_format={"type": "json_object"}
                 )
-                design_text = response.choices[0].message.content
-            except Exception as e:
-                logger.error(f"OpenAI API error: {e}")
-                design_text = self._generate_mock_design(prompt, retrieved_docs)
-        else:
-            # Fallback: mock design
-            design_text = self._generate_mock_design(prompt, retrieved_docs)
-        
-        # Parse JSON from response
+            self._count_usage(timer, response)
+            parsed = json.loads(self._extract_json(response.choices[0].message.content))
+        except CircuitOpenError:
+            self._degrade(deadline, "generation_fallback", "circuit_open")
+            return {}
+        except Exception as e:
+            logger.error(f"Section generation failed for {sections}: {e}")
+            self._degrade(deadline, "generation_fallback", "upstream_error")
+            return {}
+        return {section: parsed[section] for section in sections if section in parsed}
+    
+    def _validate_sections(
+        self,
+        design_json: Dict[str, Any],
+        prompt: str,
+        retrieved_docs: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Replace missing or invalid sections with the fallback design's."""
+        fallback = self._generate_mock_design_json(prompt, retrieved_docs)
+        replaced = [section for section in OUTLINE_SECTIONS + DETAIL_SECTIONS if section not in design_json]
+        for section in replaced:
+            design_json[section] = fallback[section]
         try:
-            # Extract JSON from markdown code block if present
-            if "```json" in design_text:
-                design_text = design_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in design_text:
-                design_text = design_text.split("```")[1].split("```")[0].strip()
-            
-            design_json = json.loads(design_text)
+            DesignBrief(**{**design_json, "citations": []})
+        except ValidationError as e:
+            for error in e.errors():
+                section = error["loc"][0] if error["loc"] else None
+                if section in fallback and section not in replaced:
+                    design_json[section] = fallback[section]
+                    replaced.append(section)
+        if replaced:
+            logger.warning(f"Using fallback content for sections: {', '.join(replaced)}")
+        return design_json
+    
+    def parse_design_text(
+        self,
+        design_text: str,
+        prompt: str,
+        retrieved_docs: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Parse the LLM's JSON answer, falling back to the mock design."""
+        try:
+            return json.loads(self._extract_json(design_text))
         except Exception as e:
             logger.error(f"Failed to parse design JSON: {e}")
-            design_json = self._generate_mock_design_json(prompt, retrieved_docs)
-        
-        # Add citations
-        citations = list(citations_map.values())
+            return self._generate_mock_design_json(prompt, retrieved_docs)
+    
+    @staticmethod
+    def _extract_json(text: str) -> str:
+        """Extract JSON from a markdown code block if present."""
+        if "```json" in text:
+            return text.split("```json")[1].split("```")[0].strip()
+        if "```" in text:
+            return text.split("```")[1].split("```")[0].strip()
+        return text
+    
+    @staticmethod
+    def _attach_citations(
+        design_json: Dict[str, Any],
+        citations: List[Dict[str, Any]],
+        figure_paths: List[str]
+    ) -> Dict[str, Any]:
+        """Add retrieval-derived citations and figures to a design."""
         design_json["citations"] = citations
         design_json["preview_image"] = figure_paths[0] if figure_paths else None
         design_json["figures"] = figure_paths if figure_paths else None
-        
         return design_json
     
+    def generate_stream(
+        self,
+        prompt: str,
+        filters: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None,
+        timer: Optional[StageTimer] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """Run the pipeline, yielding (event, data) as each part becomes available.
+        
+        Emits "retrieval" once reranking is done, a "section" per top-level
+        field as soon as the LLM has finished writing it, and a final "design"
+        with the complete brief (which may differ from the streamed sections if
+        the output had to be replaced by the fallback design). A deadline
+        bounds everything up to the first generated token.
+        """
+        timer = timer or StageTimer()
+        reranked_docs = self.retrieve_for_generation(prompt, filters, timer=timer, deadline=deadline)
+        plan = self._generation_plan(deadline)
+        full_prompt, citations, figure_paths = self.build_prompt(
+            prompt, reranked_docs, timer=timer, token_budget=plan["token_budget"] if plan else None
+        )
+        self._observe_latencies(timer)
+        yield "retrieval", {
+            "documents": [
+                {
+                    "chunk_id": doc["chunk_id"],
+                    "patent_number": doc["metadata"]["patent_number"],
+                    "section": doc["metadata"]["section"],
+                    "title": doc["metadata"].get("title", ""),
+                    "score": float(doc["score"])
+                }
+                for doc in reranked_docs
+            ],
+            "citations": citations,
+            "figures": figure_paths,
+            "degradations": list(deadline.degradations) if deadline else None
+        }
+        
+        sections = JSONSectionStream()
+        pieces: List[str] = []
+        generation_started = time.perf_counter()
+        for piece in self._stream_completion(full_prompt, prompt, reranked_docs, plan=plan, deadline=deadline):
+            pieces.append(piece)
+            for name, value in sections.feed(piece):
+                yield "section", {"name": name, "value": value}
+        # Wall time, including time the client takes to read the events
+        timer.add("generation", time.perf_counter() - generation_started)
+        timer.count("generation", output_tokens=self.token_counter.count("".join(pieces)))
+        
+        with timer.stage("parse"):
+            design_json = self.parse_design_text("".join(pieces), prompt, reranked_docs)
+        if deadline is not None:
+            design_json["degradations"] = list(deadline.degradations)
+        yield "design", self._attach_citations(design_json, citations, figure_paths)
+    
+    def _stream_completion(
+        self,
+        full_prompt: str,
+        prompt: str,
+        retrieved_docs: List[Dict[str, Any]],
+        plan: Optional[Dict[str, Any]] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Iterator[str]:
+        """Yield LLM output text incrementally (mock design when OpenAI is unavailable or out of time)."""
+        if not (self.use_openai and self.openai_client) or plan is None:
+            yield self._generate_mock_design(prompt, retrieved_docs)
+            return
+        
+        produced = False
+        try:
+            # The breaker and deadline cover the request up to the first byte
+            stream = self._chat(
+                [
+                    {"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": full_prompt}
+                ],
+                max_tokens=plan["max_tokens"],
+                model=plan["model"],
+                deadline=deadline,
+                stream=True
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    produced = True
+                    yield delta
+        except Exception as e:
+            if isinstance(e, CircuitOpenError):
+                self._degrade(deadline, "generation_fallback", "circuit_open")
+            else:
+                logger.error(f"OpenAI streaming error: {e}")
+                self._degrade(deadline, "generation_fallback", "upstream_error")
+            if not produced:
+                yield self._generate_mock_design(prompt, retrieved_docs)
+    
     def _generate_mock_design(self, prompt: str, retrieved_docs: List[Dict[str, Any]]) -> str:
         """Generate mock design for fallback."""
         return json.dumps(self._generate_mock_design_json(prompt, retrieved_docs), indent=2)
@@ -551,31 +1441,311 @@ Generate {num_queries} diverse queries:"""
             ]
         }
     
-    def generate(self, prompt: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Full pipeline: retrieve -> rerank -> generate."""
-        # Retrieve
-        retrieved_docs = self.hybrid_retrieve(prompt, filters=filters, top_k=50)
+    def generate(
+        self,
+        prompt: str,
+        filters: Optional[Dict[str, Any]] = None,
+        timer: Optional[StageTimer] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Dict[str, Any]:
+        """Full pipeline: retrieve -> rerank -> generate.
         
-        # Rerank
-        reranked_docs = self.rerank(prompt, retrieved_docs, top_k=10)
+        With a deadline, each stage sizes its work to the time left and the
+        brief lists the degradations that were applied.
+        """
+        timer = timer or StageTimer()
+        
+        # Retrieve and rerank
+        reranked_docs = self.retrieve_for_generation(prompt, filters, timer=timer, deadline=deadline)
         
         # Generate
-        design = self.generate_design(prompt, reranked_docs)
+        design = self.generate_design(prompt, reranked_docs, timer=timer, deadline=deadline)
         
+        self._observe_latencies(timer)
+        if deadline is not None:
+            design["degradations"] = list(deadline.degradations)
         return design
+    
+    def retrieve_for_generation(
+        self,
+        prompt: str,
+        filters: Optional[Dict[str, Any]] = None,
+        timer: Optional[StageTimer] = None,
+        deadline: Optional[Deadline] = None
+    ) -> List[Dict[str, Any]]:
+        """Retrieve and rerank the passages a brief is written from, within the deadline."""
+        timer = timer or StageTimer()
+        expand, top_k = self._plan_retrieval(deadline)
+        retrieved_docs = self.hybrid_retrieve(
+            prompt, filters=filters, top_k=top_k, expand=expand, timer=timer, deadline=deadline
+        )
+        candidates = self._plan_rerank(deadline, len(retrieved_docs))
+        if candidates == 0:
+            return retrieved_docs[:RERANK_TOP_K]
+        return self.rerank(prompt, retrieved_docs[:candidates], top_k=RERANK_TOP_K, timer=timer)
+    
+    def _generation_reserve(self) -> float:
+        """Seconds to keep back for prompt building and full-quality generation."""
+        return self.latency.estimate("prompt_build") + self.latency.estimate("generation")
+    
+    def _plan_retrieval(self, deadline: Optional[Deadline]) -> Tuple[bool, int]:
+        """Whether to expand the query and how many candidates to retrieve in the time left."""
+        if deadline is None:
+            return True, RETRIEVAL_TOP_K
+        estimate = self.latency.estimate
+        retrieval = sum(estimate(stage) for stage in ("bm25", "embedding", "patent_query", "vector_query", "fusion", "doc_fetch"))
+        spare = deadline.remaining() - retrieval - self._generation_reserve()
+        
+        expand = spare - estimate("expansion") - estimate("rerank_pair", MIN_RETRIEVAL_TOP_K) >= 0
+        if not expand:
+            self._degrade(deadline, "expansion_skipped")
+        else:
+            spare -= estimate("expansion")
+        
+        top_k = RETRIEVAL_TOP_K
+        per_pair = estimate("rerank_pair")
+        if per_pair > 0 and spare < per_pair * RETRIEVAL_TOP_K:
+            top_k = max(MIN_RETRIEVAL_TOP_K, int(spare / per_pair))
+            self._degrade(deadline, "top_k_reduced")
+        return expand, top_k
+    
+    def _plan_rerank(self, deadline: Optional[Deadline], candidates: int) -> int:
+        """How many of the best fused candidates to rerank in the time left (0 skips reranking)."""
+        per_pair = self.latency.estimate("rerank_pair")
+        if deadline is None or not self.reranker or per_pair <= 0:
+            return candidates
+        affordable = int((deadline.remaining() - self._generation_reserve()) / per_pair)
+        if affordable >= candidates:
+            return candidates
+        if affordable < RERANK_TOP_K:
+            self._degrade(deadline, "rerank_skipped")
+            return 0
+        self._degrade(deadline, "rerank_limited")
+        return affordable
+    
+    def _observe_latencies(self, timer: StageTimer):
+        """Feed a finished request's stage timings into the latency estimates."""
+        seconds = {stage: ms / 1000.0 for stage, ms in timer.timings_ms().items()}
+        for stage in ("bm25", "embedding", "patent_query", "vector_query", "fusion", "doc_fetch", "prompt_build"):
+            if stage in seconds:
+                self.latency.observe(stage, seconds[stage])
+        if timer.counts.get("expansion", {}).get("queries", 0) > 1:
+            self.latency.observe("expansion", seconds.get("expansion", 0.0))
+        pairs = timer.counts.get("rerank", {}).get("pairs", 0)
+        if pairs and "rerank" in seconds:
+            self.latency.observe("rerank_pair", seconds["rerank"], units=pairs)
+    
+    def generate_batch(
+        self,
+        items: List[Tuple[str, Optional[Dict[str, Any]]]],
+        max_concurrency: int = 4
+    ) -> Iterator[Dict[str, Any]]:
+        """Generate many briefs, yielding {"index", "status", ...} as each completes.
+        
+        Retrieval and reranking run once for the whole batch; LLM generation
+        fans out over at most max_concurrency threads.
+        """
+        prompts = [prompt for prompt, _ in items]
+        try:
+            retrieved = self.hybrid_retrieve_batch(
+                prompts, [filters for _, filters in items], top_k=50, max_workers=max_concurrency
+            )
+            reranked = self.rerank_batch(prompts, retrieved, top_k=10)
+        except Exception as e:
+            logger.error(f"Batch retrieval failed: {e}")
+            for index in range(len(items)):
+                yield {"index": index, "status": "error", "error": f"retrieval failed: {e}"}
+            return
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+            futures = {
+                pool.submit(tracing.bind(self.generate_design), prompts[index], reranked[index]): index
+                for index in range(len(items))
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    yield {"index": index, "status": "ok", "design": future.result()}
+                except Exception as e:
+                    logger.error(f"Batch item {index} failed: {e}")
+                    yield {"index": index, "status": "error", "error": str(e)}
 
 
 # Initialize generator (lazy initialization)
 generator = None
+generator_lock = threading.Lock()
+startup_components = ComponentTracker()
+startup_components.set("imports", "ready", seconds=round(time.perf_counter() - IMPORT_STARTED, 3))
+ready_after_seconds: Optional[float] = None
+
+# Identical concurrent /design requests share one pipeline run
+design_flight = SingleFlight("design")
 
 def get_generator():
-    """Get or create generator instance."""
+    """Get or create generator instance (thread-safe, built at most once)."""
     global generator
     if generator is None:
-        generator = DesignGenerator()
+        with generator_lock:
+            if generator is None:
+                generator = DesignGenerator(components=startup_components)
     return generator
 
 
+def warm_up():
+    """Build the generator and run a dummy inference before traffic arrives."""
+    global ready_after_seconds
+    try:
+        gen = get_generator()
+        with startup_components.track("warmup"):
+            gen.warm_up()
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}")
+        return
+    ready_after_seconds = round(time.perf_counter() - IMPORT_STARTED, 3)
+    logger.info(f"Ready to serve after {ready_after_seconds}s")
+
+
+design_admission = AdmissionController(
+    "design",
+    max_concurrency=ADMISSION_MAX_CONCURRENCY,
+    max_queue=ADMISSION_MAX_QUEUE,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT
+)
+
+
+async def admit(priority: Optional[str]) -> Callable[[], None]:
+    """Take a design admission slot or fail fast with 429/503 and Retry-After.
+    
+    Returns an idempotent release function that must run on the event loop.
+    Priority is "interactive" (default) or "batch"; batch requests wait
+    behind interactive ones.
+    """
+    if not ADMISSION_ENABLED:
+        return lambda: None
+    try:
+        await design_admission.acquire(priority or "interactive")
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return slot_release()
+
+
+def admit_idle(count: int, priority: Optional[str]) -> List[Callable[[], None]]:
+    """Take up to count more design slots that are free right now, without queuing.
+    
+    Lets a batch that already holds one slot fan out over idle capacity
+    while never making interactive requests wait behind it.
+    """
+    if not ADMISSION_ENABLED:
+        return [lambda: None] * count
+    releases = []
+    while len(releases) < count and design_admission.try_acquire(priority or "interactive"):
+        releases.append(slot_release())
+    return releases
+
+
+def slot_release() -> Callable[[], None]:
+    """Idempotent release function for a design slot taken just now."""
+    started = time.monotonic()
+    released = False
+    
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            design_admission.release(time.monotonic() - started)
+    return release
+
+
+def admitted_stream(body: Iterator[str], release: Callable[[], None]) -> Dict[str, Any]:
+    """StreamingResponse arguments that hold the admission slot until the body is done."""
+    async def iterate() -> AsyncIterator[str]:
+        try:
+            async for chunk in iterate_in_threadpool(body):
+                yield chunk
+        finally:
+            release()
+    
+    async def release_on_loop():
+        release()
+    
+    # The background task covers responses whose body never started
+    return {"content": iterate(), "background": BackgroundTask(release_on_loop)}
+
+
+request_profiler = RequestProfiler(PROFILE_DIR, sample_interval=PROFILE_SAMPLE_INTERVAL_MS / 1000.0)
+memory_tracker = MemoryTracker()
+query_log = QueryLog(
+    QUERY_LOG_FILE,
+    sample_rate=QUERY_LOG_SAMPLE_RATE,
+    max_bytes=int(QUERY_LOG_MAX_MB * 2 ** 20),
+    backups=QUERY_LOG_BACKUPS
+)
+
+
+def profile_mode(x_profile: Optional[str]) -> Optional[str]:
+    """Profiler requested by an X-Profile header, or None when profiling is off."""
+    if not x_profile or not PROFILING_ENABLED:
+        return None
+    mode = x_profile.strip().lower()
+    if mode in ("1", "true"):
+        return "cprofile"
+    if mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"X-Profile must be one of: {', '.join(PROFILE_MODES)}")
+    return mode
+
+
+def require_profiling():
+    """404 unless PROFILING_ENABLED, so debug endpoints are invisible in normal deployments."""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+def capture_query(
+    endpoint: str,
+    request: BaseModel,
+    timer: StageTimer,
+    status: int,
+    ids: List[str],
+    x_query_replay: Optional[str]
+):
+    """Queue a sampled query-log record; replayed requests are never captured."""
+    if x_query_replay or not query_log.sampled():
+        return
+    query_log.record(
+        endpoint,
+        request.model_dump(exclude_none=True),
+        status=status,
+        total_ms=timer.elapsed_ms(),
+        stages_ms=timer.timings_ms(),
+        ids=ids,
+        trace_id=tracing.current_trace_id(),
+        **({"coalesced": True} if timer.coalesced else {})
+    )
+
+
+def request_deadline(latency_budget_ms: Optional[int]) -> Optional[Deadline]:
+    """Deadline for a request: its own budget, else the server default (if any)."""
+    budget_ms = latency_budget_ms or DEFAULT_LATENCY_BUDGET_MS
+    return Deadline(budget_ms / 1000.0) if budget_ms else None
+
+
+def is_ready() -> bool:
+    """True once the generator is built and warm-up is no longer running."""
+    return generator is not None and startup_components.state("warmup") not in ("pending", "loading")
+
+
+@app.on_event("startup")
+async def start_warm_up():
+    """Kick off model loading in the background so startup is not blocked."""
+    if WARMUP_ON_STARTUP:
+        startup_components.set("warmup", "pending")
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+
 @app.get("/")
 async def root():
     """Default route with basic instructions."""
@@ -583,7 +1753,12 @@ async def root():
         "message": "Construction Robotics Design Generator API",
         "endpoints": {
             "health": "/health",
+            "ready": "/ready",
+            "metrics": "/metrics (Prometheus text format)",
             "design": "POST /design",
+            "design_stream": "POST /design/stream (Server-Sent Events)",
+            "design_batch": "POST /design/batch (newline-delimited JSON)",
+            "retrieve": "POST /retrieve (ranked chunks with stage timings, no generation)",
             "docs": "/docs"
         },
         "usage": "Send POST /design with JSON {\"prompt\": \"...\", \"filters\": {...}}"
@@ -592,26 +1767,255 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
-    return {"status": "healthy"}
+    """Liveness check; see /ready for whether the pipeline can serve."""
+    return {"status": "healthy", "ready": is_ready()}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check with per-component load state and timings."""
+    ready = is_ready()
+    components = startup_components.snapshot()
+    if ready:
+        status = "ready"
+    elif any(c["state"] == "failed" for c in components.values()):
+        status = "failed"
+    else:
+        status = "starting"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": status,
+            "components": components,
+            "upstream": generator.upstream_status() if ready else {},
+            "admission": design_admission.snapshot() if ADMISSION_ENABLED else None,
+            "uptime_seconds": round(time.perf_counter() - IMPORT_STARTED, 3),
+            "ready_after_seconds": ready_after_seconds
+        }
+    )
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Process metrics (circuit breakers, upstream calls, degradations) for Prometheus."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.post("/design", response_model=DesignBrief)
-async def generate_design(request: DesignRequest):
+async def generate_design(
+    request: DesignRequest,
+    response: Response,
+    x_request_priority: Optional[str] = Header(default=None),
+    x_profile: Optional[str] = Header(default=None),
+    x_query_replay: Optional[str] = Header(default=None)
+):
     """Generate design brief from patent-grounded RAG system."""
+    deadline = request_deadline(request.latency_budget_ms)
+    timer = StageTimer()
+    mode = profile_mode(x_profile)
+    release = await admit(x_request_priority)
+    status = 500
+    cited: List[str] = []
     try:
-        gen = get_generator()
-        design = gen.generate(
-            prompt=request.prompt,
-            filters=request.filters
-        )
+        gen = await run_in_threadpool(get_generator)
+        
+        def run() -> Tuple[Dict[str, Any], StageTimer]:
+            # The timer travels with the result so requests that join this one can report its stages
+            return gen.generate(prompt=request.prompt, filters=request.filters, timer=timer, deadline=deadline), timer
+        
+        if mode:
+            # A profiled request does its own work rather than joining an identical in-flight one
+            (design, _), profile_path = await run_in_threadpool(request_profiler.run, mode, "design", run)
+            if profile_path:
+                response.headers["X-Profile-Path"] = profile_path
+        else:
+            design, leader_timer = await run_in_threadpool(
+                design_flight.do,
+                request_key(request.prompt, request.filters, {"latency_budget_ms": request.latency_budget_ms}),
+                run
+            )
+            timer.merge(leader_timer)
+        observe_stages(timer, "design")
+        if SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = timer.server_timing()
+        cited = [citation.get("patent_number", "") for citation in design.get("citations", [])]
+        status = 200
         return design
     except Exception as e:
         logger.error(f"Error generating design: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        release()
+        capture_query("/design", request, timer, status, cited, x_query_replay)
+
+
+
+@app.post("/design/stream")
+async def stream_design(request: DesignRequest, x_request_priority: Optional[str] = Header(default=None)):
+    """Stream a design brief as Server-Sent Events.
+    
+    Events: "retrieval" (ranked patents and citations), one "section" per
+    completed brief field, "design" (the full brief), then "done"; failures
+    are reported as an "error" event.
+    """
+    deadline = request_deadline(request.latency_budget_ms)
+    release = await admit(x_request_priority)
+    try:
+        gen = await run_in_threadpool(get_generator)
+    except Exception:
+        release()
+        raise
+    
+    def events() -> Iterator[str]:
+        timer = StageTimer()
+        try:
+            for event, data in gen.generate_stream(
+                request.prompt, filters=request.filters, deadline=deadline, timer=timer
+            ):
+                if event == "design":
+                    data = DesignBrief.model_validate(data).model_dump()
+                yield format_sse(event, data)
+            observe_stages(timer, "design_stream")
+        except Exception as e:
+            logger.error(f"Error streaming design: {e}")
+            yield format_sse("error", {"detail": str(e)})
+        yield format_sse("done", {})
+    
+    return StreamingResponse(
+        **admitted_stream(events(), release),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/design/batch")
+async def generate_design_batch(request: BatchDesignRequest, x_request_priority: Optional[str] = Header(default="batch")):
+    """Generate many design briefs, streaming one JSON line per item as it completes.
+    
+    Each line is {"index": i, "status": "ok", "design": {...}} or
+    {"index": i, "status": "error", "error": "..."}, where i is the position
+    in the submitted list. The batch waits for one admission slot at
+    "batch" priority unless the X-Request-Priority header says otherwise,
+    then takes whatever further slots are idle, up to max_concurrency, and
+    never runs more generations at once than the slots it holds.
+    """
+    if len(request.requests) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} requests per batch")
+    releases = [await admit(x_request_priority)]
+    releases += admit_idle(min(request.max_concurrency, len(request.requests)) - 1, x_request_priority)
+    
+    def release():
+        for release_slot in releases:
+            release_slot()
+    try:
+        gen = await run_in_threadpool(get_generator)
+    except Exception:
+        release()
+        raise
+    items = [(item.prompt, item.filters) for item in request.requests]
+    
+    def lines() -> Iterator[str]:
+        for result in gen.generate_batch(items, max_concurrency=len(releases)):
+            if result["status"] == "ok":
+                try:
+                    result["design"] = DesignBrief.model_validate(result["design"]).model_dump()
+                except Exception as e:
+                    result = {"index": result["index"], "status": "error", "error": f"invalid design: {e}"}
+            yield json.dumps(result, default=str) + "\n"
+    
+    return StreamingResponse(**admitted_stream(lines(), release), media_type="application/x-ndjson")
+
+
+@app.post("/retrieve", response_model=RetrieveResponse)
+async def retrieve(
+    request: RetrieveRequest,
+    response: Response,
+    x_profile: Optional[str] = Header(default=None),
+    x_query_replay: Optional[str] = Header(default=None)
+):
+    """Run retrieval (and optionally reranking) only, with per-stage timings."""
+    mode = profile_mode(x_profile)
+    timer = StageTimer()
+    status = 500
+    docs: List[Dict[str, Any]] = []
+    try:
+        gen = await run_in_threadpool(get_generator)
+        
+        def run() -> List[Dict[str, Any]]:
+            docs = gen.hybrid_retrieve(
+                request.prompt,
+                filters=request.filters,
+                top_k=request.top_k,
+                expand=request.expand,
+                timer=timer,
+                nprobe=request.nprobe
+            )
+            if request.rerank:
+                docs = gen.rerank(request.prompt, docs, top_k=request.rerank_top_k, timer=timer)
+            return docs
+        
+        if mode:
+            docs, profile_path = await run_in_threadpool(request_profiler.run, mode, "retrieve", run)
+            if profile_path:
+                response.headers["X-Profile-Path"] = profile_path
+        else:
+            docs = await run_in_threadpool(run)
+        observe_stages(timer, "retrieve")
+        if SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = timer.server_timing()
+        status = 200
+        return {
+            "chunks": [
+                {
+                    "chunk_id": doc["chunk_id"],
+                    "patent_number": doc["metadata"].get("patent_number", ""),
+                    "section": doc["metadata"].get("section", ""),
+                    "title": doc["metadata"].get("title", ""),
+                    "text": doc["text"],
+                    "score": float(doc["score"]),
+                    "rerank_score": doc.get("rerank_score") if request.rerank else None,
+                    "metadata": doc["metadata"]
+                }
+                for doc in docs
+            ],
+            "timings_ms": timer.timings_ms(),
+            "cpu_ms": timer.cpu_ms(),
+            "counts": timer.counts,
+            "total_ms": timer.elapsed_ms()
+        }
+    except Exception as e:
+        logger.error(f"Error retrieving: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        capture_query("/retrieve", request, timer, status, [doc["chunk_id"] for doc in docs], x_query_replay)
+
+
+@app.post("/debug/memory/snapshot")
+async def memory_snapshot():
+    """Start tracemalloc (if needed) and take the baseline for /debug/memory/diff."""
+    require_profiling()
+    return await run_in_threadpool(memory_tracker.snapshot)
+
+
+@app.get("/debug/memory/diff")
+async def memory_diff(limit: int = 25, group_by: str = "lineno"):
+    """Allocation growth since the last snapshot, grouped by line, file or traceback."""
+    require_profiling()
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="group_by must be lineno, filename or traceback")
+    try:
+        return await run_in_threadpool(memory_tracker.diff, limit, group_by)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.delete("/debug/memory/snapshot")
+async def memory_stop():
+    """Stop tracemalloc and drop the baseline."""
+    require_profiling()
+    return await run_in_threadpool(memory_tracker.stop)
 
 
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
-
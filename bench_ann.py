@@ -0,0 +1,142 @@
+"""
+Approximate (ivf) versus exact (mmap) vector search on a synthetic corpus.
+
+Builds both backends over the same synthetic corpus (synthetic_patents.py),
+trains the IVF lists, then sweeps nprobe and reports for each setting the
+per-query latency and recall@10 / recall@k against exact search, so the
+default IVF_NPROBE can be picked off the curve. A second pass measures
+incremental insertion: train on the first part of the corpus, add the rest
+without retraining, and compare recall with a fully retrained index.
+
+    python bench_ann.py --chunks 100000 --dim 768 --nprobe 1,2,4,8,16,32,64
+"""
+
+import gc
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from bench_history import environment_fingerprint
+from bench_retrieval import latency_summary, timed
+from bench_vector_store import directory_mb, recall_at_k
+from synthetic_patents import SyntheticPatentGenerator, synthetic_embeddings, synthetic_queries
+from vector_store import open_vector_store
+
+
+def sweep(store, query_vectors: np.ndarray, truth: List[List[str]], nprobes: List[int], top_k: int) -> List[Dict[str, Any]]:
+    """Latency and recall of one IVF index at each nprobe."""
+    rows = []
+    for nprobe in nprobes:
+        latency_ms = [timed(lambda: store.query([vector.tolist()], n_results=top_k, nprobe=nprobe)) for vector in query_vectors]
+        results = store.query(query_vectors.tolist(), n_results=top_k, nprobe=nprobe)
+        rows.append({
+            "nprobe": nprobe,
+            "query": latency_summary(latency_ms),
+            "recall_at_10": recall_at_k(results, truth, 10),
+            f"recall_at_{top_k}": recall_at_k(results, truth, top_k)
+        })
+    return rows
+
+
+def add_in_batches(store, ids, embeddings, documents, metadatas, batch: int):
+    for i in range(0, len(ids), batch):
+        store.add(ids[i:i + batch], embeddings[i:i + batch], documents[i:i + batch], metadatas[i:i + batch])
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Recall versus latency of the ivf vector store against exact search")
+    parser.add_argument("--chunks", type=int, default=100000, help="Corpus size in chunks")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimensions")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=100, help="Results per query (the app asks for 2 x RETRIEVAL_TOP_K)")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = 4 x sqrt(chunks))")
+    parser.add_argument("--nprobe", type=str, default="1,2,4,8,16,32,64", help="Comma-separated nprobe values to sweep")
+    parser.add_argument("--incremental-fraction", type=float, default=0.1,
+                        help="Share of the corpus added after training in the incremental pass (0 = skip)")
+    parser.add_argument("--batch", type=int, default=10000, help="Chunks per add() call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", type=str, help="Where to build the indexes (default: a temp dir)")
+    parser.add_argument("--output", type=str, default="benchmarks/ann.json")
+    args = parser.parse_args()
+
+    nprobes = [int(n) for n in args.nprobe.split(",") if n.strip()]
+    generator = SyntheticPatentGenerator(seed=args.seed)
+    ids, documents, metadatas = generator.chunks(args.chunks)
+    embeddings = synthetic_embeddings(metadatas, dim=args.dim, seed=args.seed)
+    query_vectors = synthetic_queries(embeddings, args.queries, seed=args.seed + 1)
+
+    report: Dict[str, Any] = {
+        "benchmark": "ann",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment_fingerprint(),
+        "config": vars(args),
+        "chunks": args.chunks,
+        "dim": args.dim
+    }
+    with tempfile.TemporaryDirectory(prefix="bench_ann_", dir=args.workdir) as workdir:
+        exact = open_vector_store("mmap", Path(workdir), reset=True)
+        add_in_batches(exact, ids, embeddings, documents, metadatas, args.batch)
+        exact_ms = [timed(lambda: exact.query([vector.tolist()], n_results=args.top_k)) for vector in query_vectors]
+        truth = exact.query(query_vectors.tolist(), n_results=args.top_k)["ids"]
+        report["exact"] = {"query": latency_summary(exact_ms)}
+        print(f"exact: p50 {report['exact']['query']['p50_ms']:.2f} ms, p95 {report['exact']['query']['p95_ms']:.2f} ms")
+        del exact
+        gc.collect()
+
+        store = open_vector_store("ivf", Path(workdir), reset=True)
+        add_in_batches(store, ids, embeddings, documents, metadatas, args.batch)
+        start = time.perf_counter()
+        store.train(nlist=args.nlist or None, seed=args.seed)
+        sizes = np.diff(store.list_offsets)
+        report["ivf"] = {
+            "nlist": len(store.centroids),
+            "train_seconds": round(time.perf_counter() - start, 2),
+            "list_size": {"median": int(np.median(sizes)), "max": int(sizes.max())},
+            "disk_mb": round(directory_mb(Path(workdir) / "ivf"), 1),
+            "sweep": sweep(store, query_vectors, truth, nprobes, args.top_k)
+        }
+        print(f"ivf: {report['ivf']['nlist']} lists, trained in {report['ivf']['train_seconds']:.1f}s")
+        print(f"{'nprobe':>7} {'p50 ms':>8} {'p95 ms':>8} {'recall@10':>10} {f'recall@{args.top_k}':>11}")
+        for row in report["ivf"]["sweep"]:
+            print(f"{row['nprobe']:>7} {row['query']['p50_ms']:>8.2f} {row['query']['p95_ms']:>8.2f} "
+                  f"{row['recall_at_10']:>10.3f} {row[f'recall_at_{args.top_k}']:>11.3f}")
+        del store
+        gc.collect()
+
+        if args.incremental_fraction > 0:
+            # Train on the head of the corpus, then insert the tail into the existing lists
+            split = int(args.chunks * (1 - args.incremental_fraction))
+            store = open_vector_store("ivf", Path(workdir), reset=True)
+            add_in_batches(store, ids[:split], embeddings[:split], documents[:split], metadatas[:split], args.batch)
+            store.train(nlist=args.nlist or None, seed=args.seed)
+            start = time.perf_counter()
+            add_in_batches(store, ids[split:], embeddings[split:], documents[split:], metadatas[split:], args.batch)
+            insert_seconds = time.perf_counter() - start
+            report["incremental"] = {
+                "trained_chunks": split,
+                "inserted_chunks": args.chunks - split,
+                "insert_seconds": round(insert_seconds, 2),
+                "sweep": sweep(store, query_vectors, truth, nprobes, args.top_k)
+            }
+            print(f"incremental: {args.chunks - split} chunks inserted after training in {insert_seconds:.1f}s")
+            for row in report["incremental"]["sweep"]:
+                print(f"{row['nprobe']:>7} {row['query']['p50_ms']:>8.2f} {row['query']['p95_ms']:>8.2f} "
+                      f"{row['recall_at_10']:>10.3f} {row[f'recall_at_{args.top_k}']:>11.3f}")
+            del store
+            gc.collect()
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Latency benchmark: single-completion vs. parallel per-section generation.
+
+Retrieval and reranking run once per prompt and are shared by both modes, so
+the comparison isolates the generation step; end-to-end latency adds the
+shared retrieval time back. Needs OPENAI_API_KEY (without it both modes return
+the fallback design and the numbers are meaningless).
+"""
+
+import os
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from bench_history import environment_fingerprint
+from telemetry import StageTimer
+
+BENCH_PROMPTS = [
+    "Design a robotic bricklaying system with vision-guided placement",
+    "Autonomous rebar tying robot for bridge deck construction",
+    "Drywall installation robot for high-rise interior finishing",
+    "3D concrete printing gantry for single-storey housing",
+    "Teleoperated demolition robot with dust suppression",
+]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """q-th percentile of samples, rounded to 0.1 ms."""
+    return round(float(np.percentile(samples, q)), 1) if samples else 0.0
+
+
+def run_mode(generator, mode: str, retrieved: List[Dict[str, Any]], runs: int) -> Dict[str, Any]:
+    """Generate every prompt `runs` times in one mode and summarise latency."""
+    generation_ms: List[float] = []
+    end_to_end_ms: List[float] = []
+    prompt_tokens: List[int] = []
+    for _ in range(runs):
+        for item in retrieved:
+            timer = StageTimer()
+            start = time.perf_counter()
+            generator.generate_design(item["prompt"], item["docs"], timer=timer, mode=mode)
+            elapsed = (time.perf_counter() - start) * 1000.0
+            generation_ms.append(elapsed)
+            end_to_end_ms.append(elapsed + item["retrieval_ms"])
+            prompt_tokens.append(timer.counts.get("prompt_build", {}).get("prompt_tokens", 0))
+    return {
+        "mode": mode,
+        "samples": len(generation_ms),
+        "generation_p50_ms": percentile(generation_ms, 50),
+        "generation_p95_ms": percentile(generation_ms, 95),
+        "end_to_end_p50_ms": percentile(end_to_end_ms, 50),
+        "end_to_end_p95_ms": percentile(end_to_end_ms, 95),
+        "prompt_tokens_mean": round(statistics.mean(prompt_tokens), 1) if prompt_tokens else 0
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Compare single and parallel design generation latency")
+    parser.add_argument("--prompts", type=int, default=len(BENCH_PROMPTS), help="Number of prompts to use")
+    parser.add_argument("--runs", type=int, default=2, help="Repetitions per prompt and mode")
+    parser.add_argument("--modes", type=str, default="single,parallel")
+    parser.add_argument("--output", type=str, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    if not os.getenv("OPENAI_API_KEY"):
+        print("warning: OPENAI_API_KEY is not set; both modes will return the fallback design")
+
+    from app import DesignGenerator
+    generator = DesignGenerator()
+
+    retrieved = []
+    for prompt in BENCH_PROMPTS[:args.prompts]:
+        start = time.perf_counter()
+        docs = generator.rerank(prompt, generator.hybrid_retrieve(prompt, top_k=50), top_k=10)
+        retrieved.append({"prompt": prompt, "docs": docs, "retrieval_ms": (time.perf_counter() - start) * 1000.0})
+
+    results: Dict[str, Any] = {
+        "benchmark": "generation",
+        "environment": environment_fingerprint(),
+        "retrieval_p50_ms": percentile([item["retrieval_ms"] for item in retrieved], 50),
+        "modes": []
+    }
+    print(f"{'mode':<10} {'gen p50':>9} {'gen p95':>9} {'e2e p50':>9} {'e2e p95':>9} {'prompt tok':>11}")
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        row = run_mode(generator, mode, retrieved, args.runs)
+        results["modes"].append(row)
+        print(
+            f"{mode:<10} {row['generation_p50_ms']:>9.0f} {row['generation_p95_ms']:>9.0f} "
+            f"{row['end_to_end_p50_ms']:>9.0f} {row['end_to_end_p95_ms']:>9.0f} {row['prompt_tokens_mean']:>11.0f}"
+        )
+
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
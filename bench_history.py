@@ -0,0 +1,318 @@
+"""
+Benchmark history and regression gate.
+
+Benchmark reports (bench_retrieval.py, load_test.py, bench_generation.py) are
+flattened to named metrics and appended to an append-only JSON-lines history
+together with an environment fingerprint (CPU, cores, Python and library
+versions) and the git commit. New runs are compared against earlier runs from
+the same hardware: the baseline is the median of the last few matching runs,
+and a metric only counts as a regression when it is worse than the baseline
+by more than both the threshold and the run-to-run noise (MAD) seen in those
+runs.
+
+    python bench_history.py record benchmarks/retrieval.json --label nightly
+    python bench_history.py compare benchmarks/retrieval.json --threshold 10
+    python bench_history.py trend --benchmark retrieval
+
+`compare` exits with status 1 when any metric regressed, so it can gate CI.
+"""
+
+import os
+import sys
+import json
+import time
+import fnmatch
+import hashlib
+import argparse
+import platform
+import subprocess
+from pathlib import Path
+from importlib import metadata
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+HISTORY_FILE = Path("benchmarks/history.jsonl")
+
+TRACKED_LIBRARIES = ["numpy", "chromadb", "sentence-transformers", "torch", "fastapi", "openai", "tiktoken"]
+
+# Metric name suffixes worth tracking; everything else (sizes, counts) is context
+LOWER_IS_BETTER = ("_ms", "seconds", "_mb", "error_rate")
+HIGHER_IS_BETTER = ("_rps", "per_second")
+
+# Top-level report fields that describe the run rather than measure it
+CONTEXT_KEYS = ("config", "environment", "stub", "duration_seconds")
+
+# List items are keyed by these fields so metrics line up across runs
+IDENTITY_FIELDS = ("chunks", "concurrency", "mode", "backend", "codec", "nprobe", "candidates", "name")
+
+DEFAULT_TREND_METRICS = [
+    "*bm25_build.chunks_per_second",
+    "*hybrid.p95_ms",
+    "*rss_peak_mb",
+    "*latency_ms.p95",
+    "*throughput_rps",
+]
+
+
+def cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def environment_fingerprint() -> Dict[str, Any]:
+    """Hardware, interpreter and library versions of this machine.
+
+    fingerprint_id covers only hardware and Python, so runs stay comparable
+    across library upgrades (which are exactly what the gate should catch).
+    """
+    libraries = {}
+    for name in TRACKED_LIBRARIES:
+        try:
+            libraries[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            libraries[name] = None
+    hardware = {
+        "cpu": cpu_model(),
+        "cores": os.cpu_count(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "python": platform.python_version()
+    }
+    fingerprint_id = hashlib.sha1(json.dumps(hardware, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    return dict(hardware, libraries=libraries, fingerprint_id=fingerprint_id)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def metric_direction(name: str) -> int:
+    """-1 when lower is better, +1 when higher is better, 0 for untracked values."""
+    leaf = name.rsplit(".", 1)[-1]
+    if leaf.endswith(HIGHER_IS_BETTER) or leaf.startswith("throughput") or "recall" in leaf:
+        return 1
+    if leaf.endswith(LOWER_IS_BETTER) or (leaf in ("p50", "p95", "p99", "mean", "max") and "_ms" in name):
+        return -1
+    return 0
+
+
+def flatten_metrics(report: Dict[str, Any]) -> Dict[str, float]:
+    """Tracked numeric leaves of a benchmark report as {dotted.name: value}."""
+    metrics: Dict[str, float] = {}
+
+    def walk(value: Any, prefix: str):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                if key in CONTEXT_KEYS and not prefix:
+                    continue
+                walk(child, f"{prefix}.{key}" if prefix else key)
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                label = str(index)
+                if isinstance(item, dict):
+                    for field in IDENTITY_FIELDS:
+                        if field in item:
+                            label = f"{field}={item[field]}"
+                            break
+                walk(item, f"{prefix}[{label}]")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if metric_direction(prefix) != 0:
+                metrics[prefix] = float(value)
+
+    walk(report, "")
+    return metrics
+
+
+def load_history(path: Path) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_entry(report: Dict[str, Any], label: Optional[str]) -> Dict[str, Any]:
+    """History entry for a report; reports that carry a fingerprint keep their own."""
+    environment = report.get("environment") or {}
+    if "fingerprint_id" not in environment:
+        environment = environment_fingerprint()
+    return {
+        "recorded": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "benchmark": report.get("benchmark", "unknown"),
+        "label": label,
+        "commit": git_commit(),
+        "environment": environment,
+        "metrics": flatten_metrics(report)
+    }
+
+
+def append_entry(path: Path, entry: Dict[str, Any]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(entry, sort_keys=True) + "\n")
+
+
+def baseline_runs(
+    history: List[Dict[str, Any]],
+    entry: Dict[str, Any],
+    runs: int,
+    label: Optional[str] = None,
+    any_environment: bool = False
+) -> List[Dict[str, Any]]:
+    """The last `runs` history entries comparable to entry."""
+    matching = [
+        past for past in history
+        if past["benchmark"] == entry["benchmark"]
+        and (any_environment or past["environment"]["fingerprint_id"] == entry["environment"]["fingerprint_id"])
+        and (label is None or past.get("label") == label)
+    ]
+    return matching[-runs:]
+
+
+def compare(
+    entry: Dict[str, Any],
+    baseline: List[Dict[str, Any]],
+    threshold: float,
+    noise_sigmas: float
+) -> List[Dict[str, Any]]:
+    """Per-metric comparison of entry against the median of the baseline runs."""
+    rows = []
+    for name, value in sorted(entry["metrics"].items()):
+        samples = [run["metrics"][name] for run in baseline if name in run["metrics"]]
+        if not samples:
+            continue
+        reference = float(np.median(samples))
+        # Robust spread of the baseline runs; one run has no measurable noise
+        noise = 1.4826 * float(np.median(np.abs(np.asarray(samples) - reference))) if len(samples) >= 3 else 0.0
+        direction = metric_direction(name)
+        worse_by = (value - reference) * -direction
+        allowed = max(abs(reference) * threshold / 100.0, noise_sigmas * noise)
+        change_pct = (value - reference) / abs(reference) * 100.0 if reference else 0.0
+        if worse_by > allowed:
+            status = "REGRESSED"
+        elif -worse_by > allowed:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append({
+            "metric": name,
+            "baseline": round(reference, 4),
+            "value": round(value, 4),
+            "change_pct": round(change_pct, 1),
+            "noise": round(noise, 4),
+            "runs": len(samples),
+            "status": status
+        })
+    return rows
+
+
+def command_record(args: argparse.Namespace) -> int:
+    with open(args.report) as f:
+        entry = make_entry(json.load(f), args.label)
+    append_entry(Path(args.history), entry)
+    print(f"Recorded {len(entry['metrics'])} metrics for {entry['benchmark']} "
+          f"({entry['environment']['fingerprint_id']}, commit {entry['commit']}) in {args.history}")
+    return 0
+
+
+def command_compare(args: argparse.Namespace) -> int:
+    with open(args.report) as f:
+        entry = make_entry(json.load(f), args.label)
+    history = load_history(Path(args.history))
+    baseline = baseline_runs(history, entry, args.runs, args.baseline_label, args.any_environment)
+    if not baseline:
+        print(f"No comparable {entry['benchmark']} runs for environment {entry['environment']['fingerprint_id']}; "
+              "record a baseline first")
+        if args.record:
+            append_entry(Path(args.history), entry)
+        return 0
+
+    rows = compare(entry, baseline, args.threshold, args.noise_sigmas)
+    shown = rows if args.verbose else [row for row in rows if row["status"] != "ok"]
+    width = max([len(row["metric"]) for row in shown] + [6])
+    print(f"Baseline: median of {len(baseline)} run(s), threshold {args.threshold:g}%, noise x{args.noise_sigmas:g}")
+    if shown:
+        print(f"{'metric':<{width}} {'baseline':>12} {'value':>12} {'change':>8}  status")
+        for row in shown:
+            print(f"{row['metric']:<{width}} {row['baseline']:>12.4g} {row['value']:>12.4g} {row['change_pct']:>+7.1f}%  {row['status']}")
+    regressions = [row for row in rows if row["status"] == "REGRESSED"]
+    print(f"{len(rows)} metrics compared: {len(regressions)} regressed, "
+          f"{sum(row['status'] == 'improved' for row in rows)} improved")
+    if args.record:
+        append_entry(Path(args.history), entry)
+    return 1 if regressions else 0
+
+
+def short_name(metric: str) -> str:
+    return metric.replace("results[", "[").replace("steps[", "[").replace("chunks=", "").replace("concurrency=", "c")
+
+
+def command_trend(args: argparse.Namespace) -> int:
+    history = [
+        entry for entry in load_history(Path(args.history))
+        if args.benchmark is None or entry["benchmark"] == args.benchmark
+    ][-args.last:]
+    if not history:
+        print("No history")
+        return 0
+    patterns = args.metrics.split(",") if args.metrics else DEFAULT_TREND_METRICS
+    names = sorted({
+        name for entry in history for name in entry["metrics"]
+        if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+    })
+    width = max([len(short_name(name)) for name in names] + [6])
+    header = " ".join(f"{(entry.get('commit') or '?')[:7]:>9}" for entry in history)
+    print(f"{'metric':<{width}} {header} {'change':>8}")
+    for name in names:
+        values = [entry["metrics"].get(name) for entry in history]
+        cells = " ".join(f"{value:>9.4g}" if value is not None else f"{'-':>9}" for value in values)
+        present = [value for value in values if value is not None]
+        change = f"{(present[-1] - present[0]) / abs(present[0]) * 100:+7.1f}%" if len(present) > 1 and present[0] else f"{'':>8}"
+        print(f"{short_name(name):<{width}} {cells} {change}")
+    return 0
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Record benchmark runs and fail on performance regressions")
+    parser.add_argument("--history", type=str, default=str(HISTORY_FILE))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record = sub.add_parser("record", help="Append a benchmark report to the history")
+    record.add_argument("report", type=str)
+    record.add_argument("--label", type=str)
+
+    comp = sub.add_parser("compare", help="Compare a report with earlier runs; exit 1 on regression")
+    comp.add_argument("report", type=str)
+    comp.add_argument("--label", type=str, help="Label stored with --record")
+    comp.add_argument("--baseline-label", type=str, help="Only compare with runs recorded under this label")
+    comp.add_argument("--runs", type=int, default=5, help="Baseline = median of this many most recent runs")
+    comp.add_argument("--threshold", type=float, default=10.0, help="Allowed slowdown in percent")
+    comp.add_argument("--noise-sigmas", type=float, default=3.0, help="Also allow this many robust std-devs of baseline noise")
+    comp.add_argument("--any-environment", action="store_true", help="Compare with runs from other hardware too")
+    comp.add_argument("--record", action="store_true", help="Append this run to the history after comparing")
+    comp.add_argument("--verbose", action="store_true", help="Show unchanged metrics too")
+
+    trend = sub.add_parser("trend", help="Show recent values of key metrics")
+    trend.add_argument("--benchmark", type=str)
+    trend.add_argument("--last", type=int, default=8)
+    trend.add_argument("--metrics", type=str, help="Comma-separated glob patterns of metric names")
+
+    args = parser.parse_args()
+    handlers = {"record": command_record, "compare": command_compare, "trend": command_trend}
+    sys.exit(handlers[args.command](args))
+
+
+if __name__ == "__main__":
+    main()
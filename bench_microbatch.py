@@ -0,0 +1,153 @@
+"""
+Throughput vs. tail-latency sweep for cross-request micro-batching.
+
+Drives a MicroBatcher from many concurrent client threads and reports
+requests/second and p50/p99 latency for each (concurrency, max_wait_ms,
+max_batch) combination. By default inference is simulated with a fixed
+per-call overhead plus a per-item cost; pass --backend local to time the real
+SentenceTransformer / CrossEncoder models instead.
+"""
+
+import argparse
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from serving import MicroBatcher
+
+
+def synthetic_batch_fn(per_call_ms: float, per_item_ms: float) -> Callable[[List[Any]], List[Any]]:
+    """Simulate an inference call with fixed overhead plus linear per-item cost.
+
+    Calls are serialized through a lock, like a CPU-bound model that saturates
+    the cores it runs on.
+    """
+    device = threading.Lock()
+
+    def run(items: List[Any]) -> List[Any]:
+        with device:
+            time.sleep((per_call_ms + per_item_ms * len(items)) / 1000.0)
+        return [0.0 for _ in items]
+    return run
+
+
+def local_batch_fn(stage: str) -> Callable[[List[Any]], List[Any]]:
+    """Build a batch function backed by the real local models."""
+    from sentence_transformers import SentenceTransformer, CrossEncoder
+
+    if stage == "embedding":
+        model = SentenceTransformer('all-MiniLM-L6-v2')
+        return lambda texts: model.encode(texts, show_progress_bar=False).tolist()
+    reranker = CrossEncoder('BAAI/bge-reranker-large')
+    return lambda pairs: list(reranker.predict(pairs))
+
+
+def make_items(stage: str, items_per_request: int) -> List[Any]:
+    """Items a single request contributes (query texts or query/passage pairs)."""
+    query = "robotic bricklaying system with vision-guided placement"
+    passage = "A construction robot comprising a boom, an end effector and a laser tracker. " * 8
+    if stage == "embedding":
+        return [query] * items_per_request
+    return [[query, passage] for _ in range(items_per_request)]
+
+
+def run_point(
+    batch_fn: Callable[[List[Any]], List[Any]],
+    items: List[Any],
+    concurrency: int,
+    requests_per_client: int,
+    max_wait_ms: float,
+    max_batch: int
+) -> Dict[str, Any]:
+    """Measure one configuration; max_batch=0 disables batching."""
+    batcher = MicroBatcher(batch_fn, max_batch=max_batch, max_wait_ms=max_wait_ms, name="bench") if max_batch else None
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def client():
+        local: List[float] = []
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            if batcher is not None:
+                batcher.submit(items)
+            else:
+                batch_fn(items)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lat_ms = np.array(latencies) * 1000.0
+    return {
+        "concurrency": concurrency,
+        "max_wait_ms": max_wait_ms,
+        "max_batch": max_batch,
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": float(np.percentile(lat_ms, 50)),
+        "p99_ms": float(np.percentile(lat_ms, 99)),
+        "mean_batch_items": (batcher.items / batcher.batches) if batcher and batcher.batches else float(len(items))
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Micro-batching throughput vs p99 latency sweep")
+    parser.add_argument("--stage", choices=["embedding", "rerank"], default="embedding")
+    parser.add_argument("--backend", choices=["synthetic", "local"], default="synthetic")
+    parser.add_argument("--per-call-ms", type=float, default=8.0, help="Synthetic fixed cost per inference call")
+    parser.add_argument("--per-item-ms", type=float, default=0.5, help="Synthetic cost per item")
+    parser.add_argument("--items-per-request", type=int, default=None,
+                        help="Items per request (default: 4 for embedding, 50 for rerank)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[1.0, 5.0, 10.0])
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[0, 64, 256],
+                        help="Batch caps to sweep; 0 means batching disabled")
+    parser.add_argument("--requests-per-client", type=int, default=20)
+    parser.add_argument("--output", type=str, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    items_per_request = args.items_per_request or (4 if args.stage == "embedding" else 50)
+    items = make_items(args.stage, items_per_request)
+    if args.backend == "local":
+        batch_fn = local_batch_fn(args.stage)
+    else:
+        batch_fn = synthetic_batch_fn(args.per_call_ms, args.per_item_ms)
+
+    results = []
+    print(f"{'conc':>5} {'wait_ms':>8} {'batch':>6} {'rps':>9} {'p50_ms':>9} {'p99_ms':>9} {'avg_items':>10}")
+    for concurrency in args.concurrency:
+        for max_batch in args.max_batch:
+            waits = [0.0] if max_batch == 0 else args.max_wait_ms
+            for max_wait_ms in waits:
+                row = run_point(batch_fn, items, concurrency, args.requests_per_client, max_wait_ms, max_batch)
+                results.append(row)
+                print(f"{concurrency:>5} {max_wait_ms:>8.1f} {max_batch:>6} {row['throughput_rps']:>9.1f} "
+                      f"{row['p50_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['mean_batch_items']:>10.1f}")
+
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, "w") as f:
+            json.dump({
+                "stage": args.stage,
+                "backend": args.backend,
+                "items_per_request": items_per_request,
+                "results": results
+            }, f, indent=2)
+        print(f"\nResults saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Two-stage patent -> chunk vector search versus searching every chunk.
+
+Builds an mmap chunk index and the patent index (patent_index.py) over a
+synthetic corpus (synthetic_patents.py). The abstract chunk's vector stands
+in for the title+abstract embedding ingest.py computes. For each number of
+candidate patents it reports:
+  latency       patent lookup + restricted chunk query, per query
+  rows scored   vectors compared per query, against the full chunk count
+  recall        overlap of the patent-deduped top 10 / top k with the
+                deduped results of exact search over all chunks, which is
+                what retrieval returns, plus raw chunk recall
+
+    python bench_patent_index.py --chunks 100000 --claims-per-patent 12 --description-chunks 4 --candidates 50,100,200,400
+"""
+
+import gc
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from bench_history import environment_fingerprint
+from bench_retrieval import latency_summary, timed
+from bench_vector_store import recall_at_k
+from patent_index import PatentIndex, build_patent_index
+from synthetic_patents import SyntheticPatentGenerator, synthetic_embeddings, synthetic_queries
+from vector_store import open_vector_store
+
+
+def dedupe_patents(metadatas: List[Dict[str, Any]]) -> List[str]:
+    """Patent numbers in result order, first hit per patent (as _fuse_results does)."""
+    return list(dict.fromkeys(meta["patent_number"] for meta in metadatas))
+
+
+def overlap(found: List[List[str]], expected: List[List[str]], k: int) -> float:
+    return round(float(np.mean([len(set(a[:k]) & set(b[:k])) / max(1, len(b[:k])) for a, b in zip(found, expected)])), 4)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Patent-first two-stage vector search against a full chunk scan")
+    parser.add_argument("--chunks", type=int, default=100000, help="Corpus size in chunks")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimensions")
+    parser.add_argument("--claims-per-patent", type=int, default=12)
+    parser.add_argument("--description-chunks", type=int, default=4)
+    parser.add_argument("--candidates", type=str, default="50,100,200,400", help="Comma-separated candidate patent counts")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=50, help="Patents kept (RETRIEVAL_TOP_K); the chunk query asks for 2 x top-k")
+    parser.add_argument("--batch", type=int, default=10000, help="Chunks per add() call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", type=str, help="Where to build the indexes (default: a temp dir)")
+    parser.add_argument("--output", type=str, default="benchmarks/patent_index.json")
+    args = parser.parse_args()
+
+    n_results = 2 * args.top_k
+    generator = SyntheticPatentGenerator(
+        claims_per_patent=args.claims_per_patent, description_chunks=args.description_chunks, seed=args.seed
+    )
+    ids, documents, metadatas = generator.chunks(args.chunks)
+    embeddings = synthetic_embeddings(metadatas, dim=args.dim, seed=args.seed)
+    query_vectors = synthetic_queries(embeddings, args.queries, seed=args.seed + 1)
+    summaries = {meta["patent_number"]: embeddings[row] for row, meta in enumerate(metadatas) if meta["section"] == "abstract"}
+
+    report: Dict[str, Any] = {
+        "benchmark": "patent_index",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment_fingerprint(),
+        "config": vars(args),
+        "chunks": args.chunks,
+        "patents": len(summaries),
+        "chunks_per_patent": round(args.chunks / max(1, len(summaries)), 1)
+    }
+    with tempfile.TemporaryDirectory(prefix="bench_patents_", dir=args.workdir) as workdir:
+        store = open_vector_store("mmap", Path(workdir), reset=True)
+        for i in range(0, args.chunks, args.batch):
+            store.add(ids[i:i + args.batch], embeddings[i:i + args.batch],
+                      documents[i:i + args.batch], metadatas[i:i + args.batch])
+        full_ms = [timed(lambda: store.query([vector.tolist()], n_results=n_results)) for vector in query_vectors]
+        truth = store.query(query_vectors.tolist(), n_results=n_results)
+        truth_patents = [dedupe_patents(metas) for metas in truth["metadatas"]]
+        report["full_scan"] = {"query": latency_summary(full_ms), "rows_scored": args.chunks}
+
+        start = time.perf_counter()
+        build_patent_index(Path(workdir), embeddings, metadatas, summaries)
+        patents = PatentIndex(Path(workdir))
+        report["patent_index"] = {"build_seconds": round(time.perf_counter() - start, 2), "vectors": patents.store.count()}
+        print(f"{report['patents']} patents, {report['chunks_per_patent']} chunks each; "
+              f"full scan p50 {report['full_scan']['query']['p50_ms']:.2f} ms")
+        print(f"{'cands':>6} {'p50 ms':>8} {'p95 ms':>8} {'rows':>8} {'pat@10':>7} {f'pat@{args.top_k}':>7} {f'chunk@{n_results}':>9}")
+
+        sweep = []
+        for n_candidates in [int(c) for c in args.candidates.split(",") if c.strip()]:
+            def two_stage(vector: np.ndarray) -> Dict[str, Any]:
+                candidates = patents.candidates(vector.tolist(), n_candidates)
+                return store.query([vector.tolist()], n_results=n_results, where=PatentIndex.restrict(None, candidates))
+
+            latency_ms = [timed(lambda: two_stage(vector)) for vector in query_vectors]
+            results = [two_stage(vector) for vector in query_vectors]
+            found = {"ids": [r["ids"][0] for r in results]}
+            found_patents = [dedupe_patents(r["metadatas"][0]) for r in results]
+            rows_scored = patents.store.count() + float(np.mean([
+                int(store.filter.mask({"patent_number": {"$in": patents.candidates(v.tolist(), n_candidates)}}).sum())
+                for v in query_vectors[:10]
+            ]))
+            row = {
+                "candidates": n_candidates,
+                "query": latency_summary(latency_ms),
+                "rows_scored": int(rows_scored),
+                "patent_recall_at_10": overlap(found_patents, truth_patents, 10),
+                f"patent_recall_at_{args.top_k}": overlap(found_patents, truth_patents, args.top_k),
+                f"chunk_recall_at_{n_results}": recall_at_k(found, truth["ids"], n_results)
+            }
+            sweep.append(row)
+            print(f"{n_candidates:>6} {row['query']['p50_ms']:>8.2f} {row['query']['p95_ms']:>8.2f} {row['rows_scored']:>8} "
+                  f"{row['patent_recall_at_10']:>7.3f} {row[f'patent_recall_at_{args.top_k}']:>7.3f} "
+                  f"{row[f'chunk_recall_at_{n_results}']:>9.3f}")
+        report["two_stage"] = sweep
+        del store, patents
+        gc.collect()
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Retrieval scaling benchmark: index build time, memory and query latency of
+each retrieval component at several corpus sizes.
+
+For each size a synthetic corpus (synthetic_patents.py) is generated and:
+  bm25      tokenize + build BM25Postings; score queries through the app's
+            _bm25_scores (including the per-id dict it returns) and as a
+            4-query matrix, like multi-query expansion
+  vector    exact top-k over topic-clustered embeddings with NumPy (the
+            floor any ANN index has to beat); with --chroma also build and
+            query a real Chroma collection
+  fusion    the app's _fuse_scores on the BM25 and vector results
+  hybrid    bm25 + vector + fusion for one query, end to end
+  rerank    with --rerank, the cross-encoder over the top candidates
+
+Results go to benchmarks/retrieval.json. The 1M-chunk size needs several GB of
+RAM because BM25 keeps the tokenized corpus in memory while building, just as
+the API does.
+
+    python bench_retrieval.py --sizes 10000,100000,1000000 --queries 50
+"""
+
+import gc
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from bm25_index import BM25Postings
+from bench_history import environment_fingerprint
+from synthetic_patents import SyntheticPatentGenerator, parse_weights, synthetic_embeddings, synthetic_queries
+
+
+def rss_mb() -> float:
+    """Resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def latency_summary(samples_ms: List[float]) -> Dict[str, float]:
+    arr = np.asarray(samples_ms)
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "mean_ms": round(float(arr.mean()), 3)
+    }
+
+
+def timed(fn: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000.0
+
+
+def flat_search(embeddings: np.ndarray, ids: List[str], query: np.ndarray, n_results: int) -> Dict[str, Any]:
+    """Exact nearest neighbours in Chroma's result shape (squared L2 distances)."""
+    similarities = embeddings @ query
+    n_results = min(n_results, len(ids))
+    top = np.argpartition(-similarities, n_results - 1)[:n_results]
+    top = top[np.argsort(-similarities[top])]
+    return {"ids": [[ids[i] for i in top]], "distances": [(2.0 - 2.0 * similarities[top]).tolist()]}
+
+
+def bench_size(
+    size: int,
+    generator: SyntheticPatentGenerator,
+    args: argparse.Namespace,
+    generator_cls: Any,
+    reranker: Any
+) -> Dict[str, Any]:
+    """Build every component over `size` chunks and time it."""
+    result: Dict[str, Any] = {"chunks": size}
+    start = time.perf_counter()
+    ids, documents, metadatas = generator.chunks(size)
+    result["generate_seconds"] = round(time.perf_counter() - start, 2)
+    result["mean_words_per_chunk"] = round(sum(len(doc.split()) for doc in documents[:5000]) / min(5000, len(documents)), 1)
+    queries = generator.queries(args.queries)
+
+    # BM25 build, as index_snapshot.load_bm25 does it for an index without bm25.npz
+    gc.collect()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    tokenized = [doc.split() for doc in documents]
+    tokenize_seconds = time.perf_counter() - start
+    bm25 = BM25Postings(tokenized)
+    build_seconds = time.perf_counter() - start
+    rss_peak = rss_mb()
+    del tokenized
+    gc.collect()
+    index_bytes = bm25.doc_ids.nbytes + bm25.weights.nbytes + bm25.offsets.nbytes + bm25.idf.nbytes
+    result["bm25_build"] = {
+        "seconds": round(build_seconds, 3),
+        "chunks_per_second": round(size / build_seconds, 1),
+        "tokenize_seconds": round(tokenize_seconds, 3),
+        "vocabulary": len(bm25.vocab),
+        "postings": int(bm25.doc_ids.size),
+        "index_mb": round(index_bytes / 2 ** 20, 1),
+        "rss_delta_mb": round(rss_peak - rss_before, 1),
+        "rss_after_mb": round(rss_mb(), 1)
+    }
+
+    # The generator methods only touch these attributes
+    state = SimpleNamespace(bm25=bm25, corpus_ids=ids)
+    bm25_ms = [timed(lambda: generator_cls._bm25_scores(state, [[query]])) for query in queries]
+    expansion_sets = [[query.split() for query in queries[i:i + 4]] for i in range(0, len(queries) - 3, 4)]
+    matrix_ms = [timed(lambda: bm25.get_scores_matrix(query_set)) for query_set in expansion_sets]
+    result["bm25_query"] = latency_summary(bm25_ms)
+    result["bm25_matrix_4_queries"] = latency_summary(matrix_ms) if matrix_ms else None
+
+    # Vector search (exact, in memory)
+    start = time.perf_counter()
+    embeddings = synthetic_embeddings(metadatas, dim=args.dim, seed=args.seed)
+    result["vector_build"] = {
+        "seconds": round(time.perf_counter() - start, 3),
+        "dim": args.dim,
+        "matrix_mb": round(embeddings.nbytes / 2 ** 20, 1),
+        "rss_after_mb": round(rss_mb(), 1)
+    }
+    query_vectors = synthetic_queries(embeddings, args.queries, seed=args.seed + 1)
+    n_results = args.top_k * 2
+    vector_ms = [timed(lambda: flat_search(embeddings, ids, vector, n_results)) for vector in query_vectors]
+    result["vector_query"] = latency_summary(vector_ms)
+
+    if args.chroma:
+        result["chroma"] = bench_chroma(ids, documents, metadatas, embeddings, query_vectors, n_results)
+
+    # Fusion and the hybrid path
+    fusion_ms = []
+    hybrid_ms = []
+    fused_ids: List[List[str]] = []
+    for query, vector in zip(queries, query_vectors):
+        start = time.perf_counter()
+        scores = generator_cls._bm25_scores(state, [[query]])[0]
+        vector_result = flat_search(embeddings, ids, vector, n_results)
+        fusion_start = time.perf_counter()
+        fused = generator_cls._fuse_scores(scores, vector_result, args.top_k)
+        end = time.perf_counter()
+        fusion_ms.append((end - fusion_start) * 1000.0)
+        hybrid_ms.append((end - start) * 1000.0)
+        fused_ids.append([doc_id for doc_id, _ in fused])
+    result["fusion"] = latency_summary(fusion_ms)
+    result["hybrid"] = latency_summary(hybrid_ms)
+
+    if reranker is not None:
+        positions = {doc_id: i for i, doc_id in enumerate(ids)}
+        rerank_ms = []
+        for query, candidates in zip(queries[:args.rerank_queries], fused_ids):
+            docs = [{"chunk_id": doc_id, "text": documents[positions[doc_id]]} for doc_id in candidates]
+            rerank_state = SimpleNamespace(reranker=reranker, rerank_batcher=None)
+            rerank_ms.append(timed(lambda: generator_cls._rerank(rerank_state, query, docs, 10)))
+        result["rerank"] = dict(latency_summary(rerank_ms), pairs=args.top_k)
+
+    result["rss_peak_mb"] = round(rss_mb(), 1)
+    return result
+
+
+def bench_chroma(
+    ids: List[str],
+    documents: List[str],
+    metadatas: List[Dict[str, Any]],
+    embeddings: np.ndarray,
+    query_vectors: np.ndarray,
+    n_results: int
+) -> Dict[str, Any]:
+    """Build a throwaway Chroma collection and time add, query and get."""
+    import tempfile
+    import chromadb
+    from chromadb.config import Settings
+
+    with tempfile.TemporaryDirectory(prefix="bench_chroma_") as path:
+        client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+        collection = client.create_collection("bench")
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        batch = 5000
+        for i in range(0, len(ids), batch):
+            collection.add(
+                ids=ids[i:i + batch],
+                embeddings=embeddings[i:i + batch].tolist(),
+                documents=documents[i:i + batch],
+                metadatas=metadatas[i:i + batch]
+            )
+        build_seconds = time.perf_counter() - start
+        query_ms = []
+        get_ms = []
+        for vector in query_vectors:
+            start = time.perf_counter()
+            results = collection.query(query_embeddings=[vector.tolist()], n_results=n_results)
+            query_ms.append((time.perf_counter() - start) * 1000.0)
+            get_ms.append(timed(lambda: collection.get(ids=results["ids"][0][:n_results // 2])))
+        return {
+            "build_seconds": round(build_seconds, 2),
+            "rss_delta_mb": round(rss_mb() - rss_before, 1),
+            "query": latency_summary(query_ms),
+            "get": latency_summary(get_ms)
+        }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark retrieval components against synthetic corpora")
+    parser.add_argument("--sizes", type=str, default="10000,100000", help="Comma-separated corpus sizes in chunks")
+    parser.add_argument("--queries", type=int, default=50, help="Queries timed per component")
+    parser.add_argument("--top-k", type=int, default=50, help="Retrieval depth (vector search fetches 2x)")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimensions")
+    parser.add_argument("--vocab-size", type=int, default=50000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of word frequencies")
+    parser.add_argument("--cpc-weights", type=str, default="", help='e.g. "B25J=0.5,E04G=0.3,B66C=0.2"')
+    parser.add_argument("--year-min", type=int, default=2000)
+    parser.add_argument("--year-max", type=int, default=2024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chroma", action="store_true", help="Also build and query a Chroma collection")
+    parser.add_argument("--rerank", action="store_true", help="Also time the cross-encoder over the top candidates")
+    parser.add_argument("--rerank-queries", type=int, default=10)
+    parser.add_argument("--output", type=str, default="benchmarks/retrieval.json")
+    args = parser.parse_args()
+
+    from app import DesignGenerator
+
+    reranker = None
+    if args.rerank:
+        from sentence_transformers import CrossEncoder
+        reranker = CrossEncoder('BAAI/bge-reranker-large')
+
+    results = []
+    print(f"{'chunks':>9} {'bm25 build s':>12} {'bm25 MB':>8} {'bm25 p50':>9} {'vec p50':>8} {'fuse p50':>9} {'hybrid p95':>11} {'RSS MB':>8}")
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        generator = SyntheticPatentGenerator(
+            vocab_size=args.vocab_size,
+            zipf_s=args.zipf,
+            cpc_weights=parse_weights(args.cpc_weights) or None,
+            year_min=args.year_min,
+            year_max=args.year_max,
+            seed=args.seed
+        )
+        row = bench_size(size, generator, args, DesignGenerator, reranker)
+        results.append(row)
+        print(
+            f"{size:>9} {row['bm25_build']['seconds']:>12.2f} {row['bm25_build']['index_mb']:>8.1f} "
+            f"{row['bm25_query']['p50_ms']:>9.2f} {row['vector_query']['p50_ms']:>8.2f} {row['fusion']['p50_ms']:>9.2f} "
+            f"{row['hybrid']['p95_ms']:>11.2f} {row['rss_peak_mb']:>8.0f}"
+        )
+        gc.collect()
+
+    report = {
+        "benchmark": "retrieval",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment_fingerprint(),
+        "config": vars(args),
+        "results": results
+    }
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Startup benchmark: import time of app.py and time-to-ready of the API server.
+
+Import time is measured in fresh interpreters; time-to-ready launches uvicorn,
+polls /health (process is live) and /ready (models loaded and warmed up).
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List
+
+import requests
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+
+
+def measure_import(runs: int) -> Dict[str, Any]:
+    """Time `import app` in fresh interpreters."""
+    samples: List[float] = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET],
+            capture_output=True, text=True, check=True
+        )
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return {
+        "runs": runs,
+        "median_seconds": round(statistics.median(samples), 4),
+        "min_seconds": round(min(samples), 4),
+        "max_seconds": round(max(samples), 4)
+    }
+
+
+def top_imports(limit: int) -> List[Dict[str, Any]]:
+    """Slowest modules by cumulative import time, from `python -X importtime`."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        capture_output=True, text=True
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        rows.append({"module": fields[2].strip(), "cumulative_ms": int(fields[1]) / 1000.0})
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+def measure_time_to_ready(port: int, timeout: float) -> Dict[str, Any]:
+    """Launch uvicorn and time until /health and /ready succeed."""
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=dict(os.environ)
+    )
+    result: Dict[str, Any] = {"live_seconds": None, "ready_seconds": None, "components": None}
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                result["error"] = f"server exited with code {proc.returncode}"
+                break
+            try:
+                if result["live_seconds"] is None:
+                    requests.get(f"{base_url}/health", timeout=1).raise_for_status()
+                    result["live_seconds"] = round(time.perf_counter() - start, 3)
+                response = requests.get(f"{base_url}/ready", timeout=1)
+                if response.status_code == 200:
+                    result["ready_seconds"] = round(time.perf_counter() - start, 3)
+                    result["components"] = response.json().get("components")
+                    break
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(0.1)
+        else:
+            result["error"] = f"not ready after {timeout}s"
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return result
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark API import time and time-to-ready")
+    parser.add_argument("--import-runs", type=int, default=5)
+    parser.add_argument("--top-imports", type=int, default=10, help="Show the N slowest imports")
+    parser.add_argument("--skip-server", action="store_true", help="Only measure import time")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--output", type=str, help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {"import": measure_import(args.import_runs)}
+    print(f"import app: median {results['import']['median_seconds']}s over {args.import_runs} runs")
+
+    if args.top_imports:
+        results["slowest_imports"] = top_imports(args.top_imports)
+        for row in results["slowest_imports"]:
+            print(f"  {row['cumulative_ms']:>9.1f} ms  {row['module']}")
+
+    if not args.skip_server:
+        results["server"] = measure_time_to_ready(args.port, args.timeout)
+        server = results["server"]
+        print(f"time-to-live: {server['live_seconds']}s, time-to-ready: {server['ready_seconds']}s")
+        for name, component in (server.get("components") or {}).items():
+            print(f"  {name:<16} {component.get('state', ''):<10} {component.get('seconds', '')}")
+        if server.get("error"):
+            print(f"error: {server['error']}")
+
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
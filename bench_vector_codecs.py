@@ -0,0 +1,136 @@
+"""
+Compressed vector codes: memory, build time and recall loss per codec.
+
+Builds one mmap (or ivf) index over a synthetic corpus (synthetic_patents.py),
+then encodes it with each codec in turn (vector_codecs.py) and reports:
+  memory    bytes per chunk and MB of codes held in memory for the scan,
+            against the float32 matrix the uncompressed scan reads
+  build     codec training + encoding time
+  query     latency and recall@10 / recall@k against exact float32 search
+            for each rescore factor (0 = code distances only, n = the best
+            n x k by code distance re-ranked with the vectors on disk)
+
+    python bench_vector_codecs.py --chunks 100000 --dim 768 --codecs int8,pq --rescore 0,2,4,8
+    python bench_vector_codecs.py --dim 3072 --codecs matryoshka:128,matryoshka:256,matryoshka:512
+
+A codec may carry its main option after a colon: pq:<subvectors>,
+matryoshka:<dims>.
+"""
+
+import gc
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from bench_history import environment_fingerprint
+from bench_retrieval import latency_summary, timed
+from bench_vector_store import recall_at_k
+from synthetic_patents import SyntheticPatentGenerator, synthetic_embeddings, synthetic_queries
+from vector_store import open_vector_store
+
+# The option a codec spec's ":<value>" sets
+CODEC_SPEC_OPTIONS = {"pq": "subvectors", "matryoshka": "dims"}
+
+
+def query_stats(store, query_vectors: np.ndarray, truth: List[List[str]], top_k: int, **options) -> Dict[str, Any]:
+    latency_ms = [timed(lambda: store.query([vector.tolist()], n_results=top_k, **options)) for vector in query_vectors]
+    results = store.query(query_vectors.tolist(), n_results=top_k, **options)
+    return {
+        "query": latency_summary(latency_ms),
+        "recall_at_10": recall_at_k(results, truth, 10),
+        f"recall_at_{top_k}": recall_at_k(results, truth, top_k)
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Memory, build time and recall of compressed vector codes")
+    parser.add_argument("--chunks", type=int, default=100000, help="Corpus size in chunks")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimensions")
+    parser.add_argument("--backend", type=str, default="mmap", choices=["mmap", "ivf"])
+    parser.add_argument("--codecs", type=str, default="int8,pq", help="Comma-separated codec specs (pq:96, matryoshka:256)")
+    parser.add_argument("--rescore", type=str, default="0,2,4,8", help="Comma-separated rescore factors")
+    parser.add_argument("--nprobe", type=int, default=32, help="ivf lists per query")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=100, help="Results per query (the app asks for 2 x RETRIEVAL_TOP_K)")
+    parser.add_argument("--batch", type=int, default=10000, help="Chunks per add() call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", type=str, help="Where to build the index (default: a temp dir)")
+    parser.add_argument("--output", type=str, default="benchmarks/vector_codecs.json")
+    args = parser.parse_args()
+
+    codecs = [c.strip() for c in args.codecs.split(",") if c.strip()]
+    rescores = [int(r) for r in args.rescore.split(",") if r.strip()]
+    generator = SyntheticPatentGenerator(seed=args.seed)
+    ids, documents, metadatas = generator.chunks(args.chunks)
+    embeddings = synthetic_embeddings(metadatas, dim=args.dim, seed=args.seed)
+    query_vectors = synthetic_queries(embeddings, args.queries, seed=args.seed + 1)
+    search_options = {"nprobe": args.nprobe} if args.backend == "ivf" else {}
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_codecs_", dir=args.workdir) as workdir:
+        store = open_vector_store(args.backend, Path(workdir), reset=True)
+        for i in range(0, args.chunks, args.batch):
+            store.add(ids[i:i + args.batch], embeddings[i:i + args.batch],
+                      documents[i:i + args.batch], metadatas[i:i + args.batch])
+        if args.backend == "ivf":
+            store.train(seed=args.seed)
+        truth = store.query(query_vectors.tolist(), n_results=args.top_k, nprobe=store.centroids.shape[0]) \
+            if args.backend == "ivf" else store.query(query_vectors.tolist(), n_results=args.top_k)
+        truth_ids = truth["ids"]
+
+        # Baseline: the scan reads the float32 matrix itself
+        baseline = {"codec": "none", "bytes_per_chunk": 4 * args.dim, "scan_mb": round(store.vectors.nbytes / 2 ** 20, 1)}
+        baseline.update(query_stats(store, query_vectors, truth_ids, args.top_k, **search_options))
+        results.append(baseline)
+        print(f"{'codec':>14} {'rescore':>8} {'B/chunk':>8} {'scan MB':>8} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'r@10':>6} {f'r@{args.top_k}':>6}")
+        print(f"{'none':>14} {'-':>8} {baseline['bytes_per_chunk']:>8} {baseline['scan_mb']:>8.0f} {'-':>8} "
+              f"{baseline['query']['p50_ms']:>8.2f} {baseline['query']['p95_ms']:>8.2f} "
+              f"{baseline['recall_at_10']:>6.3f} {baseline[f'recall_at_{args.top_k}']:>6.3f}")
+
+        for codec in codecs:
+            name, _, value = codec.partition(":")
+            options = {CODEC_SPEC_OPTIONS[name]: int(value)} if value else {}
+            start = time.perf_counter()
+            store.train_codec(name, seed=args.seed, **options)
+            build_seconds = time.perf_counter() - start
+            scan_bytes = store.codes.nbytes + (store.code_terms.nbytes if store.code_terms is not None else 0)
+            row: Dict[str, Any] = {
+                "codec": codec,
+                "bytes_per_chunk": int(store.codes[0].nbytes),
+                "scan_mb": round(scan_bytes / 2 ** 20, 1),
+                "build_seconds": round(build_seconds, 2),
+                "rescore": []
+            }
+            for rescore in rescores:
+                stats = query_stats(store, query_vectors, truth_ids, args.top_k, rescore=rescore, **search_options)
+                row["rescore"].append(dict(factor=rescore, **stats))
+                print(f"{codec:>14} {rescore:>8} {row['bytes_per_chunk']:>8} {row['scan_mb']:>8.0f} {build_seconds:>8.1f} "
+                      f"{stats['query']['p50_ms']:>8.2f} {stats['query']['p95_ms']:>8.2f} "
+                      f"{stats['recall_at_10']:>6.3f} {stats[f'recall_at_{args.top_k}']:>6.3f}")
+            results.append(row)
+            gc.collect()
+
+    report = {
+        "benchmark": "vector_codecs",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment_fingerprint(),
+        "config": vars(args),
+        "chunks": args.chunks,
+        "dim": args.dim,
+        "results": results
+    }
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
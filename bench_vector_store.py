@@ -0,0 +1,147 @@
+"""
+Vector store benchmark: Chroma versus the memory-mapped exact backend.
+
+For each corpus size a synthetic corpus (synthetic_patents.py) with
+topic-clustered embeddings is written to each backend in a temporary
+directory, then:
+  build     add time, on-disk size and RSS growth
+  open      time to reopen the index from disk (what an API worker pays)
+  query     top-k latency, unfiltered and with a CPC filter
+  get       fetching the fused top ids by id, as _fuse_results does
+  recall    recall@k against exact float32 search
+
+    python bench_vector_store.py --sizes 10000,100000 --dim 768 --backends chroma,mmap,mmap:float16
+
+A backend may carry a storage dtype after a colon (mmap:float16).
+"""
+
+import gc
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from bench_history import environment_fingerprint
+from bench_retrieval import flat_search, latency_summary, rss_mb, timed
+from synthetic_patents import SyntheticPatentGenerator, synthetic_embeddings, synthetic_queries
+from vector_store import open_vector_store
+
+
+def directory_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) / 2 ** 20
+
+
+def recall_at_k(results: Dict[str, Any], truth: List[List[str]], k: int) -> float:
+    hits = [len(set(found[:k]) & set(expected[:k])) / k for found, expected in zip(results["ids"], truth)]
+    return round(float(np.mean(hits)), 4)
+
+
+def bench_backend(
+    spec: str,
+    directory: Path,
+    ids: List[str],
+    documents: List[str],
+    metadatas: List[Dict[str, Any]],
+    embeddings: np.ndarray,
+    query_vectors: np.ndarray,
+    truth: List[List[str]],
+    args: argparse.Namespace
+) -> Dict[str, Any]:
+    """Build, reopen and query one backend."""
+    backend, _, dtype = spec.partition(":")
+    options = {"dtype": dtype} if dtype else {}
+    gc.collect()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    store = open_vector_store(backend, directory, reset=True, **options)
+    for i in range(0, len(ids), args.batch):
+        store.add(ids[i:i + args.batch], embeddings[i:i + args.batch].tolist(),
+                  documents[i:i + args.batch], metadatas[i:i + args.batch])
+    build_seconds = time.perf_counter() - start
+    del store
+    gc.collect()
+
+    start = time.perf_counter()
+    store = open_vector_store(backend, directory)
+    open_seconds = time.perf_counter() - start
+
+    where = {"cpc": {"$in": args.filter_cpc.split(",")}}
+    query_ms = [timed(lambda: store.query([vector.tolist()], n_results=args.top_k)) for vector in query_vectors]
+    filtered_ms = [timed(lambda: store.query([vector.tolist()], n_results=args.top_k, where=where)) for vector in query_vectors]
+    batch_ms = timed(lambda: store.query(query_vectors.tolist(), n_results=args.top_k))
+    results = store.query(query_vectors.tolist(), n_results=args.top_k)
+    get_ms = [timed(lambda: store.get(ids=found[:args.top_k // 2])) for found in results["ids"]]
+    return {
+        "backend": spec,
+        "build_seconds": round(build_seconds, 2),
+        "open_seconds": round(open_seconds, 3),
+        "disk_mb": round(directory_mb(directory), 1),
+        "rss_delta_mb": round(rss_mb() - rss_before, 1),
+        "query": latency_summary(query_ms),
+        "query_filtered": latency_summary(filtered_ms),
+        "query_batch_per_query_ms": round(batch_ms / len(query_vectors), 3),
+        "get": latency_summary(get_ms),
+        f"recall_at_{args.top_k}": recall_at_k(results, truth, args.top_k),
+        "recall_at_10": recall_at_k(results, truth, 10)
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Compare vector store backends on synthetic corpora")
+    parser.add_argument("--sizes", type=str, default="10000,100000", help="Comma-separated corpus sizes in chunks")
+    parser.add_argument("--backends", type=str, default="chroma,mmap,mmap:float16")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimensions")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=100, help="Results per query (the app asks for 2 x RETRIEVAL_TOP_K)")
+    parser.add_argument("--filter-cpc", type=str, default="E04G,E04B", help="CPC codes for the filtered query")
+    parser.add_argument("--batch", type=int, default=5000, help="Chunks per add() call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", type=str, help="Where to build the indexes (default: a temp dir)")
+    parser.add_argument("--output", type=str, default="benchmarks/vector_store.json")
+    args = parser.parse_args()
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    results = []
+    print(f"{'chunks':>9} {'backend':>13} {'build s':>8} {'open s':>7} {'disk MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'filt p50':>9} {'get p50':>8} {'recall':>7}")
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        generator = SyntheticPatentGenerator(seed=args.seed)
+        ids, documents, metadatas = generator.chunks(size)
+        embeddings = synthetic_embeddings(metadatas, dim=args.dim, seed=args.seed)
+        query_vectors = synthetic_queries(embeddings, args.queries, seed=args.seed + 1)
+        truth = [flat_search(embeddings, ids, vector, args.top_k)["ids"][0] for vector in query_vectors]
+
+        row: Dict[str, Any] = {"chunks": size, "dim": args.dim, "backends": []}
+        with tempfile.TemporaryDirectory(prefix="bench_vs_", dir=args.workdir) as workdir:
+            for backend in backends:
+                stats = bench_backend(backend, Path(workdir) / backend.replace(":", "_"), ids, documents, metadatas,
+                                      embeddings, query_vectors, truth, args)
+                row["backends"].append(stats)
+                print(
+                    f"{size:>9} {backend:>13} {stats['build_seconds']:>8.1f} {stats['open_seconds']:>7.2f} {stats['disk_mb']:>8.0f} "
+                    f"{stats['query']['p50_ms']:>8.2f} {stats['query']['p95_ms']:>8.2f} {stats['query_filtered']['p50_ms']:>9.2f} "
+                    f"{stats['get']['p50_ms']:>8.2f} {stats[f'recall_at_{args.top_k}']:>7.3f}"
+                )
+                gc.collect()
+        results.append(row)
+
+    report = {
+        "benchmark": "vector_store",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment_fingerprint(),
+        "config": vars(args),
+        "results": results
+    }
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Inverted-index BM25 scorer with batched (matrix) scoring.
+
+Scores are identical to rank_bm25.BM25Okapi (same k1, b, epsilon and idf
+floor), but the index is stored as flat NumPy postings so many queries can be
+scored at once: each distinct query term is scattered into a
+(queries x documents) score matrix in one vectorized operation.
+"""
+
+import math
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+
+class BM25Postings:
+    """BM25Okapi-compatible index over a tokenized corpus."""
+
+    def __init__(self, tokenized_corpus: Sequence[Sequence[str]], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.corpus_size = len(tokenized_corpus)
+
+        doc_len = np.fromiter((len(doc) for doc in tokenized_corpus), dtype=np.float32, count=self.corpus_size)
+        self.avgdl = float(doc_len.mean()) if self.corpus_size else 0.0
+
+        # term -> ([doc indices], [term frequencies])
+        postings: Dict[str, List[List[int]]] = {}
+        for doc_idx, doc in enumerate(tokenized_corpus):
+            frequencies: Dict[str, int] = {}
+            for token in doc:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            for token, freq in frequencies.items():
+                entry = postings.get(token)
+                if entry is None:
+                    postings[token] = [[doc_idx], [freq]]
+                else:
+                    entry[0].append(doc_idx)
+                    entry[1].append(freq)
+
+        # Same idf as BM25Okapi: negative values are floored at epsilon * mean idf
+        idf: Dict[str, float] = {}
+        idf_sum = 0.0
+        negative = []
+        for token, (docs, _) in postings.items():
+            value = math.log(self.corpus_size - len(docs) + 0.5) - math.log(len(docs) + 0.5)
+            idf[token] = value
+            idf_sum += value
+            if value < 0:
+                negative.append(token)
+        floor = self.epsilon * (idf_sum / len(idf)) if idf else 0.0
+        for token in negative:
+            idf[token] = floor
+
+        # Flatten into one contiguous array; each term owns a slice
+        self.vocab: Dict[str, int] = {}
+        self.offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        self.idf = np.zeros(len(postings), dtype=np.float32)
+        total = sum(len(docs) for docs, _ in postings.values())
+        self.doc_ids = np.empty(total, dtype=np.int32)
+        self.weights = np.empty(total, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * doc_len / self.avgdl) if self.corpus_size else doc_len
+        cursor = 0
+        for term_idx, (token, (docs, freqs)) in enumerate(postings.items()):
+            self.vocab[token] = term_idx
+            self.idf[term_idx] = idf[token]
+            docs_arr = np.asarray(docs, dtype=np.int32)
+            freqs_arr = np.asarray(freqs, dtype=np.float32)
+            end = cursor + len(docs)
+            self.doc_ids[cursor:end] = docs_arr
+            # Precomputed saturated tf * idf for this (term, doc)
+            self.weights[cursor:end] = idf[token] * (freqs_arr * (self.k1 + 1) / (freqs_arr + norm[docs_arr]))
+            cursor = end
+            self.offsets[term_idx + 1] = cursor
+
+    def save(self, path: Union[str, Path], ids: Sequence[str]):
+        """Write the postings and the corpus ids of their documents to an .npz file."""
+        terms = sorted(self.vocab, key=self.vocab.get)
+        np.savez(
+            path,
+            params=np.asarray([self.k1, self.b, self.epsilon, self.avgdl, self.corpus_size], dtype=np.float64),
+            terms=np.asarray(terms, dtype=str),
+            offsets=self.offsets,
+            idf=self.idf,
+            doc_ids=self.doc_ids,
+            weights=self.weights,
+            ids=np.asarray(list(ids), dtype=str)
+        )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Tuple["BM25Postings", List[str]]:
+        """(index, corpus ids) from a file written by save(), without re-tokenizing the corpus."""
+        bm25 = cls.__new__(cls)
+        with np.load(path) as data:
+            k1, b, epsilon, avgdl, corpus_size = data["params"].tolist()
+            bm25.k1, bm25.b, bm25.epsilon, bm25.avgdl = k1, b, epsilon, avgdl
+            bm25.corpus_size = int(corpus_size)
+            bm25.vocab = {term: idx for idx, term in enumerate(data["terms"].tolist())}
+            bm25.offsets = data["offsets"]
+            bm25.idf = data["idf"]
+            bm25.doc_ids = data["doc_ids"]
+            bm25.weights = data["weights"]
+            ids = data["ids"].tolist()
+        return bm25, ids
+
+    def idf_of(self, token: str) -> float:
+        """Inverse document frequency of a token (0 if unseen)."""
+        term_idx = self.vocab.get(token)
+        return float(self.idf[term_idx]) if term_idx is not None else 0.0
+
+    def get_scores(self, query: Sequence[str]) -> np.ndarray:
+        """Score every document for one tokenized query."""
+        return self.get_scores_matrix([query])[0]
+
+    def get_scores_matrix(self, queries: Sequence[Sequence[str]]) -> np.ndarray:
+        """Score every document for many tokenized queries; returns (queries, docs)."""
+        scores = np.zeros((len(queries), self.corpus_size), dtype=np.float32)
+        # Group query occurrences by term so each posting list is read once
+        term_rows: Dict[int, List[int]] = {}
+        for row, query in enumerate(queries):
+            for token in query:
+                term_idx = self.vocab.get(token)
+                if term_idx is not None:
+                    term_rows.setdefault(term_idx, []).append(row)
+        for term_idx, rows in term_rows.items():
+            start, end = self.offsets[term_idx], self.offsets[term_idx + 1]
+            docs = self.doc_ids[start:end]
+            weights = self.weights[start:end]
+            rows_arr, counts = np.unique(np.asarray(rows), return_counts=True)
+            scores[rows_arr[:, None], docs[None, :]] += counts[:, None].astype(np.float32) * weights[None, :]
+        return scores
@@ -0,0 +1,148 @@
+"""
+Token-budgeted context packing for design generation.
+
+Retrieved chunks can be ~1000 words each, so concatenating ten of them makes
+the prompt large, slow and expensive. ContextPacker measures text with the
+generation model's tokenizer, gives each retrieved patent a share of a fixed
+budget (best-scored first, unused share rolls over to the next one), and trims
+passages that do not fit down to their most query-relevant sentences.
+"""
+
+import re
+import math
+import logging
+import importlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?;])\s+")
+
+
+class TokenCounter:
+    """Count tokens with the model's tiktoken encoding, or estimate without it."""
+
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self.model = model
+        self.encoding = None
+        try:
+            tiktoken = importlib.import_module("tiktoken")
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken unavailable ({e}); estimating tokens as characters / 4")
+
+    def count(self, text: str) -> int:
+        """Number of tokens in text."""
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / 4)
+
+
+class ContextPacker:
+    """Fit retrieved passages into a token budget, most relevant first."""
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        token_budget: int = 6000,
+        min_tokens_per_patent: int = 150,
+        idf: Optional[Callable[[str], float]] = None
+    ):
+        self.counter = counter
+        self.token_budget = token_budget
+        self.min_tokens_per_patent = min_tokens_per_patent
+        self.idf = idf or (lambda token: 1.0)
+
+    def pack(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]],
+        header: Callable[[Dict[str, Any]], str],
+        token_budget: Optional[int] = None
+    ) -> Tuple[List[Tuple[Dict[str, Any], str]], Dict[str, int]]:
+        """Choose the text to include for each document.
+
+        Returns (document, text) pairs in score order for the documents that
+        fit, plus packing stats. header(doc) is the citation line that will
+        precede the text and is charged against the budget. token_budget
+        overrides the packer's default for one call.
+        """
+        ranked = sorted(documents, key=self._doc_score, reverse=True)
+        query_terms = set(query.lower().split())
+        remaining = token_budget if token_budget is not None else self.token_budget
+        packed: List[Tuple[Dict[str, Any], str]] = []
+        stats = {"documents": len(documents), "included": 0, "trimmed": 0, "context_tokens": 0}
+
+        for position, doc in enumerate(ranked):
+            docs_left = len(ranked) - position
+            share = max(self.min_tokens_per_patent, remaining // docs_left)
+            allowance = min(share, remaining) - self.counter.count(header(doc)) - 2
+            if allowance <= 0:
+                break
+            text = doc["text"]
+            tokens = self.counter.count(text)
+            if tokens > allowance:
+                text, tokens = self._trim(text, query_terms, allowance)
+                stats["trimmed"] += 1
+                if not text:
+                    continue
+            used = tokens + self.counter.count(header(doc)) + 2
+            remaining -= used
+            stats["context_tokens"] += used
+            stats["included"] += 1
+            packed.append((doc, text))
+        return packed, stats
+
+    @staticmethod
+    def _doc_score(doc: Dict[str, Any]) -> float:
+        score = doc.get("rerank_score")
+        return float(score if score is not None else doc.get("score", 0.0))
+
+    def _sentence_relevance(self, sentence: str, query_terms: set) -> float:
+        terms = sentence.lower().split()
+        if not terms:
+            return 0.0
+        overlap = query_terms.intersection(terms)
+        return sum(self.idf(term) for term in overlap) / (1.0 + math.log1p(len(terms)))
+
+    def _trim(self, text: str, query_terms: set, allowance: int) -> Tuple[str, int]:
+        """Keep the most query-relevant sentences that fit, in original order."""
+        sentences = [s for s in SENTENCE_SPLIT.split(text) if s.strip()]
+        costs = [self.counter.count(s) + 1 for s in sentences]
+        order = sorted(
+            range(len(sentences)),
+            key=lambda i: (self._sentence_relevance(sentences[i], query_terms), -i),
+            reverse=True
+        )
+        chosen = []
+        used = 0
+        for i in order:
+            if used + costs[i] <= allowance:
+                chosen.append(i)
+                used += costs[i]
+        # The gap markers and joins are only known once the sentences are
+        # picked; drop the least relevant choices until the result fits
+        while chosen:
+            trimmed = self._join(sentences, sorted(chosen))
+            tokens = self.counter.count(trimmed)
+            if tokens <= allowance:
+                return trimmed, tokens
+            chosen.pop()
+        return "", 0
+
+    @staticmethod
+    def _join(sentences: List[str], chosen: List[int]) -> str:
+        """The chosen sentences in order, with "..." marking gaps so the model knows text was omitted."""
+        parts = []
+        previous = -1
+        for i in chosen:
+            if i != previous + 1 and parts:
+                parts.append("...")
+            parts.append(sentences[i])
+            previous = i
+        return " ".join(parts)
@@ -88,6 +88,35 @@ def generate_design(prompt: str, filters: Dict[str, Any]) -> Dict[str, Any]:
         raise
 
 
+def generate_designs_batch(eval_prompts: List[Dict[str, Any]], max_concurrency: int = 4) -> Dict[int, Dict[str, Any]]:
+    """Generate all design briefs with one call to the batch endpoint.
+    
+    Returns a mapping from prompt index to the API's per-item result.
+    """
+    url = f"{API_URL}/design/batch"
+    payload = {
+        "requests": [
+            {"prompt": item["prompt"], "filters": item["filters"]}
+            for item in eval_prompts
+        ],
+        "max_concurrency": max_concurrency
+    }
+    
+    results: Dict[int, Dict[str, Any]] = {}
+    try:
+        # Results arrive one JSON line per prompt as each one completes
+        with requests.post(url, json=payload, stream=True, timeout=(5, 300)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    item = json.loads(line)
+                    results[item["index"]] = item
+    except Exception as e:
+        logger.error(f"Error calling batch API: {e}")
+        raise
+    return results
+
+
 def get_context_from_design(design: Dict[str, Any]) -> str:
     """Extract context from design brief citations."""
     citations = design.get("citations", [])
@@ -153,16 +182,16 @@ def run_evaluation():
     ground_truths = []
     
     logger.info(f"Evaluating {len(EVAL_PROMPTS)} prompts...")
+    batch_results = generate_designs_batch(EVAL_PROMPTS)
     
     for i, eval_prompt in enumerate(EVAL_PROMPTS, 1):
         logger.info(f"Evaluating prompt {i}/{len(EVAL_PROMPTS)}: {eval_prompt['prompt']}")
         
         try:
-            # Generate design
-            design = generate_design(
-                prompt=eval_prompt["prompt"],
-                filters=eval_prompt["filters"]
-            )
+            result = batch_results.get(i - 1)
+            if result is None or result["status"] != "ok":
+                raise RuntimeError(result["error"] if result else "no result returned")
+            design = result["design"]
             
             # Extract data
             questions.append(eval_prompt["prompt"])
@@ -0,0 +1,357 @@
+"""
+Immutable, versioned index snapshots published with an atomic pointer swap.
+
+ingest.py writes every index build into a new directory under
+<index_dir>/snapshots and never touches it again once published:
+
+    snapshots/v000003/
+        mmap/, ivf/ or chroma files   chunk vectors, documents and metadata
+        patents/                      patent index (patent_index.py)
+        bm25.npz                      BM25 postings and corpus ids
+        snapshot.json                 version, backend, counts, created
+
+Publishing writes snapshot.json and then replaces <index_dir>/CURRENT, a
+one-line file naming the snapshot, with os.replace, so readers see either the
+old version or the complete new one. PREVIOUS names the version CURRENT
+replaced; rollback() points CURRENT back at it. The API polls CURRENT with a
+SnapshotWatcher and loads new versions in the background (see app.py).
+
+An index built before snapshots existed (no CURRENT file) is served from
+<index_dir> itself.
+
+    python index_snapshot.py list
+    python index_snapshot.py rollback [--version 2]
+    python index_snapshot.py prune --keep 3
+"""
+
+import os
+import re
+import json
+import shutil
+import logging
+import argparse
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bm25_index import BM25Postings
+from telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOTS_SUBDIR = "snapshots"
+CURRENT_FILE = "CURRENT"
+PREVIOUS_FILE = "PREVIOUS"
+SNAPSHOT_MANIFEST = "snapshot.json"
+BM25_FILE = "bm25.npz"
+# Name of an index built straight into <index_dir>, before snapshots
+UNVERSIONED = "unversioned"
+
+_SNAPSHOT_NAME = re.compile(r"^v(\d{6,})$")
+
+index_reloads = metrics.counter("index_reloads_total", "Index snapshot loads by outcome")
+
+
+def snapshot_name(version: int) -> str:
+    return f"v{version:06d}"
+
+
+def snapshot_version(name: str) -> Optional[int]:
+    match = _SNAPSHOT_NAME.match(name)
+    return int(match.group(1)) if match else None
+
+
+def _read_pointer(path: Path) -> Optional[str]:
+    try:
+        name = path.read_text().strip()
+    except FileNotFoundError:
+        return None
+    return name or None
+
+
+def _write_pointer(path: Path, name: str):
+    """Replace a pointer file atomically (readers see the old or the new name, never a partial one)."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w") as f:
+        f.write(name + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _fsync_tree(path: Path):
+    """Flush a finished snapshot's files to disk before it is published."""
+    for root, _, files in os.walk(path):
+        for filename in files:
+            with open(Path(root) / filename, "rb") as f:
+                os.fsync(f.fileno())
+
+
+def current_name(index_dir: Path) -> Optional[str]:
+    """Name of the published snapshot, or None for an unversioned index."""
+    return _read_pointer(Path(index_dir) / CURRENT_FILE)
+
+
+def previous_name(index_dir: Path) -> Optional[str]:
+    return _read_pointer(Path(index_dir) / PREVIOUS_FILE)
+
+
+def current_snapshot(index_dir: Path) -> Tuple[str, Path]:
+    """(name, directory) of the published snapshot; ("unversioned", index_dir) for an unversioned index."""
+    name = current_name(index_dir)
+    if name:
+        return name, Path(index_dir) / SNAPSHOTS_SUBDIR / name
+    return UNVERSIONED, Path(index_dir)
+
+
+def read_manifest(snapshot: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads((Path(snapshot) / SNAPSHOT_MANIFEST).read_text())
+    except FileNotFoundError:
+        return None
+
+
+def list_snapshots(index_dir: Path) -> List[Dict[str, Any]]:
+    """Every snapshot directory, oldest first; unpublished builds have published=False."""
+    root = Path(index_dir) / SNAPSHOTS_SUBDIR
+    if not root.exists():
+        return []
+    current, previous = current_name(index_dir), previous_name(index_dir)
+    snapshots = []
+    for path in root.iterdir():
+        version = snapshot_version(path.name)
+        if version is None or not path.is_dir():
+            continue
+        manifest = read_manifest(path)
+        snapshots.append({
+            "name": path.name,
+            "version": version,
+            "path": str(path),
+            "published": manifest is not None,
+            "current": path.name == current,
+            "previous": path.name == previous,
+            **({"created": manifest.get("created"), "chunks": manifest.get("chunks")} if manifest else {})
+        })
+    return sorted(snapshots, key=lambda snapshot: snapshot["version"])
+
+
+def create_snapshot(index_dir: Path) -> Path:
+    """A new, empty snapshot directory with the next version number."""
+    root = Path(index_dir) / SNAPSHOTS_SUBDIR
+    root.mkdir(parents=True, exist_ok=True)
+    versions = [snapshot_version(path.name) for path in root.iterdir()]
+    version = max([v for v in versions if v is not None], default=0) + 1
+    while True:
+        path = root / snapshot_name(version)
+        try:
+            # mkdir without exist_ok claims the version even against a concurrent ingest
+            path.mkdir()
+            return path
+        except FileExistsError:
+            version += 1
+
+
+def publish(index_dir: Path, snapshot: Path, keep: int = 3, **info: Any) -> str:
+    """Seal a finished snapshot and make it CURRENT; the replaced version becomes PREVIOUS."""
+    index_dir, snapshot = Path(index_dir), Path(snapshot)
+    version = snapshot_version(snapshot.name)
+    if version is None or snapshot.parent != index_dir / SNAPSHOTS_SUBDIR:
+        raise ValueError(f"Not a snapshot of {index_dir}: {snapshot}")
+    manifest = {"version": version, "name": snapshot.name, "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"), **info}
+    (snapshot / SNAPSHOT_MANIFEST).write_text(json.dumps(manifest, indent=2))
+    _fsync_tree(snapshot)
+    _swap_current(index_dir, snapshot.name)
+    logger.info(f"Published index snapshot {snapshot.name}")
+    prune(index_dir, keep)
+    return snapshot.name
+
+
+def _swap_current(index_dir: Path, name: str):
+    current = current_name(index_dir)
+    if current == name:
+        return
+    # PREVIOUS first: a crash in between leaves both pointing at the old version
+    if current:
+        _write_pointer(index_dir / PREVIOUS_FILE, current)
+    _write_pointer(index_dir / CURRENT_FILE, name)
+
+
+def rollback(index_dir: Path, version: Optional[int] = None) -> str:
+    """Point CURRENT at PREVIOUS (or at the given published version)."""
+    index_dir = Path(index_dir)
+    name = snapshot_name(version) if version is not None else previous_name(index_dir)
+    if not name:
+        raise ValueError("No previous snapshot to roll back to")
+    if read_manifest(index_dir / SNAPSHOTS_SUBDIR / name) is None:
+        raise ValueError(f"Snapshot {name} does not exist or was never published")
+    _swap_current(index_dir, name)
+    logger.info(f"Rolled index back to snapshot {name}")
+    return name
+
+
+def prune(index_dir: Path, keep: int = 3) -> List[str]:
+    """Delete published snapshots beyond the newest keep, and abandoned builds older than CURRENT.
+
+    CURRENT and PREVIOUS are always kept, since a running API may still serve PREVIOUS.
+    """
+    index_dir = Path(index_dir)
+    snapshots = list_snapshots(index_dir)
+    current = next((s for s in snapshots if s["current"]), None)
+    published = [s for s in snapshots if s["published"]]
+    retained = {s["name"] for s in published[-max(keep, 1):]}
+    removed = []
+    for snapshot in snapshots:
+        if snapshot["current"] or snapshot["previous"] or snapshot["name"] in retained:
+            continue
+        # Unpublished builds newer than CURRENT may still be running
+        if not snapshot["published"] and (current is None or snapshot["version"] > current["version"]):
+            continue
+        shutil.rmtree(snapshot["path"], ignore_errors=True)
+        removed.append(snapshot["name"])
+    if removed:
+        logger.info(f"Pruned index snapshots: {', '.join(removed)}")
+    return removed
+
+
+def load_bm25(
+    path: Path,
+    open_store: Callable[[], Any],
+    versioned: bool = True
+) -> Tuple[Optional[BM25Postings], List[str]]:
+    """(BM25 postings, corpus ids) of an index: the snapshot's bm25.npz, else built from its vector store.
+
+    A snapshot always has postings, so a missing or unreadable bm25.npz raises
+    and the version is not swapped in. Only an unversioned index, which never
+    had them on disk, falls back to serving without BM25.
+    """
+    bm25_path = Path(path) / BM25_FILE
+    if versioned or bm25_path.exists():
+        bm25, corpus_ids = BM25Postings.load(bm25_path)
+        logger.info(f"Loaded BM25 index with {len(corpus_ids)} documents from {bm25_path}")
+        return (bm25 if corpus_ids else None), corpus_ids
+    try:
+        # Indexes written before snapshots have no postings on disk
+        logger.info("Building BM25 index...")
+        results = open_store().get()
+        if not results["documents"]:
+            logger.warning("No documents in collection. BM25 index will be empty.")
+            return None, []
+        bm25 = BM25Postings([doc.split() for doc in results["documents"]])
+        logger.info(f"Built BM25 index with {len(results['ids'])} documents")
+        return bm25, results["ids"]
+    except Exception as e:
+        logger.error(f"Error loading BM25 index: {e}")
+        return None, []
+
+
+class IndexVersion:
+    """The loaded parts of one index version, swapped as a unit.
+
+    Requests read generator.index once and use that object throughout, so a
+    swap never mixes BM25 ids from one version with vectors from another.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: Path,
+        vector_store: Any,
+        patent_index: Any = None,
+        bm25: Any = None,
+        corpus_ids: Optional[List[str]] = None
+    ):
+        self.name = name
+        self.path = Path(path)
+        self.vector_store = vector_store
+        self.patent_index = patent_index
+        self.bm25 = bm25
+        self.corpus_ids = corpus_ids or []
+        self.loaded_at = time.time()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.name,
+            "path": str(self.path),
+            "chunks": len(self.corpus_ids),
+            "patent_index": self.patent_index is not None,
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.loaded_at))
+        }
+
+
+class SnapshotWatcher:
+    """Poll CURRENT and hand each newly published snapshot to on_change on a background thread."""
+
+    def __init__(
+        self,
+        index_dir: Path,
+        on_change: Callable[[str, Path], None],
+        loaded: Optional[str] = None,
+        interval: float = 5.0,
+        name: str = "index-watcher"
+    ):
+        self.index_dir = Path(index_dir)
+        self.on_change = on_change
+        self.interval = interval
+        self.name = name
+        # The version already loaded, so a publish during startup is still picked up
+        self.seen = loaded
+        # A snapshot that failed to load; retried only after CURRENT moves off it
+        self.failed: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self) -> bool:
+        """Load CURRENT if it changed since the last check; True when a new version was taken."""
+        name = current_name(self.index_dir)
+        if name != self.failed:
+            self.failed = None
+        if not name or name in (self.seen, self.failed):
+            return False
+        try:
+            self.on_change(name, self.index_dir / SNAPSHOTS_SUBDIR / name)
+        except Exception as e:
+            # Keep serving the loaded version rather than reloading a broken snapshot on every poll
+            logger.error(f"Loading index snapshot {name} failed: {e}; serving {self.seen} until CURRENT changes")
+            index_reloads.inc(outcome="failed")
+            self.failed = name
+            return False
+        self.seen = name
+        index_reloads.inc(outcome="ok")
+        return True
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="List, roll back and prune versioned index snapshots")
+    parser.add_argument("command", choices=["list", "rollback", "prune"])
+    parser.add_argument("--index-dir", type=str, default=str(Path(os.getenv("DATA_DIR", "data")) / "index"))
+    parser.add_argument("--version", type=int, help="rollback: snapshot version (default: PREVIOUS)")
+    parser.add_argument("--keep", type=int, default=int(os.getenv("SNAPSHOT_KEEP", "3")), help="prune: published snapshots kept")
+    args = parser.parse_args()
+
+    index_dir = Path(args.index_dir)
+    if args.command == "rollback":
+        print(f"CURRENT -> {rollback(index_dir, args.version)}")
+    elif args.command == "prune":
+        removed = prune(index_dir, args.keep)
+        print(f"Removed {len(removed)} snapshot(s): {', '.join(removed) or '-'}")
+    else:
+        print(json.dumps(list_snapshots(index_dir), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
@@ -20,14 +20,15 @@ from bs4 import BeautifulSoup
 OpenAI = None  # type: ignore[assignment]
 SentenceTransformer = None  # type: ignore[assignment]
 
+from vector_store import open_vector_store
+from patent_index import build_patent_index
+from bm25_index import BM25Postings
+from index_snapshot import BM25_FILE, create_snapshot, publish
+
 if TYPE_CHECKING:
-    import chromadb  # noqa: F401
-    from chromadb.config import Settings  # noqa: F401
     from sentence_transformers import SentenceTransformer as STModel  # noqa: F401
     from openai import OpenAI as OpenAIType  # noqa: F401
 else:
-    chromadb = importlib.import_module("chromadb")
-    Settings = getattr(importlib.import_module("chromadb.config"), "Settings")
     sentence_transformers_module = importlib.import_module("sentence_transformers")
     SentenceTransformer = getattr(sentence_transformers_module, "SentenceTransformer")
     OpenAI = getattr(importlib.import_module("openai"), "OpenAI")
@@ -43,11 +44,26 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 # Configuration
-DATA_DIR = Path("data")
+DATA_DIR = Path(os.getenv("DATA_DIR", "data"))
 RAW_DIR = DATA_DIR / "raw"
 CHUNKS_DIR = DATA_DIR / "chunks"
 INDEX_DIR = DATA_DIR / "index"
 MEDIA_DIR = DATA_DIR / "media"
+# Chunk vector store backend (chroma, mmap or ivf) and the mmap/ivf storage dtype
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma").lower()
+MMAP_VECTOR_DTYPE = os.getenv("MMAP_VECTOR_DTYPE", "float32")
+# IVF lists trained after indexing (0 = 4 x sqrt(chunks))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+# In-memory codes for the mmap/ivf scan (int8, pq or matryoshka; empty = scan the full vectors)
+VECTOR_CODEC = os.getenv("VECTOR_CODEC", "").lower()
+# pq only: bytes per chunk (0 = dimensions / 8)
+PQ_SUBVECTORS = int(os.getenv("PQ_SUBVECTORS", "0"))
+# matryoshka only: leading dimensions kept for the first-stage search
+MATRYOSHKA_DIMS = int(os.getenv("MATRYOSHKA_DIMS", "256"))
+# Patent-level vectors (title + abstract, claim centroid) for patent-first vector search
+PATENT_INDEX_ENABLED = os.getenv("PATENT_INDEX_ENABLED", "true").lower() == "true"
+# Published index snapshots kept on disk (CURRENT and PREVIOUS always are; see index_snapshot.py)
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "3"))
 
 # CPC codes for construction robotics
 CPC_CODES = ["B25J", "E04G", "E04B", "E04C", "B66C", "E02D", "E02F"]
@@ -81,20 +97,11 @@ class PatentIngester:
             logger.info("Using local embeddings: sentence-transformers/all-MiniLM-L6-v2")
             self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
         
-        # Initialize ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path=str(INDEX_DIR),
-            settings=Settings(anonymized_telemetry=False)
-        )
-        self.collection_name = "construction_robotics_patents"
-        try:
-            self.chroma_client.delete_collection(self.collection_name)
-        except Exception:
-            pass
-        self.collection = self.chroma_client.create_collection(
-            name=self.collection_name,
-            metadata={"description": "Construction robotics patent documents"}
-        )
+        # Build into a new snapshot; the running API keeps serving the published one
+        self.snapshot = create_snapshot(INDEX_DIR)
+        logger.info(f"Building index snapshot {self.snapshot.name}")
+        options = {"dtype": MMAP_VECTOR_DTYPE, "codec": VECTOR_CODEC or None} if VECTOR_STORE in ("mmap", "ivf") else {}
+        self.vector_store = open_vector_store(VECTOR_STORE, self.snapshot, reset=True, **options)
     
     @staticmethod
     def _sanitize_patent_number(patent_number: str) -> str:
@@ -426,8 +433,8 @@ class PatentIngester:
         else:
             return self.embedding_model.encode(texts, show_progress_bar=False).tolist()
     
-    def index_patents(self, patents: List[Dict[str, Any]]):
-        """Index patents in ChromaDB."""
+    def index_patents(self, patents: List[Dict[str, Any]], download_figures: bool = True):
+        """Index patents into a new snapshot and publish it to the API."""
         logger.info("Chunking and indexing patents...")
         
         all_chunks = []
@@ -436,7 +443,7 @@ class PatentIngester:
         all_metadatas = []
         
         for patent in tqdm(patents, desc="Processing patents"):
-            figures = self.download_patent_figures(patent["patent_number"])
+            figures = self.download_patent_figures(patent["patent_number"]) if download_figures else []
             patent["figures"] = figures
             
             # Save raw patent
@@ -480,17 +487,55 @@ class PatentIngester:
             batch_embeddings = self.get_embeddings(batch)
             all_embeddings.extend(batch_embeddings)
         
-        # Add to ChromaDB
-        logger.info("Indexing in ChromaDB...")
-        self.collection.add(
+        # Add to the vector store
+        logger.info(f"Indexing in the {VECTOR_STORE} vector store...")
+        self.vector_store.add(
             ids=all_ids,
             embeddings=all_embeddings,
             documents=all_chunks,
             metadatas=all_metadatas
         )
+        if VECTOR_STORE == "ivf":
+            logger.info("Training IVF lists...")
+            self.vector_store.train(nlist=IVF_NLIST or None)
+        if VECTOR_CODEC and VECTOR_STORE in ("mmap", "ivf"):
+            logger.info(f"Encoding vectors with the {VECTOR_CODEC} codec...")
+            codec_options: Dict[str, Any] = {}
+            if VECTOR_CODEC == "pq":
+                codec_options["subvectors"] = PQ_SUBVECTORS
+            elif VECTOR_CODEC == "matryoshka":
+                codec_options["dims"] = MATRYOSHKA_DIMS
+            self.vector_store.train_codec(**codec_options)
+        if PATENT_INDEX_ENABLED:
+            self.index_patent_vectors(patents, all_embeddings, all_metadatas)
+        if all_chunks:
+            logger.info("Building the BM25 index...")
+            BM25Postings([doc.split() for doc in all_chunks]).save(self.snapshot / BM25_FILE, all_ids)
         
+        publish(INDEX_DIR, self.snapshot, keep=SNAPSHOT_KEEP, backend=VECTOR_STORE, chunks=len(all_chunks),
+                patents=len(patents), codec=VECTOR_CODEC or None)
         logger.info(f"Indexed {len(all_chunks)} chunks from {len(patents)} patents")
     
+    def index_patent_vectors(
+        self,
+        patents: List[Dict[str, Any]],
+        chunk_embeddings: List[List[float]],
+        chunk_metadatas: List[Dict[str, Any]]
+    ):
+        """Build the patent index: a title + abstract embedding and a claim centroid per patent."""
+        logger.info("Building the patent index...")
+        texts = {
+            patent["patent_number"]: f"{patent.get('title', '')}\n\n{patent.get('abstract', '')}".strip()
+            for patent in patents
+        }
+        numbers = [number for number, text in texts.items() if text]
+        summaries: Dict[str, List[float]] = {}
+        batch_size = 100
+        for i in range(0, len(numbers), batch_size):
+            batch = numbers[i:i + batch_size]
+            summaries.update(zip(batch, self.get_embeddings([texts[number] for number in batch])))
+        build_patent_index(self.snapshot, chunk_embeddings, chunk_metadatas, summaries)
+    
     def run(self, limit: int = 200, year_min: int = 2018):
         """Run full ingestion pipeline."""
         # Download patents
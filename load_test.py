@@ -0,0 +1,274 @@
+"""
+Load test for the design API: ramp concurrency and report latency percentiles,
+throughput, error rate and per-stage time.
+
+By default everything runs locally and offline:
+  1. the OpenAI stub (openai_stub.py) stands in for chat and embeddings,
+  2. a synthetic index is built from ingest.py's mock patents under
+     data/loadtest (embedded by the stub, so queries and index match),
+  3. the API is started with uvicorn against that index and the stub,
+then closed-loop workers hit the endpoint at each concurrency step. Use --url
+to test an already running server instead (per-stage numbers need it to run
+with SERVER_TIMING_ENABLED=true).
+
+    python load_test.py --concurrency 1,4,16 --duration 30 --output benchmarks/load.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import requests
+
+import openai_stub
+from bench_history import environment_fingerprint
+
+LOAD_PROMPTS = [
+    "Design a robotic bricklaying system with vision-guided placement",
+    "Autonomous rebar tying robot for bridge deck construction",
+    "Drywall installation robot for high-rise interior finishing",
+    "3D concrete printing gantry for single-storey housing",
+    "Teleoperated demolition robot with dust suppression",
+    "Cable-driven facade cleaning robot for glass curtain walls",
+    "Excavator automation kit with GPS grade control",
+    "Steel beam welding robot for on-site structural connections",
+]
+
+# Topics used to make the otherwise identical mock patents distinguishable
+SYNTHETIC_TOPICS = [
+    ("Bricklaying", "a gripper places bricks and applies mortar along a laser-referenced course line"),
+    ("Rebar Tying", "a gantry-mounted tool ties rebar intersections detected by a stereo camera"),
+    ("Drywall Installation", "a lift and suction end-effector positions gypsum boards against studs"),
+    ("Concrete Printing", "a pump and nozzle extrude concrete layers following a sliced toolpath"),
+    ("Demolition", "a remote-controlled hydraulic breaker arm with water mist dust suppression"),
+    ("Facade Cleaning", "a cable-suspended platform with brushes and proximity sensors on curtain walls"),
+    ("Excavation", "a hydraulic excavator with GNSS grade control and bucket position sensing"),
+    ("Welding", "a rail-guided welding torch with seam tracking for steel beam connections"),
+    ("Tile Laying", "a mobile manipulator spreads adhesive and places floor tiles on a grid"),
+    ("Surveying", "a legged robot carries lidar to map site progress against the building model"),
+]
+
+
+def synthetic_patents(ingester: Any, count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Mock patents from ingest.py with varied titles, abstracts and claims."""
+    rng = random.Random(seed)
+    patents = ingester._generate_mock_patents(count)
+    for i, patent in enumerate(patents):
+        topic, mechanism = SYNTHETIC_TOPICS[i % len(SYNTHETIC_TOPICS)]
+        variant = rng.choice(["modular", "autonomous", "teleoperated", "collaborative", "tracked", "compact"])
+        patent["title"] = f"{variant.title()} {topic} Robot {i + 1}"
+        patent["abstract"] = f"A {variant} {topic.lower()} robot in which {mechanism}. " + patent["abstract"]
+        patent["claims_text"] = "\n".join([
+            f"1. A {topic.lower()} system comprising a {variant} robotic platform wherein {mechanism}.",
+            f"2. The system of claim 1, further comprising a safety controller that stops motion when a worker enters the work zone.",
+            f"3. The system of claim 1, wherein the controller plans motions from a building information model."
+        ])
+    return patents
+
+
+def build_index(data_dir: str, patents: int, stub_url: str):
+    """Build the synthetic Chroma index under data_dir, embedding through the stub."""
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["OPENAI_BASE_URL"] = stub_url
+    os.environ["OPENAI_API_KEY"] = os.environ.get("LOADTEST_OPENAI_API_KEY", "stub")
+    from ingest import PatentIngester
+
+    ingester = PatentIngester()
+    ingester.index_patents(synthetic_patents(ingester, patents), download_figures=False)
+    Path(data_dir, "loadtest_index.json").write_text(json.dumps({"patents": patents}))
+
+
+def wait_until_ready(url: str, timeout: float, process: Optional[subprocess.Popen] = None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"API server exited with code {process.returncode}")
+        try:
+            if requests.get(f"{url}/ready", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} was not ready after {timeout:.0f}s")
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """Stage durations (ms) from a Server-Timing header."""
+    stages: Dict[str, float] = {}
+    for entry in header.split(","):
+        parts = [part.strip() for part in entry.split(";")]
+        for part in parts[1:]:
+            if part.startswith("dur="):
+                stages[parts[0]] = float(part[4:])
+    return stages
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    arr = np.asarray(samples)
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 1),
+        "p95": round(float(np.percentile(arr, 95)), 1),
+        "p99": round(float(np.percentile(arr, 99)), 1),
+        "mean": round(float(arr.mean()), 1),
+        "max": round(float(arr.max()), 1)
+    }
+
+
+def run_step(url: str, endpoint: str, concurrency: int, duration: float, timeout: float, unique: bool) -> Dict[str, Any]:
+    """Closed-loop workers send requests back to back for `duration` seconds."""
+    records: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+    counter = iter(range(10 ** 9))
+
+    def worker():
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            with lock:
+                n = next(counter)
+            prompt = LOAD_PROMPTS[n % len(LOAD_PROMPTS)]
+            if unique:
+                # Distinct prompts so single-flight does not collapse concurrent requests
+                prompt = f"{prompt} (load test request {n})"
+            start = time.perf_counter()
+            try:
+                response = session.post(f"{url}{endpoint}", json={"prompt": prompt}, timeout=timeout)
+                status = response.status_code
+                stages = parse_server_timing(response.headers.get("Server-Timing", ""))
+            except requests.RequestException as e:
+                status, stages = type(e).__name__, {}
+            elapsed = (time.perf_counter() - start) * 1000.0
+            with lock:
+                records.append({"status": status, "ms": elapsed, "end": time.monotonic(), "stages": stages})
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = max(time.monotonic() - started, 1e-9)
+
+    ok = [r for r in records if r["status"] == 200]
+    statuses: Dict[str, int] = {}
+    for r in records:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    stage_names = sorted({name for r in ok for name in r["stages"] if name != "total"})
+    return {
+        "concurrency": concurrency,
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "error_rate": round((len(records) - len(ok)) / len(records), 4) if records else 0.0,
+        "throughput_rps": round(len(ok) / wall, 3),
+        "latency_ms": percentiles([r["ms"] for r in ok]),
+        "statuses": statuses,
+        "stages_ms": {
+            name: percentiles([r["stages"][name] for r in ok if name in r["stages"]])
+            for name in stage_names
+        }
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Ramp concurrency against the design API and report latency")
+    parser.add_argument("--url", type=str, help="Test this running server instead of starting one")
+    parser.add_argument("--endpoint", type=str, default="/design", choices=["/design", "/retrieve"])
+    parser.add_argument("--concurrency", type=str, default="1,2,4,8,16", help="Comma-separated concurrency steps")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per concurrency step")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of single-worker traffic before measuring")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request client timeout")
+    parser.add_argument("--allow-duplicates", action="store_true", help="Reuse identical prompts (lets single-flight share work)")
+    parser.add_argument("--data-dir", type=str, default="data/loadtest", help="Where the synthetic index lives")
+    parser.add_argument("--patents", type=int, default=500, help="Synthetic patents to index")
+    parser.add_argument("--rebuild-index", action="store_true")
+    parser.add_argument("--port", type=int, default=8011, help="Port for the API server this script starts")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the API server")
+    parser.add_argument("--stub-port", type=int, default=8100)
+    parser.add_argument("--output", type=str, default="benchmarks/load_test.json")
+    openai_stub.add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server: Optional[subprocess.Popen] = None
+    stub = None
+    url = args.url
+    try:
+        if url is None:
+            stub = openai_stub.serve("127.0.0.1", args.stub_port, openai_stub.config_from_args(args))
+            stub_url = f"http://127.0.0.1:{stub.server_address[1]}/v1"
+            if args.rebuild_index or not Path(args.data_dir, "loadtest_index.json").exists():
+                print(f"Building synthetic index of {args.patents} patents in {args.data_dir}...")
+                build_index(args.data_dir, args.patents, stub_url)
+
+            env = dict(
+                os.environ,
+                DATA_DIR=args.data_dir,
+                OPENAI_BASE_URL=stub_url,
+                OPENAI_API_KEY=os.environ.get("LOADTEST_OPENAI_API_KEY", "stub"),
+                SERVER_TIMING_ENABLED="true"
+            )
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1",
+                 "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"],
+                env=env
+            )
+            url = f"http://127.0.0.1:{args.port}"
+        url = url.rstrip("/")
+        wait_until_ready(url, timeout=600, process=server)
+
+        if args.warmup > 0:
+            run_step(url, args.endpoint, 1, args.warmup, args.timeout, unique=True)
+
+        steps = []
+        print(f"{'conc':>5} {'reqs':>6} {'err%':>6} {'rps':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for concurrency in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+            step = run_step(url, args.endpoint, concurrency, args.duration, args.timeout, unique=not args.allow_duplicates)
+            steps.append(step)
+            latency = step["latency_ms"]
+            print(
+                f"{concurrency:>5} {step['requests']:>6} {step['error_rate'] * 100:>6.1f} {step['throughput_rps']:>7.2f} "
+                f"{latency['p50']:>9.0f} {latency['p95']:>9.0f} {latency['p99']:>9.0f}"
+            )
+
+        report = {
+            "benchmark": "load_test",
+            "environment": environment_fingerprint(),
+            "url": url,
+            "endpoint": args.endpoint,
+            "duration_seconds": args.duration,
+            "stub": None if stub is None else {
+                "chat_ttft_ms": args.chat_ttft_ms,
+                "chat_sigma": args.chat_sigma,
+                "tokens_per_second": args.tokens_per_second,
+                "embedding_ms": args.embedding_ms,
+                "embedding_sigma": args.embedding_sigma,
+                "error_rate": args.error_rate,
+                "calls": dict(stub.RequestHandlerClass.config.counts)
+            },
+            "steps": steps
+        }
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved to: {output_path}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if stub is not None:
+            stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+# pyright: reportMissingImports=false
+
+"""
+Local inference server that owns the heavy models and the BM25 index.
+
+Running several uvicorn workers used to mean one SentenceTransformer, one
+bge-reranker-large and one in-RAM BM25 corpus per worker. This process loads
+them once and serves embedding, reranking and BM25 scoring over a Unix socket;
+the API workers connect with ModelServerClient and stay lightweight.
+
+    MODEL_SERVER_AUTHKEY=<secret> python model_server.py   # serve on MODEL_SERVER_SOCKET
+    python model_server.py --ping                          # health check for containers
+"""
+
+import os
+import sys
+import logging
+import argparse
+import importlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from serving import MicroBatcher
+from bm25_index import BM25Postings
+from index_snapshot import SNAPSHOTS_SUBDIR, UNVERSIONED, current_snapshot, load_bm25
+from vector_store import open_vector_store
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+INDEX_DIR = Path(os.getenv("DATA_DIR", "data")) / "index"
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma").lower()
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")
+# Shared secret for the socket; required, since connections exchange pickles (see require_authkey)
+MODEL_SERVER_AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY", "")
+MIN_AUTHKEY_LENGTH = 16
+MICROBATCH_MAX_WAIT_MS = float(os.getenv("MICROBATCH_MAX_WAIT_MS", "5"))
+MICROBATCH_EMBED_MAX_BATCH = int(os.getenv("MICROBATCH_EMBED_MAX_BATCH", "64"))
+MICROBATCH_RERANK_MAX_BATCH = int(os.getenv("MICROBATCH_RERANK_MAX_BATCH", "256"))
+# Index snapshots whose BM25 postings stay loaded (workers swap versions at slightly different times)
+MODEL_SERVER_INDEX_VERSIONS = int(os.getenv("MODEL_SERVER_INDEX_VERSIONS", "3"))
+
+
+class ModelServerError(RuntimeError):
+    """Raised on the client when the model server reports a failure."""
+
+
+def require_authkey(authkey: Optional[str] = None) -> bytes:
+    """The socket secret as bytes; refuses to run without a real one.
+
+    multiprocessing.connection unpickles everything it receives, so whoever
+    holds the key can run code in the server. There is deliberately no default.
+    """
+    key = authkey if authkey is not None else MODEL_SERVER_AUTHKEY
+    if len(key) < MIN_AUTHKEY_LENGTH:
+        raise ModelServerError(
+            f"MODEL_SERVER_AUTHKEY must be set to a secret of at least {MIN_AUTHKEY_LENGTH} characters "
+            "(e.g. python -c \"import secrets; print(secrets.token_hex(32))\")"
+        )
+    return key.encode()
+
+
+class ModelServer:
+    """Loads models and the BM25 index once and answers socket requests."""
+
+    def __init__(self):
+        self.embedding_model = None
+        self.reranker = None
+        # index version -> (BM25 postings, corpus ids), most recently loaded last
+        self.indexes: "OrderedDict[str, Tuple[Optional[BM25Postings], List[str]]]" = OrderedDict()
+        self.index_version: Optional[str] = None
+        self._index_lock = threading.Lock()
+
+        sentence_transformers_module = importlib.import_module("sentence_transformers")
+        if os.getenv("OPENAI_API_KEY") is None:
+            logger.info("Loading local embeddings: sentence-transformers/all-MiniLM-L6-v2")
+            self.embedding_model = sentence_transformers_module.SentenceTransformer('all-MiniLM-L6-v2')
+
+        cross_encoder_class = getattr(sentence_transformers_module, "CrossEncoder", None)
+        if cross_encoder_class is not None:
+            try:
+                self.reranker = cross_encoder_class('BAAI/bge-reranker-large')
+                logger.info("Loaded BAAI/bge-reranker-large for reranking")
+            except Exception as e:
+                logger.warning(f"Could not load reranker: {e}. Serving without reranking.")
+
+        self.load_index(current_snapshot(INDEX_DIR)[0])
+
+        self.embedding_batcher = None
+        if self.embedding_model is not None:
+            self.embedding_batcher = MicroBatcher(
+                lambda texts: self.embedding_model.encode(texts, show_progress_bar=False).tolist(),
+                max_batch=MICROBATCH_EMBED_MAX_BATCH,
+                max_wait_ms=MICROBATCH_MAX_WAIT_MS,
+                name="embedding"
+            )
+        self.rerank_batcher = None
+        if self.reranker is not None:
+            self.rerank_batcher = MicroBatcher(
+                lambda pairs: [float(s) for s in self.reranker.predict(pairs)],
+                max_batch=MICROBATCH_RERANK_MAX_BATCH,
+                max_wait_ms=MICROBATCH_MAX_WAIT_MS,
+                name="rerank"
+            )
+
+    def load_index(self, version: Optional[str] = None) -> Dict[str, Any]:
+        """Load the BM25 postings of an index snapshot (default: CURRENT) unless already loaded."""
+        name = version or current_snapshot(INDEX_DIR)[0]
+        with self._index_lock:
+            if name not in self.indexes:
+                path = INDEX_DIR if name == UNVERSIONED else INDEX_DIR / SNAPSHOTS_SUBDIR / name
+                self.indexes[name] = load_bm25(
+                    path, lambda: open_vector_store(VECTOR_STORE, path), versioned=name != UNVERSIONED
+                )
+                while len(self.indexes) > max(1, MODEL_SERVER_INDEX_VERSIONS):
+                    self.indexes.popitem(last=False)
+            self.indexes.move_to_end(name)
+            self.index_version = name
+        return {"version": name, "bm25_documents": len(self.indexes[name][1])}
+
+    def _index(self, version: Optional[str]) -> Tuple[Optional[BM25Postings], List[str]]:
+        entry = self.indexes.get(version or self.index_version or "")
+        if entry is None:
+            raise ModelServerError(f"Index version {version} is not loaded")
+        return entry
+
+    def _bm25(self, payload: Any) -> Tuple[BM25Postings, Any]:
+        """(postings, queries) for a scoring request; payload is the queries or {"version", "queries"}."""
+        version = None
+        if isinstance(payload, dict):
+            version, payload = payload.get("version"), payload["queries"]
+        bm25, _ = self._index(version)
+        if bm25 is None:
+            raise ModelServerError("BM25 index is empty")
+        return bm25, payload
+
+    def handle(self, op: str, payload: Any) -> Any:
+        """Dispatch a single request."""
+        if op == "ping":
+            return self.info()
+        if op == "encode":
+            if self.embedding_batcher is None:
+                raise ModelServerError("No local embedding model loaded")
+            return self.embedding_batcher.submit(payload)
+        if op == "predict":
+            if self.rerank_batcher is None:
+                raise ModelServerError("No reranker loaded")
+            return self.rerank_batcher.submit(payload)
+        if op == "bm25_scores":
+            bm25, query = self._bm25(payload)
+            return bm25.get_scores(query)
+        if op == "bm25_scores_matrix":
+            bm25, queries = self._bm25(payload)
+            return bm25.get_scores_matrix(queries)
+        if op == "corpus_ids":
+            return self._index(payload)[1]
+        if op == "load_index":
+            return self.load_index(payload)
+        raise ModelServerError(f"Unknown operation: {op}")
+
+    def info(self) -> Dict[str, Any]:
+        """Describe what this server has loaded."""
+        return {
+            "embedding_model": self.embedding_model is not None,
+            "reranker": self.reranker is not None,
+            "bm25_documents": len(self._index(None)[1]) if self.index_version else 0,
+            "index_version": self.index_version,
+            "pid": os.getpid()
+        }
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    op, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(("ok", self.handle(op, payload)))
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+
+    def serve(self, socket_path: str):
+        """Accept worker connections forever, one thread per connection."""
+        authkey = require_authkey()
+        path = Path(socket_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            path.unlink()
+        with Listener(str(path), family="AF_UNIX", authkey=authkey) as listener:
+            # Owner and group only; the key is still checked on every connection
+            os.chmod(path, 0o660)
+            logger.info(f"Model server listening on {path}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    logger.warning(f"Rejected model server connection: {e}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+
+class ModelServerClient:
+    """Thread-safe client; each thread keeps its own socket connection."""
+
+    def __init__(self, socket_path: str, authkey: Optional[str] = None):
+        self.socket_path = socket_path
+        self.authkey = require_authkey(authkey)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.socket_path, family="AF_UNIX", authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def call(self, op: str, payload: Any = None) -> Any:
+        """Send a request, reconnecting once if the server was restarted."""
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send((op, payload))
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError):
+                self._local.conn = None
+                if attempt == 1:
+                    raise
+        if status != "ok":
+            raise ModelServerError(result)
+        return result
+
+
+class RemoteEmbeddingModel:
+    """Stand-in for SentenceTransformer backed by the model server."""
+
+    def __init__(self, client: ModelServerClient):
+        self.client = client
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False):
+        import numpy as np
+        return np.asarray(self.client.call("encode", list(texts)))
+
+
+class RemoteReranker:
+    """Stand-in for CrossEncoder backed by the model server."""
+
+    def __init__(self, client: ModelServerClient):
+        self.client = client
+
+    def predict(self, pairs: List[List[str]]) -> List[float]:
+        return self.client.call("predict", [list(pair) for pair in pairs])
+
+
+class RemoteBM25:
+    """Stand-in for BM25Postings backed by the model server (for one index version when given)."""
+
+    def __init__(self, client: ModelServerClient, version: Optional[str] = None):
+        self.client = client
+        self.version = version
+
+    def _payload(self, queries: Any) -> Any:
+        return {"version": self.version, "queries": queries} if self.version else queries
+
+    def get_scores(self, tokenized_query: List[str]):
+        return self.client.call("bm25_scores", self._payload(tokenized_query))
+
+    def get_scores_matrix(self, tokenized_queries: List[List[str]]):
+        return self.client.call("bm25_scores_matrix", self._payload(tokenized_queries))
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Shared model and index server")
+    parser.add_argument("--socket", type=str, default=MODEL_SERVER_SOCKET or "/tmp/patent-models.sock")
+    parser.add_argument("--ping", action="store_true", help="Check that a running server answers")
+    args = parser.parse_args()
+
+    if args.ping:
+        try:
+            print(ModelServerClient(args.socket).call("ping"))
+        except Exception as e:
+            print(f"Model server not reachable: {e}")
+            sys.exit(1)
+        return
+
+    try:
+        require_authkey()
+    except ModelServerError as e:
+        print(f"Refusing to start: {e}")
+        sys.exit(1)
+    ModelServer().serve(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Local OpenAI-compatible stub for load testing.
+
+Serves /v1/chat/completions (plain and streamed) and /v1/embeddings with
+configurable latency so the API can be load-tested without calling (or paying
+for) OpenAI. Point the app at it with:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=stub
+
+Chat latency is time-to-first-token drawn from a lognormal distribution plus
+output tokens at a fixed rate; embedding latency is lognormal. Embeddings are
+feature-hashed bags of words, so the same text always gets the same vector and
+texts sharing words are close. Query-expansion requests get a list of query
+variants; everything else gets a complete design brief as JSON.
+"""
+
+import re
+import json
+import math
+import time
+import zlib
+import base64
+import random
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+import numpy as np
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+STUB_DESIGN = {
+    "overview": "Modular construction robot combining a tracked mobile base, a six-axis arm and a vision-guided end effector for repetitive on-site assembly tasks.",
+    "modules": [
+        {"name": "Mobile Base", "function": "Carries the arm between work zones on uneven ground", "citations": ["SPECULATIVE"]},
+        {"name": "Manipulator", "function": "Positions and places construction elements", "citations": ["SPECULATIVE"]}
+    ],
+    "actuation": [
+        {"subsystem": "Arm joints", "choice": "Electric servo motors with harmonic drives", "why": "Precise, back-drivable motion", "citations": ["SPECULATIVE"]}
+    ],
+    "sensing": [
+        {"subsystem": "Placement", "sensors": ["Stereo camera", "Joint encoders"], "why": "Locate elements and verify placement", "citations": ["SPECULATIVE"]}
+    ],
+    "control": [
+        {"layer": "Motion", "approach": "Model-predictive trajectory tracking", "teleop_or_auto": "Autonomous with teleoperation fallback", "citations": ["SPECULATIVE"]}
+    ],
+    "materials": [
+        {"part": "Arm links", "material": "Aluminium 6061", "why": "Stiffness to weight", "citations": ["SPECULATIVE"]}
+    ],
+    "safety": [
+        {"risk": "Contact with workers", "mitigation": "Lidar safety zones and category 3 emergency stop", "citations": ["SPECULATIVE"]}
+    ],
+    "procedure": ["Survey the work zone", "Calibrate the camera", "Run the placement sequence", "Inspect and log results"],
+    "bom": [
+        {"item": "Six-axis arm", "qty": 1, "est_cost_usd": 45000.0, "citations": ["SPECULATIVE"]},
+        {"item": "Tracked base", "qty": 1, "est_cost_usd": 30000.0, "citations": ["SPECULATIVE"]}
+    ]
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / 4))
+
+
+def hashed_embedding(text: str, dims: int) -> np.ndarray:
+    """Deterministic unit vector from hashed word unigrams."""
+    vector = np.zeros(dims, dtype=np.float32)
+    for token in text.lower().split():
+        h = zlib.crc32(token.encode("utf-8"))
+        vector[h % dims] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = float(np.linalg.norm(vector))
+    if norm == 0.0:
+        vector[zlib.crc32(text.encode("utf-8")) % dims] = 1.0
+        return vector
+    return vector / norm
+
+
+class StubConfig:
+    """Latency model and failure injection for the stub."""
+
+    def __init__(
+        self,
+        chat_ttft_ms: float = 400.0,
+        chat_sigma: float = 0.4,
+        tokens_per_second: float = 80.0,
+        embedding_ms: float = 60.0,
+        embedding_sigma: float = 0.3,
+        error_rate: float = 0.0,
+        dims: int = 3072
+    ):
+        self.chat_ttft_ms = chat_ttft_ms
+        self.chat_sigma = chat_sigma
+        self.tokens_per_second = tokens_per_second
+        self.embedding_ms = embedding_ms
+        self.embedding_sigma = embedding_sigma
+        self.error_rate = error_rate
+        self.dims = dims
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    @staticmethod
+    def lognormal_seconds(median_ms: float, sigma: float) -> float:
+        if median_ms <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(median_ms / 1000.0), sigma) if sigma > 0 else median_ms / 1000.0
+
+    def record(self, key: str):
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """OpenAI REST endpoints backed by canned responses."""
+
+    protocol_version = "HTTP/1.1"
+    config: StubConfig = StubConfig()
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.config._lock:
+                self._send_json(200, dict(self.config.counts))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            kind = "chat"
+        elif path.endswith("/embeddings"):
+            kind = "embeddings"
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        if random.random() < self.config.error_rate:
+            self.config.record(f"{kind}_error")
+            self._send_json(500, {"error": {"message": "Injected stub failure", "type": "server_error"}})
+            return
+        self.config.record(kind)
+        if kind == "chat":
+            self._chat(body)
+        else:
+            self._embeddings(body)
+
+    def _chat(self, body: Dict[str, Any]):
+        messages = body.get("messages", [])
+        prompt_text = "\n".join(str(m.get("content", "")) for m in messages)
+        content = self._chat_content(messages)
+        output_tokens = min(estimate_tokens(content), int(body.get("max_tokens") or 4096))
+        usage = {
+            "prompt_tokens": estimate_tokens(prompt_text),
+            "completion_tokens": output_tokens,
+            "total_tokens": estimate_tokens(prompt_text) + output_tokens
+        }
+        model = body.get("model", "gpt-4o-mini")
+        generation_seconds = output_tokens / self.config.tokens_per_second if self.config.tokens_per_second > 0 else 0.0
+        time.sleep(self.config.lognormal_seconds(self.config.chat_ttft_ms, self.config.chat_sigma))
+
+        if not body.get("stream"):
+            time.sleep(generation_seconds)
+            self._send_json(200, {
+                "id": f"chatcmpl-stub{random.getrandbits(48):x}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+        delay = generation_seconds / len(pieces) if pieces else 0.0
+        chunk_id = f"chatcmpl-stub{random.getrandbits(48):x}"
+        try:
+            for piece in pieces:
+                time.sleep(delay)
+                self._send_event({
+                    "id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                })
+            self._send_event({
+                "id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    @staticmethod
+    def _chat_content(messages: List[Dict[str, Any]]) -> str:
+        system = str(messages[0].get("content", "")) if messages else ""
+        user = str(messages[-1].get("content", "")) if messages else ""
+        if "search query" in system.lower():
+            original = user.split("Original query:")[-1].split("\n")[0].strip() or "construction robot"
+            wanted = re.search(r"Generate (\d+)", user)
+            aspects = ["mechanical design", "sensing and control", "safety and deployment", "materials and cost"]
+            return "\n".join(f"{original} {aspect}" for aspect in aspects[:int(wanted.group(1)) if wanted else 3])
+        return json.dumps(STUB_DESIGN, indent=2)
+
+    def _embeddings(self, body: Dict[str, Any]):
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dims = int(body.get("dimensions") or self.config.dims)
+        time.sleep(self.config.lognormal_seconds(self.config.embedding_ms, self.config.embedding_sigma))
+        data = []
+        for index, text in enumerate(inputs):
+            vector = hashed_embedding(str(text), dims)
+            if body.get("encoding_format") == "base64":
+                embedding: Any = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(estimate_tokens(str(text)) for text in inputs)
+        self._send_json(200, {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-3-large"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_event(self, payload: Dict[str, Any]):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+def serve(host: str, port: int, config: StubConfig) -> ThreadingHTTPServer:
+    """Start the stub on a background thread and return the server."""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="openai-stub", daemon=True).start()
+    logger.info(f"OpenAI stub listening on http://{host}:{server.server_address[1]}/v1")
+    return server
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    """Latency-model options shared with load_test.py."""
+    parser.add_argument("--chat-ttft-ms", type=float, default=400.0, help="Median chat time to first token")
+    parser.add_argument("--chat-sigma", type=float, default=0.4, help="Lognormal sigma of chat time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0, help="Chat output token rate")
+    parser.add_argument("--embedding-ms", type=float, default=60.0, help="Median embedding latency")
+    parser.add_argument("--embedding-sigma", type=float, default=0.3, help="Lognormal sigma of embedding latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--dims", type=int, default=3072, help="Embedding dimensions")
+
+
+def config_from_args(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(
+        chat_ttft_ms=args.chat_ttft_ms,
+        chat_sigma=args.chat_sigma,
+        tokens_per_second=args.tokens_per_second,
+        embedding_ms=args.embedding_ms,
+        embedding_sigma=args.embedding_sigma,
+        error_rate=args.error_rate,
+        dims=args.dims
+    )
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server for load testing")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    server = serve(args.host, args.port, config_from_args(args))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
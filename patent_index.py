@@ -0,0 +1,116 @@
+"""
+Patent-level vectors for two-stage (patent -> chunk) vector search.
+
+Retrieval output is deduped to one chunk per patent, so the vector search
+first picks candidate patents from a small index and then scores only their
+chunks. ingest.py builds up to two vectors per patent:
+
+    summary   embedding of the title and abstract
+    claims    centroid of the patent's claim chunk embeddings
+
+They are kept in an mmap vector store under <index_dir>/patents, with the
+chunk metadata fields (patent_number, cpc, year, title) so the request
+filters apply unchanged. The chunk query is then restricted to the
+candidates with a patent_number $in clause, which the mmap and ivf stores
+answer by scanning just those patents' rows. Vector work drops by about the
+chunks-per-patent factor.
+"""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from vector_store import MmapVectorStore
+
+logger = logging.getLogger(__name__)
+
+PATENT_SUBDIR = "patents"
+
+# Chunk metadata copied onto patent vectors so where clauses work on both
+PATENT_FIELDS = ("patent_number", "cpc", "year", "title")
+
+
+def patent_vectors(
+    embeddings: Sequence[Sequence[float]],
+    metadatas: List[Dict[str, Any]],
+    summaries: Dict[str, Sequence[float]]
+) -> Tuple[List[str], np.ndarray, List[str], List[Dict[str, Any]]]:
+    """Patent index rows (ids, vectors, documents, metadatas) from chunk embeddings and summary embeddings."""
+    chunk_vectors = np.asarray(embeddings, dtype=np.float32)
+    first: Dict[str, Dict[str, Any]] = {}
+    claim_rows: Dict[str, List[int]] = {}
+    for row, meta in enumerate(metadatas):
+        patent_number = meta["patent_number"]
+        first.setdefault(patent_number, meta)
+        if meta.get("section") == "claims":
+            claim_rows.setdefault(patent_number, []).append(row)
+
+    ids: List[str] = []
+    vectors: List[np.ndarray] = []
+    documents: List[str] = []
+    patent_metadatas: List[Dict[str, Any]] = []
+    for patent_number, meta in first.items():
+        base = {field: meta[field] for field in PATENT_FIELDS if field in meta}
+        entries = []
+        if patent_number in summaries:
+            entries.append(("summary", np.asarray(summaries[patent_number], dtype=np.float32)))
+        if patent_number in claim_rows:
+            members = chunk_vectors[claim_rows[patent_number]]
+            centroid = members.mean(axis=0)
+            # Keep the members' scale so centroid distances compare with chunk distances
+            centroid *= np.linalg.norm(members, axis=1).mean() / max(float(np.linalg.norm(centroid)), 1e-12)
+            entries.append(("claims", centroid))
+        for kind, vector in entries:
+            ids.append(f"{patent_number}#{kind}")
+            vectors.append(vector)
+            documents.append(meta.get("title", ""))
+            patent_metadatas.append(dict(base, kind=kind))
+    return ids, np.asarray(vectors, dtype=np.float32), documents, patent_metadatas
+
+
+def build_patent_index(
+    index_dir: Path,
+    embeddings: Sequence[Sequence[float]],
+    metadatas: List[Dict[str, Any]],
+    summaries: Dict[str, Sequence[float]]
+) -> MmapVectorStore:
+    """(Re)create the patent index under index_dir."""
+    store = MmapVectorStore(str(Path(index_dir) / PATENT_SUBDIR), reset=True)
+    ids, vectors, documents, patent_metadatas = patent_vectors(embeddings, metadatas, summaries)
+    if ids:
+        store.add(ids, vectors, documents, patent_metadatas)
+    logger.info(f"Patent index: {len(ids)} vectors for {len({m['patent_number'] for m in patent_metadatas})} patents")
+    return store
+
+
+class PatentIndex:
+    """Candidate patents for a query embedding."""
+
+    def __init__(self, index_dir: Path):
+        self.store = MmapVectorStore(str(Path(index_dir) / PATENT_SUBDIR))
+
+    @staticmethod
+    def exists(index_dir: Path) -> bool:
+        return (Path(index_dir) / PATENT_SUBDIR / "manifest.json").exists()
+
+    def candidates(self, embedding: Sequence[float], n_patents: int, where: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Up to n_patents patent numbers, nearest first (a patent counts once across its vectors)."""
+        results = self.store.query([embedding], n_results=2 * n_patents, where=where)
+        patents: List[str] = []
+        seen = set()
+        for meta in results["metadatas"][0]:
+            patent_number = meta["patent_number"]
+            if patent_number not in seen:
+                seen.add(patent_number)
+                patents.append(patent_number)
+                if len(patents) == n_patents:
+                    break
+        return patents
+
+    @staticmethod
+    def restrict(where: Optional[Dict[str, Any]], patents: List[str]) -> Dict[str, Any]:
+        """where narrowed to chunks of the given patents."""
+        clause = {"patent_number": {"$in": patents}}
+        return {"$and": [where, clause]} if where else clause
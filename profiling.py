@@ -0,0 +1,184 @@
+"""
+On-demand profiling for individual API requests and memory growth.
+
+Two per-request modes:
+    cprofile  deterministic profile of the thread serving the request, saved
+              as a pstats `.prof` file (snakeviz, flameprof, `python -m pstats`).
+              Work handed to other threads (micro-batcher, section pool)
+              shows up as time spent waiting.
+    sample    wall-clock sampling of every busy thread in the process while
+              the request runs, saved as folded stacks (`.folded`) for
+              flamegraph.pl, speedscope or inferno.
+
+MemoryTracker wraps tracemalloc: take a baseline snapshot, then diff the
+current allocations against it to see what grew.
+"""
+
+import os
+import sys
+import time
+import cProfile
+import logging
+import threading
+import tracemalloc
+from pathlib import Path
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("cprofile", "sample")
+
+# Leaf functions of threads parked on a lock, queue or socket; not worth sampling
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "socket.py", "concurrent/futures/thread.py")
+
+
+class SamplingProfiler:
+    """Sample the stacks of all busy threads at a fixed interval."""
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame.f_code.co_filename.endswith(IDLE_FILES):
+                    continue
+                self.stacks[self._fold(names.get(thread_id, str(thread_id)), frame)] += 1
+            self.samples += 1
+
+    def _fold(self, thread_name: str, frame: Any) -> str:
+        frames: List[str] = []
+        while frame is not None and len(frames) < self.max_depth:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ";".join(reversed(frames))
+
+    def write_folded(self, path: Path):
+        """Write samples as `frame;frame;frame count` lines."""
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    """Profile single requests on demand, one at a time per process."""
+
+    def __init__(self, output_dir: str = "data/profiles", sample_interval: float = 0.005):
+        self.output_dir = Path(output_dir)
+        self.sample_interval = sample_interval
+        # cProfile and the sampler both see the whole interpreter; overlapping
+        # profiles would mix requests, so concurrent requests run unprofiled
+        self._busy = threading.Lock()
+
+    def run(self, mode: str, label: str, fn: Callable[[], Any]) -> Tuple[Any, Optional[str]]:
+        """Call fn under the given profiler; returns (result, profile path or None)."""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}; use one of {', '.join(PROFILE_MODES)}")
+        if not self._busy.acquire(blocking=False):
+            logger.warning(f"Profiler busy; running {label} request unprofiled")
+            return fn(), None
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            stem = self.output_dir / f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{threading.get_ident() % 100000}"
+            start = time.perf_counter()
+            if mode == "cprofile":
+                path = stem.with_suffix(".prof")
+                profile = cProfile.Profile()
+                try:
+                    result = profile.runcall(fn)
+                finally:
+                    profile.dump_stats(str(path))
+            else:
+                path = stem.with_suffix(".folded")
+                sampler = SamplingProfiler(self.sample_interval)
+                sampler.start()
+                try:
+                    result = fn()
+                finally:
+                    sampler.stop()
+                    sampler.write_folded(path)
+            logger.info(f"Profiled {label} ({mode}) in {time.perf_counter() - start:.3f}s: {path}")
+            return result, str(path)
+        finally:
+            self._busy.release()
+
+
+class MemoryTracker:
+    """tracemalloc baseline snapshots and diffs against them."""
+
+    def __init__(self, frames: int = 10):
+        self.frames = frames
+        self._lock = threading.Lock()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_at: Optional[float] = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Start tracing if needed and record the current allocations as the baseline."""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            self._baseline = self._take()
+            self._baseline_at = time.time()
+            current, peak = tracemalloc.get_traced_memory()
+        return {"tracing": True, "traced_bytes": current, "peak_bytes": peak}
+
+    def diff(self, limit: int = 25, group_by: str = "lineno") -> Dict[str, Any]:
+        """Allocation growth since the baseline, largest first."""
+        with self._lock:
+            if self._baseline is None:
+                raise RuntimeError("No baseline snapshot; take one first")
+            stats = self._take().compare_to(self._baseline, group_by)
+            current, peak = tracemalloc.get_traced_memory()
+            baseline_at = self._baseline_at
+        return {
+            "seconds_since_baseline": round(time.time() - (baseline_at or 0), 1),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "size_diff_bytes": sum(stat.size_diff for stat in stats),
+            "top": [
+                {
+                    "location": str(stat.traceback[0]) if stat.traceback else "?",
+                    "traceback": [str(frame) for frame in stat.traceback] if group_by == "traceback" else None,
+                    "size_diff_bytes": stat.size_diff,
+                    "size_bytes": stat.size,
+                    "count_diff": stat.count_diff
+                }
+                for stat in stats[:limit]
+            ]
+        }
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop tracing and drop the baseline (tracemalloc slows allocation)."""
+        with self._lock:
+            tracemalloc.stop()
+            self._baseline = None
+            self._baseline_at = None
+        return {"tracing": False}
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
@@ -0,0 +1,123 @@
+"""
+Sampled capture of production queries for replay and tuning.
+
+A sampled fraction of /design and /retrieve requests is recorded with the
+request body (prompt, filters, options), its timestamp, status, stage timings
+and the IDs it retrieved. Records are queued on the request path and written
+by a background thread to a JSON-lines file that rotates by size
+(queries.jsonl, queries.jsonl.1, ...), so capture never waits on disk. When
+the queue is full, records are dropped and counted instead.
+
+replay_queries.py re-issues captured traffic against any deployment.
+"""
+
+import json
+import time
+import queue
+import random
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Requests sent by replay_queries.py carry this header and are never captured
+REPLAY_HEADER = "X-Query-Replay"
+
+
+class QueryLog:
+    """Sample request records and append them to rotating JSON-lines files."""
+
+    def __init__(
+        self,
+        path: str = "data/query_log/queries.jsonl",
+        sample_rate: float = 0.0,
+        max_bytes: int = 50 * 2 ** 20,
+        backups: int = 5,
+        batch_size: int = 256,
+        flush_seconds: float = 1.0
+    ):
+        self.path = Path(path)
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=10000)
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def sampled(self) -> bool:
+        """Whether to capture the current request."""
+        return self.enabled and random.random() < self.sample_rate
+
+    def record(self, endpoint: str, request: Dict[str, Any], **fields: Any):
+        """Queue one request record; never blocks."""
+        entry = {"ts": round(time.time(), 3), "endpoint": endpoint, "request": request}
+        entry.update(fields)
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+            except Exception as e:
+                logger.warning(f"Query log write failed ({len(batch)} records): {e}")
+
+    def write(self, entries: List[Dict[str, Any]]):
+        """Append records, rotating the file first if it has reached max_bytes."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists() and self.path.stat().st_size >= self.max_bytes:
+            self._rotate()
+        with open(self.path, "a") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=str) + "\n")
+
+    def _rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                source.replace(self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backups > 0:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+
+def log_files(path: str) -> List[Path]:
+    """A query log and its rotated backups, oldest first."""
+    base = Path(path)
+    backups = sorted(
+        (p for p in base.parent.glob(f"{base.name}.*") if p.suffix[1:].isdigit()),
+        key=lambda p: int(p.suffix[1:]),
+        reverse=True
+    )
+    return backups + ([base] if base.exists() else [])
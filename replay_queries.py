@@ -0,0 +1,250 @@
+"""
+Replay captured queries (query_log.py) against a deployment and diff builds.
+
+replay: re-issues the captured /design and /retrieve requests against --url,
+either on the captured schedule (--speed 1 keeps the original gaps, 2 sends
+twice as fast) or back to back (--speed 0), and writes one record per
+request in the query-log format: status, total_ms, stages_ms and the
+retrieved IDs (chunk IDs for /retrieve, cited patents for /design).
+
+diff: compares two runs. Either side may be a replay output or the captured
+log itself, so "production vs new build" and "build A vs build B" work the
+same way. It reports latency percentiles per endpoint and, per query, how
+much the retrieved IDs overlap.
+
+    python replay_queries.py replay data/query_log/queries.jsonl --url http://staging:8000 --output benchmarks/replay_b.jsonl
+    python replay_queries.py diff benchmarks/replay_a.jsonl benchmarks/replay_b.jsonl
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from load_test import parse_server_timing, percentiles
+from query_log import REPLAY_HEADER, log_files
+
+
+def load_records(path: str) -> List[Dict[str, Any]]:
+    """Records from a query log (with its rotated backups) or a replay output."""
+    files = log_files(path) or [Path(path)]
+    records = []
+    for file in files:
+        with open(file) as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return sorted(records, key=lambda record: record.get("ts", 0.0))
+
+
+def response_ids(endpoint: str, body: Dict[str, Any]) -> List[str]:
+    if endpoint == "/retrieve":
+        return [chunk["chunk_id"] for chunk in body.get("chunks", [])]
+    return [citation.get("patent_number", "") for citation in body.get("citations", [])]
+
+
+def send(session: requests.Session, url: str, record: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """Issue one captured request and return its replay record."""
+    endpoint = record["endpoint"]
+    start = time.perf_counter()
+    result: Dict[str, Any] = {"ts": round(time.time(), 3), "endpoint": endpoint, "request": record["request"]}
+    try:
+        response = session.post(f"{url}{endpoint}", json=record["request"], headers={REPLAY_HEADER: "1"}, timeout=timeout)
+        result["status"] = response.status_code
+        result["stages_ms"] = parse_server_timing(response.headers.get("Server-Timing", ""))
+        result["stages_ms"].pop("total", None)
+        body = response.json() if response.status_code == 200 else {}
+        if endpoint == "/retrieve" and body:
+            result["stages_ms"] = body.get("timings_ms", result["stages_ms"])
+        result["ids"] = response_ids(endpoint, body)
+    except (requests.RequestException, ValueError) as e:
+        result["status"] = type(e).__name__
+        result["ids"] = []
+    result["total_ms"] = round((time.perf_counter() - start) * 1000.0, 2)
+    return result
+
+
+def replay(
+    records: List[Dict[str, Any]],
+    url: str,
+    speed: float,
+    concurrency: int,
+    timeout: float
+) -> List[Dict[str, Any]]:
+    """Send records in captured order; speed > 0 keeps their relative timing."""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(records)
+    local = threading.local()
+    first_ts = records[0].get("ts", 0.0) if records else 0.0
+    started = time.monotonic()
+
+    def run(index: int, record: Dict[str, Any], scheduled: float):
+        # How late the request goes out relative to its schedule (all workers busy)
+        lag = max(0.0, time.monotonic() - started - scheduled)
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        result = send(local.session, url, record, timeout)
+        result["lag_ms"] = round(lag * 1000.0, 1)
+        results[index] = result
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for index, record in enumerate(records):
+            scheduled = (record.get("ts", first_ts) - first_ts) / speed if speed > 0 else 0.0
+            delay = scheduled - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run, index, record, scheduled)
+    return [result for result in results if result is not None]
+
+
+def query_key(record: Dict[str, Any]) -> str:
+    return record["endpoint"] + " " + json.dumps(record["request"], sort_keys=True)
+
+
+def pair_records(
+    base: List[Dict[str, Any]],
+    other: List[Dict[str, Any]]
+) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Match identical requests between two runs (the n-th repeat with the n-th repeat)."""
+    pending: Dict[str, List[Dict[str, Any]]] = {}
+    for record in other:
+        pending.setdefault(query_key(record), []).append(record)
+    pairs = []
+    for record in base:
+        matches = pending.get(query_key(record))
+        if matches:
+            pairs.append((record, matches.pop(0)))
+    return pairs
+
+
+def id_overlap(a: List[str], b: List[str], k: int) -> float:
+    """Shared fraction of the top-k IDs (1.0 when both are empty)."""
+    a, b = a[:k], b[:k]
+    if not a and not b:
+        return 1.0
+    return len(set(a) & set(b)) / max(len(a), len(b))
+
+
+def diff(base: List[Dict[str, Any]], other: List[Dict[str, Any]], k: int) -> Dict[str, Any]:
+    """Latency and retrieved-ID differences between two runs, per endpoint."""
+    pairs = pair_records(base, other)
+    report: Dict[str, Any] = {"paired": len(pairs), "unpaired": len(base) - len(pairs), "endpoints": {}}
+    for endpoint in sorted({a["endpoint"] for a, _ in pairs}):
+        ok = [(a, b) for a, b in pairs if a["endpoint"] == endpoint and a.get("status") == 200 and b.get("status") == 200]
+        overlaps = [id_overlap(a.get("ids", []), b.get("ids", []), k) for a, b in ok]
+        top1 = [bool(a.get("ids")) and a["ids"][:1] == b.get("ids", [])[:1] for a, b in ok]
+        stages: Dict[str, Tuple[List[float], List[float]]] = {}
+        for a, b in ok:
+            for name, ms in a.get("stages_ms", {}).items():
+                if name in b.get("stages_ms", {}):
+                    stages.setdefault(name, ([], []))
+                    stages[name][0].append(ms)
+                    stages[name][1].append(b["stages_ms"][name])
+        worst = sorted(zip(overlaps, ok), key=lambda item: item[0])[:5]
+        report["endpoints"][endpoint] = {
+            "pairs": len([1 for a, _ in pairs if a["endpoint"] == endpoint]),
+            "both_ok": len(ok),
+            "errors": {
+                "base": sum(a["endpoint"] == endpoint and a.get("status") != 200 for a, _ in pairs),
+                "other": sum(a["endpoint"] == endpoint and b.get("status") != 200 for a, b in pairs)
+            },
+            "latency_ms": {
+                "base": percentiles([a["total_ms"] for a, _ in ok]),
+                "other": percentiles([b["total_ms"] for _, b in ok])
+            },
+            "stages_p50_ms": {
+                name: {"base": percentiles(base_ms)["p50"], "other": percentiles(other_ms)["p50"]}
+                for name, (base_ms, other_ms) in sorted(stages.items())
+            },
+            f"mean_overlap_at_{k}": round(sum(overlaps) / len(overlaps), 4) if overlaps else None,
+            "identical_ids": sum(a.get("ids") == b.get("ids") for a, b in ok),
+            "top1_agreement": round(sum(top1) / len(top1), 4) if top1 else None,
+            "least_overlap": [
+                {"prompt": a["request"].get("prompt", "")[:120], "overlap": round(overlap, 3),
+                 "base_ids": a.get("ids", [])[:5], "other_ids": b.get("ids", [])[:5]}
+                for overlap, (a, b) in worst if overlap < 1.0
+            ]
+        }
+    return report
+
+
+def print_diff(report: Dict[str, Any], k: int):
+    print(f"{report['paired']} requests paired ({report['unpaired']} without a match)")
+    for endpoint, stats in report["endpoints"].items():
+        base, other = stats["latency_ms"]["base"], stats["latency_ms"]["other"]
+        print(f"\n{endpoint}: {stats['both_ok']} ok in both, errors base={stats['errors']['base']} other={stats['errors']['other']}")
+        print(f"  {'':<14} {'p50':>9} {'p95':>9} {'p99':>9}")
+        print(f"  {'base ms':<14} {base['p50']:>9.0f} {base['p95']:>9.0f} {base['p99']:>9.0f}")
+        print(f"  {'other ms':<14} {other['p50']:>9.0f} {other['p95']:>9.0f} {other['p99']:>9.0f}")
+        for name, values in stats["stages_p50_ms"].items():
+            print(f"  {name:<14} {values['base']:>9.1f} {values['other']:>9.1f}  (stage p50)")
+        print(f"  overlap@{k}: {stats[f'mean_overlap_at_{k}']}, identical: {stats['identical_ids']}, "
+              f"top-1 agreement: {stats['top1_agreement']}")
+        for item in stats["least_overlap"]:
+            print(f"    {item['overlap']:.2f}  {item['prompt']}")
+
+
+def write_jsonl(path: str, records: List[Dict[str, Any]]):
+    output = Path(path)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Replay captured queries and diff latency and retrieval between builds")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rep = sub.add_parser("replay", help="Re-issue captured requests against a server")
+    rep.add_argument("log", type=str, help="Query log (rotated backups are included) or a previous replay output")
+    rep.add_argument("--url", type=str, default="http://localhost:8000")
+    rep.add_argument("--speed", type=float, default=1.0, help="Rate multiplier on the captured schedule; 0 = no pauses")
+    rep.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight")
+    rep.add_argument("--endpoint", type=str, choices=["/design", "/retrieve"], help="Only replay this endpoint")
+    rep.add_argument("--limit", type=int, help="Replay at most this many requests")
+    rep.add_argument("--timeout", type=float, default=120.0)
+    rep.add_argument("--output", type=str, default="benchmarks/replay.jsonl")
+    rep.add_argument("--compare", action="store_true", help="Diff the replay against the input afterwards")
+    rep.add_argument("--k", type=int, default=10, help="Depth for ID overlap")
+
+    dif = sub.add_parser("diff", help="Compare two runs (query logs or replay outputs)")
+    dif.add_argument("base", type=str)
+    dif.add_argument("other", type=str)
+    dif.add_argument("--k", type=int, default=10, help="Depth for ID overlap")
+    dif.add_argument("--output", type=str, help="Also write the diff as JSON")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        records = [r for r in load_records(args.log) if args.endpoint is None or r["endpoint"] == args.endpoint]
+        records = records[:args.limit] if args.limit else records
+        if not records:
+            print(f"No captured requests in {args.log}")
+            sys.exit(1)
+        span = records[-1].get("ts", 0.0) - records[0].get("ts", 0.0)
+        print(f"Replaying {len(records)} requests against {args.url} "
+              f"({'back to back' if args.speed <= 0 else f'{span / args.speed:.0f}s schedule'})")
+        results = replay(records, args.url.rstrip("/"), args.speed, args.concurrency, args.timeout)
+        write_jsonl(args.output, results)
+        ok = [r["total_ms"] for r in results if r["status"] == 200]
+        latency = percentiles(ok)
+        print(f"{len(ok)}/{len(results)} ok; p50 {latency['p50']:.0f} ms, p95 {latency['p95']:.0f} ms, "
+              f"max lag {max([r['lag_ms'] for r in results] + [0.0]):.0f} ms")
+        print(f"Results saved to: {args.output}")
+        if args.compare:
+            print_diff(diff(records, results, args.k), args.k)
+    else:
+        report = diff(load_records(args.base), load_records(args.other), args.k)
+        print_diff(report, args.k)
+        if args.output:
+            Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Resilience for upstream (OpenAI) calls: deadlines, hedged attempts and a
+circuit breaker.
+
+Every call gets a hard per-attempt timeout. If the first attempt is slower
+than the recent p95 latency, a second (hedged) attempt is started and
+whichever finishes first wins. A circuit breaker watches the error and
+slow-call rates over the last calls; once it trips, calls fail fast with
+CircuitOpenError so callers can degrade (skip expansion, BM25-only retrieval,
+fallback design) instead of queueing behind a slow upstream.
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
+
+import numpy as np
+
+import tracing
+from telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+breaker_state = metrics.gauge("circuit_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)")
+breaker_transitions = metrics.counter("circuit_breaker_transitions_total", "Circuit breaker state changes")
+upstream_calls = metrics.counter("upstream_calls_total", "Upstream calls by operation and outcome")
+upstream_hedges = metrics.counter("upstream_hedged_total", "Hedged (second) attempts started")
+upstream_seconds = metrics.histogram("upstream_call_seconds", "Upstream call latency, including hedging")
+degraded = metrics.counter("degraded_total", "Pipeline steps that fell back to a degraded mode")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the breaker is open."""
+
+
+class CircuitBreaker:
+    """Trip on high error or slow-call rate over a sliding window of calls.
+
+    closed -> open when, over the last `window` calls (at least `min_calls`),
+    the failure rate or the rate of calls slower than `slow_call_seconds`
+    reaches its threshold. After `open_seconds` one probe call is let through
+    (half-open); its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        slow_call_rate: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        window: int = 20,
+        min_calls: int = 10,
+        open_seconds: float = 30.0
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        breaker_state.set(0, breaker=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.open_seconds:
+                return "half_open"
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now."""
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open":
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    return False
+                self._transition("half_open")
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record(self, success: bool, seconds: float):
+        """Record the outcome of a call that allow() let through."""
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            if self._state == "half_open":
+                self._probe_in_flight = False
+                if success and not slow:
+                    self._outcomes.clear()
+                    self._transition("closed")
+                else:
+                    self._open()
+                return
+            self._outcomes.append((success, slow))
+            if self._state != "closed" or len(self._outcomes) < self.min_calls:
+                return
+            calls = len(self._outcomes)
+            failures = sum(1 for ok, _ in self._outcomes if not ok)
+            slow_calls = sum(1 for _, is_slow in self._outcomes if is_slow)
+            if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+                logger.warning(
+                    f"Circuit breaker {self.name} tripped: {failures}/{calls} failed, {slow_calls}/{calls} slow"
+                )
+                self._open()
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._transition("open")
+
+    def _transition(self, state: str):
+        if state != self._state:
+            self._state = state
+            breaker_state.set(BREAKER_STATES[state], breaker=self.name)
+            breaker_transitions.inc(breaker=self.name, state=state)
+            logger.info(f"Circuit breaker {self.name} is now {state}")
+
+
+class ResilientCaller:
+    """Run one kind of upstream call with a deadline, hedging and a breaker.
+
+    fn receives the per-attempt timeout in seconds and must enforce it (the
+    OpenAI client takes it as `timeout=`). A failed attempt is retried while
+    the deadline allows; with `hedge_after` set, a hedged attempt also starts
+    once the first has run longer than the recent p95 latency (or
+    `hedge_after` seconds until enough samples exist). At most `max_attempts`
+    run in total. Results of attempts that lose (or arrive after the
+    deadline) are closed if they have a close() method, so a hedged
+    streaming response does not keep its connection open.
+    """
+
+    def __init__(
+        self,
+        operation: str,
+        breaker: CircuitBreaker,
+        timeout: float,
+        hedge_after: Optional[float] = None,
+        max_attempts: int = 2,
+        hedge_quantile: float = 95.0
+    ):
+        self.operation = operation
+        self.breaker = breaker
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.max_attempts = max(1, max_attempts)
+        self.hedge_quantile = hedge_quantile
+        self._latencies: Deque[float] = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix=f"upstream-{operation}")
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging a slow attempt, or None when hedging is off."""
+        if self.hedge_after is None:
+            return None
+        with self._lock:
+            if len(self._latencies) < 20:
+                return self.hedge_after
+            return max(float(np.percentile(self._latencies, self.hedge_quantile)), 0.05)
+
+    def call(self, fn: Callable[[float], Any], timeout: Optional[float] = None) -> Any:
+        """Call fn through the breaker; raises CircuitOpenError or the last attempt's error."""
+        if not self.breaker.allow():
+            upstream_calls.inc(operation=self.operation, outcome="rejected")
+            raise CircuitOpenError(f"{self.breaker.name} circuit is open")
+
+        budget = min(self.timeout, timeout) if timeout is not None else self.timeout
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"openai.{self.operation}", timeout_seconds=round(budget, 3)):
+                result = self._run_attempts(fn, budget, start)
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            self.breaker.record(False, elapsed)
+            upstream_calls.inc(operation=self.operation, outcome="timeout" if isinstance(e, TimeoutError) else "error")
+            upstream_seconds.observe(elapsed, operation=self.operation)
+            raise
+        elapsed = time.perf_counter() - start
+        self.breaker.record(True, elapsed)
+        with self._lock:
+            self._latencies.append(elapsed)
+        upstream_calls.inc(operation=self.operation, outcome="success")
+        upstream_seconds.observe(elapsed, operation=self.operation)
+        return result
+
+    def _run_attempts(self, fn: Callable[[float], Any], budget: float, start: float) -> Any:
+        """Start attempts until one succeeds: a new one when the last failed or (if hedging) is slow."""
+        if self.max_attempts < 2:
+            return fn(budget)
+
+        delay = self.hedge_delay()
+        pending = {self._pool.submit(self._attempt(fn, 1), budget)}
+        attempts = 1
+        last_error: Optional[BaseException] = None
+        while pending:
+            remaining = budget - (time.perf_counter() - start)
+            if remaining <= 0:
+                break
+            can_hedge = delay is not None and attempts < self.max_attempts
+            done, pending = wait(pending, timeout=min(delay, remaining) if can_hedge else remaining, return_when=FIRST_COMPLETED)
+            failed = False
+            for future in done:
+                if future.exception() is None:
+                    self._discard((done | pending) - {future})
+                    return future.result()
+                last_error = future.exception()
+                failed = True
+            remaining = budget - (time.perf_counter() - start)
+            if attempts < self.max_attempts and remaining > 0 and (failed or (can_hedge and not done)):
+                attempts += 1
+                pending.add(self._pool.submit(self._attempt(fn, attempts, hedged=not failed), remaining))
+                if not failed:
+                    upstream_hedges.inc(operation=self.operation)
+        tracing.set_attributes(attempts=attempts)
+        self._discard(pending)
+        if last_error is not None and not pending:
+            raise last_error
+        raise TimeoutError(f"{self.operation} exceeded its {budget:.1f}s deadline")
+
+    def _discard(self, futures: Set[Future]):
+        """Close the results of attempts nobody will read, now or once they finish."""
+        for future in futures:
+            future.add_done_callback(self._close_result)
+
+    def _close_result(self, future: Future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        close = getattr(future.result(), "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.warning(f"Could not close an abandoned {self.operation} response: {e}")
+
+    @staticmethod
+    def _attempt(fn: Callable[[float], Any], number: int, hedged: bool = False) -> Callable[[float], Any]:
+        """fn as a traced attempt that keeps the caller's trace on the pool thread."""
+        def run(attempt_timeout: float) -> Any:
+            with tracing.span("attempt", number=number, hedged=hedged):
+                return fn(attempt_timeout)
+        return tracing.bind(run)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Breaker state and hedge delay for health reporting."""
+        delay = self.hedge_delay()
+        return {
+            "breaker": self.breaker.state,
+            "timeout_seconds": self.timeout,
+            "hedge_after_seconds": round(delay, 3) if delay is not None else None
+        }
+
+
+def record_degradation(stage: str, reason: str):
+    """Count a step that fell back to a degraded mode."""
+    degraded.inc(stage=stage, reason=reason)
+    logger.warning(f"Degraded {stage}: {reason}")
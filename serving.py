@@ -0,0 +1,444 @@
+"""
+Request-serving primitives shared by the API pipeline.
+"""
+
+import json
+import math
+import time
+import heapq
+import queue
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from telemetry import metrics
+
+logger = logging.getLogger(__name__)
+
+admission_in_flight = metrics.gauge("admission_in_flight", "Requests holding an admission slot")
+admission_queue_depth = metrics.gauge("admission_queue_depth", "Requests waiting for an admission slot")
+admission_wait = metrics.histogram("admission_queue_wait_seconds", "Time spent waiting for an admission slot")
+admission_rejected = metrics.counter("admission_rejected_total", "Requests turned away by admission control")
+
+
+class _Call:
+    """An in-progress call that concurrent callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running block and receive the same result (or exception). Nothing is
+    cached once the call finishes.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.shared_count = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn once for all concurrent callers using the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared_count += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            if call.waiters:
+                logger.debug(f"{self.name}: shared one result with {call.waiters} concurrent caller(s)")
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        """Number of distinct keys currently executing."""
+        with self._lock:
+            return len(self._calls)
+
+
+class _BatchRequest:
+    """Items submitted by one caller plus the slot its results come back in."""
+
+    def __init__(self, items: List[Any]):
+        self.items = items
+        self.done = threading.Event()
+        self.results: Optional[List[Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+class MicroBatcher:
+    """Merge work from concurrent callers into batched inference calls.
+
+    Callers block in submit(). A background thread takes the first waiting
+    request, keeps collecting for up to max_wait_ms or until max_batch items
+    are queued, runs batch_fn once over the concatenated items and scatters
+    the outputs back in order. A single request larger than max_batch is run
+    on its own rather than split.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch: int = 32,
+        max_wait_ms: float = 5.0,
+        name: str = "batcher"
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self._queue: "queue.Queue[_BatchRequest]" = queue.Queue()
+        self._carry: Optional[_BatchRequest] = None
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, items: List[Any]) -> List[Any]:
+        """Queue items for the next batch and wait for their results."""
+        if not items:
+            return []
+        self._ensure_worker()
+        request = _BatchRequest(list(items))
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results  # type: ignore[return-value]
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                self._worker.start()
+
+    def _next_batch(self) -> List[_BatchRequest]:
+        """Block for the first request, then gather more until the cap or timeout."""
+        first = self._carry if self._carry is not None else self._queue.get()
+        self._carry = None
+        batch = [first]
+        size = len(first.items)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if size + len(request.items) > self.max_batch:
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.items)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            flat = [item for request in batch for item in request.items]
+            try:
+                outputs = list(self.batch_fn(flat))
+                if len(outputs) != len(flat):
+                    raise RuntimeError(f"{self.name}: batch_fn returned {len(outputs)} results for {len(flat)} items")
+                offset = 0
+                for request in batch:
+                    request.results = outputs[offset:offset + len(request.items)]
+                    offset += len(request.items)
+            except BaseException as e:
+                logger.warning(f"{self.name}: batched call failed: {e}")
+                for request in batch:
+                    request.error = e
+            self.batches += 1
+            self.items += len(flat)
+            for request in batch:
+                request.done.set()
+
+
+class ComponentTracker:
+    """Record load state and timing of each pipeline component for /ready."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._components: Dict[str, Dict[str, Any]] = {}
+
+    def set(self, name: str, state: str, **details: Any):
+        """Set a component's state (pending, loading, ready, disabled, failed)."""
+        with self._lock:
+            entry = self._components.setdefault(name, {})
+            entry["state"] = state
+            entry.update(details)
+
+    @contextmanager
+    def track(self, name: str) -> Iterator[None]:
+        """Mark a component loading for the duration of the block."""
+        start = time.perf_counter()
+        self.set(name, "loading")
+        try:
+            yield
+        except BaseException as e:
+            self.set(name, "failed", seconds=round(time.perf_counter() - start, 3), error=str(e))
+            raise
+        with self._lock:
+            entry = self._components[name]
+            entry.setdefault("seconds", round(time.perf_counter() - start, 3))
+            if entry["state"] == "loading":
+                entry["state"] = "ready"
+
+    def state(self, name: str) -> Optional[str]:
+        """Current state of a component, or None if never registered."""
+        with self._lock:
+            entry = self._components.get(name)
+            return entry["state"] if entry else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Copy of all component entries."""
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._components.items()}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; carries the HTTP status and Retry-After."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded, prioritised wait queue.
+
+    At most max_concurrency requests run at once; up to max_queue more wait,
+    lower priority value first and FIFO within a priority. A full queue is
+    rejected immediately (429) and a request that waits longer than
+    queue_timeout is dropped (503), both with a Retry-After estimated from
+    recent service times. Runs on the event loop; not thread-safe.
+    """
+
+    PRIORITIES = {"interactive": 0, "batch": 1}
+
+    def __init__(self, name: str, max_concurrency: int = 4, max_queue: int = 32, queue_timeout: float = 10.0):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: List[Tuple[int, int, "asyncio.Future[None]", str]] = []
+        self._sequence = 0
+        self._service_seconds = 1.0
+        admission_in_flight.set(0, route=name)
+
+    def queued(self, priority: Optional[str] = None) -> int:
+        """Requests currently waiting (optionally for one priority class)."""
+        return sum(1 for _, _, future, name in self._waiters if not future.done() and priority in (None, name))
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free for a new request."""
+        backlog = self.queued() + 1
+        return max(1, math.ceil(self._service_seconds * backlog / self.max_concurrency))
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive") -> AsyncIterator[None]:
+        """Hold an execution slot for the enclosed block."""
+        await self.acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    async def acquire(self, priority: str = "interactive"):
+        """Wait for a slot; raises AdmissionRejected when saturated or the wait times out."""
+        if priority not in self.PRIORITIES:
+            priority = "interactive"
+        if self.try_acquire(priority):
+            return
+        if self.queued() >= self.max_queue:
+            admission_rejected.inc(route=self.name, reason="queue_full")
+            raise AdmissionRejected(429, f"{self.name} queue is full", self.retry_after())
+
+        future: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._sequence += 1
+        entry = (self.PRIORITIES[priority], self._sequence, future, priority)
+        heapq.heappush(self._waiters, entry)
+        self._report_queue()
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._give_back(future)
+            self._forget(entry)
+            admission_rejected.inc(route=self.name, reason="queue_timeout")
+            raise AdmissionRejected(503, f"{self.name} queue wait exceeded {self.queue_timeout:g}s", self.retry_after())
+        except asyncio.CancelledError:
+            # Client went away
+            self._give_back(future)
+            self._forget(entry)
+            raise
+        admission_wait.observe(time.monotonic() - started, route=self.name, priority=priority)
+        self._report_queue()
+
+    def try_acquire(self, priority: str = "interactive") -> bool:
+        """Take a slot only if one is free now and nobody is waiting for it."""
+        if self.active >= self.max_concurrency or self.queued():
+            return False
+        self._admit(priority if priority in self.PRIORITIES else "interactive", 0.0)
+        return True
+
+    def release(self, service_seconds: float):
+        """Free a slot, handing it straight to the next waiter if there is one."""
+        self._service_seconds += 0.2 * (service_seconds - self._service_seconds)
+        self.active -= 1
+        admission_in_flight.set(self.active, route=self.name)
+        self._wake_next()
+
+    def _admit(self, priority: str, waited: float):
+        self.active += 1
+        admission_in_flight.set(self.active, route=self.name)
+        admission_wait.observe(waited, route=self.name, priority=priority)
+
+    def _give_back(self, future: "asyncio.Future[None]"):
+        """Pass on a slot that was handed to a waiter which is no longer there."""
+        if future.done() and not future.cancelled():
+            self.active -= 1
+            admission_in_flight.set(self.active, route=self.name)
+            self._wake_next()
+
+    def _wake_next(self):
+        while self._waiters and self.active < self.max_concurrency:
+            _, _, future, _ = heapq.heappop(self._waiters)
+            if not future.done():
+                self.active += 1
+                admission_in_flight.set(self.active, route=self.name)
+                future.set_result(None)
+        self._report_queue()
+
+    def _forget(self, entry: Tuple[int, int, "asyncio.Future[None]", str]):
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+        self._report_queue()
+
+    def _report_queue(self):
+        for priority in self.PRIORITIES:
+            admission_queue_depth.set(self.queued(priority), route=self.name, priority=priority)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queued": {priority: self.queued(priority) for priority in self.PRIORITIES},
+            "max_queue": self.max_queue,
+            "service_seconds": round(self._service_seconds, 3)
+        }
+
+
+class Deadline:
+    """Latency budget for one request, consulted by each pipeline stage.
+
+    Stages that trade quality for time record what they gave up in
+    `degradations`, which is returned to the client.
+    """
+
+    def __init__(self, budget_seconds: float):
+        self.budget = budget_seconds
+        self.started = time.monotonic()
+        self.degradations: List[str] = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """Seconds left (negative once the budget is spent)."""
+        return self.budget - (time.monotonic() - self.started)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def degrade(self, step: str):
+        """Record that a step ran in a cheaper mode to stay within budget."""
+        with self._lock:
+            if step not in self.degradations:
+                self.degradations.append(step)
+
+
+class LatencyEstimator:
+    """Exponentially weighted moving average of stage latencies.
+
+    Units let a stage be tracked per item (e.g. seconds per rerank pair), so
+    the cost of a larger or smaller batch can be predicted.
+    """
+
+    def __init__(self, defaults: Dict[str, float], alpha: float = 0.2):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._estimates: Dict[str, float] = dict(defaults)
+
+    def observe(self, stage: str, seconds: float, units: int = 1):
+        if units <= 0:
+            return
+        value = seconds / units
+        with self._lock:
+            previous = self._estimates.get(stage)
+            self._estimates[stage] = value if previous is None else previous + self.alpha * (value - previous)
+
+    def estimate(self, stage: str, units: int = 1) -> float:
+        """Predicted seconds for `units` items of a stage (0 if unknown)."""
+        with self._lock:
+            return self._estimates.get(stage, 0.0) * units
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {stage: round(value, 4) for stage, value in self._estimates.items()}
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt for request de-duplication."""
+    return " ".join(prompt.lower().split())
+
+
+def request_key(
+    prompt: str,
+    filters: Optional[Dict[str, Any]] = None,
+    options: Optional[Dict[str, Any]] = None
+) -> str:
+    """Build a stable de-duplication key from a prompt, its filters and any result-changing options."""
+    normalized_filters = {
+        k: sorted(v, key=str) if isinstance(v, list) else v
+        for k, v in (filters or {}).items()
+    }
+    return json.dumps(
+        {"prompt": normalize_prompt(prompt), "filters": normalized_filters, "options": options or {}},
+        sort_keys=True,
+        default=str
+    )
@@ -0,0 +1,84 @@
+"""
+Helpers for streaming design briefs: SSE framing and incremental JSON parsing.
+"""
+
+import json
+import logging
+from typing import Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Format one Server-Sent Event frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class JSONSectionStream:
+    """Incrementally parse a streamed JSON object into its top-level members.
+
+    Text from the LLM is fed in arbitrary pieces. Every time a top-level
+    member (e.g. "modules": [...]) is complete it is returned from feed() as
+    a (key, value) pair, so callers can forward each section as soon as the
+    model has finished writing it. Leading prose or a ```json fence before
+    the opening brace is skipped.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start: Optional[int] = None
+        self.finished = False
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """Consume more text and return members completed by it."""
+        if self.finished or not text:
+            return []
+        self._buf += text
+        completed: List[Tuple[str, Any]] = []
+        buf = self._buf
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._member_start is None:
+                if ch == "{":
+                    self._depth = 1
+                    self._member_start = i + 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buf[self._member_start:i], completed)
+                    self.finished = True
+                    break
+            elif ch == "," and self._depth == 1:
+                self._emit(buf[self._member_start:i], completed)
+                self._member_start = i + 1
+            i += 1
+        self._pos = i
+        return completed
+
+    @staticmethod
+    def _emit(member_text: str, completed: List[Tuple[str, Any]]):
+        member_text = member_text.strip()
+        if not member_text:
+            return
+        try:
+            member = json.loads("{" + member_text + "}")
+        except json.JSONDecodeError as e:
+            logger.debug(f"Skipping unparsable streamed member: {e}")
+            return
+        completed.extend(member.items())
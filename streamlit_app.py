@@ -10,7 +10,7 @@ import streamlit as st
 import requests
 import json
 import time
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
@@ -114,6 +114,44 @@ def generate_design_image(user_prompt: str, design: Dict[str, Any], api_key: str
         result["error"] = str(exc)
     return result
 
+def stream_design(
+    api_url: str,
+    prompt: str,
+    filters: Optional[Dict[str, Any]],
+    on_event: Callable[[str, Any], None],
+    read_timeout: float = 60.0
+) -> Dict[str, Any]:
+    """Call /design/stream, forwarding each Server-Sent Event, and return the final brief."""
+    design: Optional[Dict[str, Any]] = None
+    # The read timeout applies between events, not to the whole generation;
+    # ask the API to reach its first generated section well within it
+    latency_budget_ms = int((read_timeout - 10) * 1000)
+    with requests.post(
+        f"{api_url}/design/stream",
+        json={"prompt": prompt, "filters": filters, "latency_budget_ms": latency_budget_ms},
+        stream=True,
+        timeout=(5, read_timeout)
+    ) as response:
+        response.raise_for_status()
+        event, data_lines = "message", []
+        for line in response.iter_lines(decode_unicode=True):
+            if line:
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data_lines.append(line[len("data:"):].strip())
+                continue
+            data = json.loads("\n".join(data_lines)) if data_lines else None
+            if event == "error":
+                raise RuntimeError(data.get("detail") if data else "stream failed")
+            if event == "design":
+                design = data
+            on_event(event, data)
+            event, data_lines = "message", []
+    if design is None:
+        raise RuntimeError("Stream ended before the design was complete")
+    return design
+
 # Configuration
 API_URL = os.getenv("API_URL", "http://localhost:8000")
 
@@ -705,16 +743,18 @@ if generate_clicked:
         # Generate design
         with st.spinner("Generating design..."):
             try:
-                response = requests.post(
-                    f"{api_url}/design",
-                    json={
-                        "prompt": prompt,
-                        "filters": filters
-                    },
-                    timeout=60
-                )
-                response.raise_for_status()
-                design = response.json()
+                progress = st.empty()
+
+                def show_progress(event: str, data: Any):
+                    if event == "retrieval":
+                        progress.info(f"Found {len(data['citations'])} relevant patents. Drafting design...")
+                    elif event == "section":
+                        progress.info(f"Drafted section: {data['name']}")
+
+                design = stream_design(api_url, prompt, filters, show_progress)
+                progress.empty()
+                if design.get("degradations"):
+                    st.info(f"Reduced quality to answer in time: {', '.join(design['degradations'])}")
 
                 # Store in session history
                 entry_id = f"{time.time_ns()}"
@@ -0,0 +1,259 @@
+"""
+Synthetic patent corpus for benchmarks.
+
+Generates patents with abstracts, claims and descriptions whose words follow a
+Zipf distribution over a controllable vocabulary: shared patent boilerplate,
+topic terms per CPC group and generated filler words. CPC groups and
+publication years are drawn from configurable distributions. Chunks come out
+in the same shape ingest.py writes to Chroma (ids, documents, metadatas), and
+synthetic_embeddings() gives topic-clustered unit vectors for them so vector
+search has realistic neighbourhoods. synthetic_queries() perturbs corpus
+vectors into query vectors.
+"""
+
+import math
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+BOILERPLATE = (
+    "the a of and to in for with said wherein comprising configured system method device apparatus "
+    "unit member portion plurality first second least one each assembly structure coupled arranged "
+    "provided includes including having position control signal frame support base body surface"
+).split()
+
+TOPIC_TERMS = {
+    "B25J": "robot arm manipulator gripper end-effector joint servo actuator trajectory grasp wrist kinematic payload teach pendant".split(),
+    "E04G": "scaffold formwork brick mortar bricklaying rebar tying concrete placing wall course shoring falsework".split(),
+    "E04B": "building wall panel floor roof beam column modular prefabricated facade insulation drywall stud".split(),
+    "E04C": "reinforcement steel bar girder truss precast slab element connector anchor lattice mesh".split(),
+    "B66C": "crane hoist boom jib trolley load cable winch lifting hook tower slewing outrigger".split(),
+    "E02D": "foundation pile sheet excavation retaining soil anchor caisson drilling grout underpinning".split(),
+    "E02F": "excavator bucket dredging digging loader grading trench hydraulic cylinder track backhoe".split(),
+}
+
+DEFAULT_CPC_WEIGHTS = {"B25J": 0.35, "E04G": 0.2, "E04B": 0.15, "E04C": 0.08, "B66C": 0.1, "E02D": 0.05, "E02F": 0.07}
+
+MECHANISM_TAGS = {
+    "actuator": ("actuator", "servo", "hydraulic", "cylinder"),
+    "sensor": ("sensor", "camera", "lidar", "encoder"),
+    "control": ("control", "controller", "signal", "trajectory"),
+    "gripper": ("gripper", "end-effector", "grasp"),
+    "safety": ("safety", "guard", "interlock"),
+}
+
+SYLLABLES = "ka ro mi ten sul va dor pex li tra mon gal sef ri bu zan hol qu ex fi nor ta ple vin".split()
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse "B25J=0.4,E04G=0.2" into a weight dict."""
+    weights = {}
+    for part in spec.split(","):
+        if "=" in part:
+            key, value = part.split("=", 1)
+            weights[key.strip()] = float(value)
+    return weights
+
+
+class SyntheticPatentGenerator:
+    """Reproducible synthetic patent chunks with controllable statistics.
+
+    vocab_size is the total number of distinct words (boilerplate + topic terms
+    + generated filler); zipf_s shapes word frequencies (higher = fewer common
+    words dominate). Each patent yields one abstract chunk, claims_per_patent
+    claim chunks and description_chunks description chunks.
+    """
+
+    def __init__(
+        self,
+        vocab_size: int = 50000,
+        zipf_s: float = 1.1,
+        cpc_weights: Optional[Dict[str, float]] = None,
+        year_min: int = 2000,
+        year_max: int = 2024,
+        year_growth: float = 0.08,
+        abstract_words: int = 110,
+        claim_words: int = 45,
+        description_words: int = 220,
+        claims_per_patent: int = 3,
+        description_chunks: int = 1,
+        topic_share: float = 0.25,
+        seed: int = 0
+    ):
+        self.rng = np.random.default_rng(seed)
+        weights = cpc_weights or DEFAULT_CPC_WEIGHTS
+        self.cpc_codes = [code for code in weights if code in TOPIC_TERMS]
+        probs = np.asarray([weights[code] for code in self.cpc_codes], dtype=np.float64)
+        self.cpc_probs = probs / probs.sum()
+        # Publication counts grow by year_growth per year, like the real corpus
+        self.years = np.arange(year_min, year_max + 1)
+        year_probs = (1.0 + year_growth) ** (self.years - year_min)
+        self.year_probs = year_probs / year_probs.sum()
+        self.abstract_words = abstract_words
+        self.claim_words = claim_words
+        self.description_words = description_words
+        self.claims_per_patent = claims_per_patent
+        self.description_chunks = description_chunks
+        self.topic_share = topic_share
+
+        topic_words = sorted({word for terms in TOPIC_TERMS.values() for word in terms})
+        fixed = list(dict.fromkeys(BOILERPLATE + topic_words))
+        filler = self._filler_words(max(0, vocab_size - len(fixed)))
+        self.vocab = np.asarray(fixed + filler, dtype=object)
+        ranks = np.arange(1, len(self.vocab) + 1, dtype=np.float64)
+        # Boilerplate takes the most frequent ranks; topic terms are mixed in per text at topic_share
+        word_probs = 1.0 / ranks ** zipf_s
+        self.word_cdf = np.cumsum(word_probs / word_probs.sum())
+
+    @property
+    def chunks_per_patent(self) -> int:
+        return 1 + self.claims_per_patent + self.description_chunks
+
+    def _filler_words(self, count: int) -> List[str]:
+        words = []
+        seen = set(BOILERPLATE)
+        n = 0
+        while len(words) < count:
+            syllables = []
+            value = n
+            for _ in range(2 + n % 3):
+                syllables.append(SYLLABLES[value % len(SYLLABLES)])
+                value //= len(SYLLABLES)
+            word = "".join(syllables) + (str(n // 5000) if n >= 5000 else "")
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+            n += 1
+        return words
+
+    def _text(self, n_words: int, cpc: str) -> str:
+        words = self.vocab[np.searchsorted(self.word_cdf, self.rng.random(n_words))]
+        topic = TOPIC_TERMS[cpc]
+        topical = self.rng.random(n_words) < self.topic_share
+        if topical.any():
+            words[topical] = np.asarray(topic, dtype=object)[self.rng.integers(0, len(topic), int(topical.sum()))]
+        # Sentences of ~15 words
+        out = []
+        for start in range(0, n_words, 15):
+            sentence = " ".join(words[start:start + 15])
+            out.append(sentence[:1].upper() + sentence[1:] + ".")
+        return " ".join(out)
+
+    def _length(self, mean: int) -> int:
+        return max(8, int(self.rng.normal(mean, mean * 0.25)))
+
+    @staticmethod
+    def _tags(text: str) -> List[str]:
+        lowered = text.lower()
+        return [tag for tag, words in MECHANISM_TAGS.items() if any(word in lowered for word in words)]
+
+    def patents(self, count: int, start: int = 0) -> List[Dict[str, Any]]:
+        """Patent records in ingest.py's shape (claims newline-separated)."""
+        cpcs = self.rng.choice(len(self.cpc_codes), size=count, p=self.cpc_probs)
+        years = self.rng.choice(self.years, size=count, p=self.year_probs)
+        patents = []
+        for i in range(count):
+            cpc = self.cpc_codes[cpcs[i]]
+            number = f"US{20000000 + start + i}"
+            topic = TOPIC_TERMS[cpc]
+            patents.append({
+                "patent_number": number,
+                "title": f"{topic[i % len(topic)].title()} {topic[(i // len(topic)) % len(topic)]} system",
+                "abstract": self._text(self._length(self.abstract_words), cpc),
+                "claims_text": "\n".join(
+                    f"{n}. " + self._text(self._length(self.claim_words), cpc) for n in range(1, self.claims_per_patent + 1)
+                ),
+                "description": " ".join(
+                    self._text(self._length(self.description_words), cpc) for _ in range(self.description_chunks)
+                ),
+                "cpc": [cpc],
+                "assignee": f"Synthetic Robotics {i % 97}",
+                "pub_year": int(years[i]),
+                "url": f"https://patentsview.org/patents/{number}"
+            })
+        return patents
+
+    def chunks(self, n_chunks: int) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+        """About n_chunks chunks as (ids, documents, metadatas), in Chroma's layout."""
+        ids: List[str] = []
+        documents: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        n_patents = math.ceil(n_chunks / self.chunks_per_patent)
+        batch = 1000
+        for start in range(0, n_patents, batch):
+            for patent in self.patents(min(batch, n_patents - start), start=start):
+                sections = [("abstract", "", patent["abstract"])]
+                sections += [("claims", str(n + 1), claim) for n, claim in enumerate(patent["claims_text"].split("\n"))]
+                if patent["description"]:
+                    words = patent["description"].split()
+                    size = math.ceil(len(words) / self.description_chunks)
+                    sections += [
+                        ("description", "", " ".join(words[k:k + size])) for k in range(0, len(words), size)
+                    ]
+                for position, (section, claim_no, text) in enumerate(sections):
+                    ids.append(f"{patent['patent_number']}_{section}_{claim_no or position}")
+                    documents.append(text)
+                    metadatas.append({
+                        "patent_number": patent["patent_number"],
+                        "section": section,
+                        "claim_no": claim_no,
+                        "cpc": ",".join(patent["cpc"]),
+                        "year": str(patent["pub_year"]),
+                        "mechanism_tags": ",".join(self._tags(text)),
+                        "figure_path": "",
+                        "title": patent["title"]
+                    })
+        return ids[:n_chunks], documents[:n_chunks], metadatas[:n_chunks]
+
+    def queries(self, count: int, words: int = 8) -> List[str]:
+        """Short topical queries like the design prompts users send."""
+        cpcs = self.rng.choice(len(self.cpc_codes), size=count, p=self.cpc_probs)
+        return [self._text(words, self.cpc_codes[c]).rstrip(".").lower() for c in cpcs]
+
+
+def synthetic_embeddings(
+    metadatas: Sequence[Dict[str, Any]],
+    dim: int = 384,
+    clusters_per_cpc: int = 16,
+    noise: float = 0.35,
+    seed: int = 0
+) -> np.ndarray:
+    """Unit float32 vectors clustered by CPC group and patent (chunks of one patent are close)."""
+    rng = np.random.default_rng(seed)
+    cpcs = sorted({meta["cpc"] for meta in metadatas})
+    centroids = rng.standard_normal((len(cpcs), clusters_per_cpc, dim)).astype(np.float32)
+    cpc_index = {cpc: i for i, cpc in enumerate(cpcs)}
+    out = np.empty((len(metadatas), dim), dtype=np.float32)
+    batch = 50000
+    for start in range(0, len(metadatas), batch):
+        metas = metadatas[start:start + batch]
+        rows = np.asarray([cpc_index[meta["cpc"]] for meta in metas])
+        # Chunks of one patent share a sub-cluster and a patent-specific offset
+        keys = [zlib.crc32(meta["patent_number"].encode("utf-8")) for meta in metas]
+        sub = np.asarray([key % clusters_per_cpc for key in keys])
+        offsets = np.empty((len(metas), dim), dtype=np.float32)
+        previous_key = None
+        for row, key in enumerate(keys):
+            # A patent's chunks are contiguous, so only regenerate on a new patent
+            if key != previous_key:
+                offset = np.random.default_rng(key).standard_normal(dim).astype(np.float32) * noise
+                previous_key = key
+            offsets[row] = offset
+        vectors = centroids[rows, sub] + offsets + 0.5 * noise * rng.standard_normal((len(metas), dim)).astype(np.float32)
+        out[start:start + len(metas)] = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return out
+
+
+def synthetic_queries(embeddings: np.ndarray, count: int, noise: float = 0.6, seed: int = 0) -> np.ndarray:
+    """Unit query vectors near random corpus rows: each row plus a random direction of length noise.
+
+    The perturbation is scaled to the vector, not per dimension, so a query's
+    similarity to its source row is the same at any embedding size.
+    """
+    rng = np.random.default_rng(seed)
+    sources = embeddings[rng.integers(0, len(embeddings), count)]
+    perturbation = rng.standard_normal(sources.shape).astype(np.float32)
+    perturbation *= noise / np.linalg.norm(perturbation, axis=1, keepdims=True)
+    queries = sources + perturbation
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
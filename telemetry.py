@@ -0,0 +1,258 @@
+"""
+Request-level timing and process-wide metrics for the design pipeline.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import tracing
+
+
+class StageTimer:
+    """Collect wall time, CPU time and item counts per pipeline stage for one request.
+
+    Stages may run on worker threads; repeated stages accumulate. CPU time is
+    that of the thread running the stage, so work handed to another thread
+    (micro-batcher, model server) shows up as wall time only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.cpu: Dict[str, float] = {}
+        self.counts: Dict[str, Dict[str, int]] = {}
+        # Set when the request joined an identical in-flight one (see merge)
+        self.coalesced = False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as the named stage (and trace it as a span)."""
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            with tracing.span(name):
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            cpu_elapsed = time.thread_time() - cpu_start
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed
+                self.cpu[name] = self.cpu.get(name, 0.0) + cpu_elapsed
+
+    def add(self, name: str, seconds: float):
+        """Add wall time measured outside stage() (e.g. across a generator's yields)."""
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name: str, **counts: int):
+        """Attach item counts (candidates, tokens, ...) to a stage."""
+        with self._lock:
+            entry = self.counts.setdefault(name, {})
+            for key, value in counts.items():
+                entry[key] = entry.get(key, 0) + int(value)
+
+    def merge(self, other: "StageTimer"):
+        """Take the stages of the request whose result this one shared (single-flight followers)."""
+        if other is self:
+            return
+        with other._lock:
+            stages, cpu = dict(other.stages), dict(other.cpu)
+            counts = {name: dict(entry) for name, entry in other.counts.items()}
+        with self._lock:
+            for name, seconds in stages.items():
+                self.stages[name] = self.stages.get(name, 0.0) + seconds
+            for name, seconds in cpu.items():
+                self.cpu[name] = self.cpu.get(name, 0.0) + seconds
+            for name, entry in counts.items():
+                mine = self.counts.setdefault(name, {})
+                for key, value in entry.items():
+                    mine[key] = mine.get(key, 0) + value
+            self.coalesced = True
+
+    def timings_ms(self) -> Dict[str, float]:
+        """Stage durations in milliseconds."""
+        with self._lock:
+            return {name: round(seconds * 1000.0, 2) for name, seconds in self.stages.items()}
+
+    def cpu_ms(self) -> Dict[str, float]:
+        """Stage CPU time in milliseconds."""
+        with self._lock:
+            return {name: round(seconds * 1000.0, 2) for name, seconds in self.cpu.items()}
+
+    def elapsed_ms(self) -> float:
+        """Milliseconds since the timer was created."""
+        return round((time.perf_counter() - self.started) * 1000.0, 2)
+
+    def server_timing(self) -> str:
+        """Stage durations as a Server-Timing header value."""
+        entries = [f"{name};dur={ms}" for name, ms in self.timings_ms().items()]
+        if self.coalesced:
+            entries.append('coalesced;desc="shared an identical in-flight request"')
+        entries.append(f"total;dur={self.elapsed_ms()}")
+        return ", ".join(entries)
+
+
+def _label_text(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class _Metric:
+    """One metric family; samples are keyed by sorted label pairs."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+
+    @staticmethod
+    def _key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def value(self, **labels: Any) -> float:
+        """Current value for a label set (0 if never set)."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(labels)} {value:g}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observations (e.g. seconds)."""
+
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            # [bucket counts..., +Inf count, sum]
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    bucket_labels = labels + (("le", f"{bound:g}"),)
+                    lines.append(f"{self.name}_bucket{_label_text(bucket_labels)} {count:g}")
+                lines.append(f"{self.name}_bucket{_label_text(labels + (('le', '+Inf'),))} {series[-2]:g}")
+                lines.append(f"{self.name}_count{_label_text(labels)} {series[-2]:g}")
+                lines.append(f"{self.name}_sum{_label_text(labels)} {series[-1]:g}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metric families, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get(self, cls, name: str, help_text: str, **kwargs: Any):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, help_text, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = Histogram.DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+ITEM_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+
+stage_seconds = metrics.histogram("pipeline_stage_seconds", "Wall time per pipeline stage")
+stage_cpu_seconds = metrics.histogram("pipeline_stage_cpu_seconds", "CPU time per pipeline stage")
+stage_items = metrics.histogram("pipeline_stage_items", "Items per pipeline stage (candidates, pairs, tokens)", buckets=ITEM_BUCKETS)
+request_seconds = metrics.histogram("pipeline_request_seconds", "End-to-end pipeline time per request")
+coalesced_requests = metrics.counter("pipeline_coalesced_requests_total", "Requests served by an identical in-flight request")
+
+
+def observe_stages(timer: StageTimer, route: str):
+    """Record a finished request's stage timings and counts in the metrics registry.
+
+    A coalesced request only counts end to end: its stages ran once, in the
+    request it joined, and were observed there.
+    """
+    request_seconds.observe(timer.elapsed_ms() / 1000.0, route=route)
+    if timer.coalesced:
+        coalesced_requests.inc(route=route)
+        return
+    cpu = timer.cpu_ms()
+    for stage, ms in timer.timings_ms().items():
+        stage_seconds.observe(ms / 1000.0, route=route, stage=stage)
+        stage_cpu_seconds.observe(cpu.get(stage, 0.0) / 1000.0, route=route, stage=stage)
+    for stage, counts in timer.counts.items():
+        for kind, value in counts.items():
+            stage_items.observe(value, route=route, stage=stage, kind=kind)
@@ -0,0 +1,63 @@
+"""BM25Postings scores against rank_bm25.BM25Okapi."""
+
+import numpy as np
+import pytest
+
+from bm25_index import BM25Postings
+
+rank_bm25 = pytest.importorskip("rank_bm25")
+
+
+def make_corpus(docs=200, seed=0):
+    rng = np.random.default_rng(seed)
+    vocab = [f"w{i}" for i in range(40)]
+    # Zipf-like term frequencies, so common terms get negative idf floored at epsilon
+    weights = 1.0 / np.arange(1, len(vocab) + 1)
+    weights /= weights.sum()
+    return [rng.choice(vocab, size=int(rng.integers(1, 30)), p=weights).tolist() for _ in range(docs)]
+
+
+QUERIES = [
+    ["w0"],
+    ["w1", "w7", "w30"],
+    ["w3", "w3", "w12"],  # repeated query terms count twice, as in BM25Okapi
+    ["unseen", "w5"],
+    [],
+]
+
+
+def test_scores_match_bm25okapi():
+    corpus = make_corpus()
+    reference = rank_bm25.BM25Okapi(corpus)
+    bm25 = BM25Postings(corpus)
+    for query in QUERIES:
+        np.testing.assert_allclose(bm25.get_scores(query), reference.get_scores(query), rtol=1e-5, atol=1e-5)
+    for token in ("w0", "w10", "w39"):
+        assert bm25.idf_of(token) == pytest.approx(reference.idf[token], rel=1e-5)
+    assert bm25.idf_of("unseen") == 0.0
+
+
+def test_scores_match_with_custom_parameters():
+    corpus = make_corpus(docs=50, seed=1)
+    reference = rank_bm25.BM25Okapi(corpus, k1=1.2, b=0.5, epsilon=0.1)
+    bm25 = BM25Postings(corpus, k1=1.2, b=0.5, epsilon=0.1)
+    for query in QUERIES:
+        np.testing.assert_allclose(bm25.get_scores(query), reference.get_scores(query), rtol=1e-5, atol=1e-5)
+
+
+def test_matrix_matches_single_queries():
+    bm25 = BM25Postings(make_corpus())
+    matrix = bm25.get_scores_matrix(QUERIES)
+    assert matrix.shape == (len(QUERIES), bm25.corpus_size)
+    for row, query in enumerate(QUERIES):
+        np.testing.assert_array_equal(matrix[row], bm25.get_scores(query))
+
+
+def test_save_and_load_round_trip(tmp_path):
+    corpus = make_corpus()
+    ids = [f"chunk{i}" for i in range(len(corpus))]
+    bm25 = BM25Postings(corpus)
+    bm25.save(tmp_path / "bm25.npz", ids)
+    loaded, loaded_ids = BM25Postings.load(tmp_path / "bm25.npz")
+    assert loaded_ids == ids
+    np.testing.assert_array_equal(loaded.get_scores_matrix(QUERIES), bm25.get_scores_matrix(QUERIES))
@@ -0,0 +1,31 @@
+"""ContextPacker trimming stays within its token allowance, gap markers included."""
+
+from context_builder import ContextPacker
+
+TEXT = " ".join(
+    f"Sentence {i} {'widget gear' if i % 2 == 0 else 'filler words here'} ends." for i in range(40)
+)
+
+
+class CharCounter:
+    """One token per character, so every "..." marker and join costs something."""
+
+    def count(self, text):
+        return len(text)
+
+
+def test_trim_fits_the_allowance_with_gap_markers():
+    packer = ContextPacker(CharCounter())
+    for allowance in range(5, 800):
+        text, tokens = packer._trim(TEXT, {"widget", "gear"}, allowance)
+        assert tokens == len(text)
+        assert tokens <= allowance
+
+
+def test_trim_keeps_relevant_sentences_in_order_and_marks_gaps():
+    packer = ContextPacker(CharCounter())
+    text, _ = packer._trim(TEXT, {"widget", "gear"}, 120)
+    assert "..." in text
+    kept = [int(part.split()[1]) for part in text.split(" ... ")]
+    assert kept == sorted(kept)
+    assert all(i % 2 == 0 for i in kept)
@@ -0,0 +1,154 @@
+"""Snapshot publish/rollback pointer swaps, pruning, BM25 loading and the reload watcher."""
+
+import pytest
+
+from bm25_index import BM25Postings
+from index_snapshot import (
+    BM25_FILE,
+    CURRENT_FILE,
+    PREVIOUS_FILE,
+    UNVERSIONED,
+    SnapshotWatcher,
+    create_snapshot,
+    current_name,
+    current_snapshot,
+    list_snapshots,
+    load_bm25,
+    previous_name,
+    prune,
+    publish,
+    rollback,
+)
+
+
+def build(index_dir, documents=("brick laying robot", "concrete printer", "tower crane")):
+    """A finished snapshot directory with BM25 postings, not yet published."""
+    snapshot = create_snapshot(index_dir)
+    BM25Postings([doc.split() for doc in documents]).save(snapshot / BM25_FILE, [f"c{i}" for i in range(len(documents))])
+    return snapshot
+
+
+def test_unversioned_index_has_no_pointer(tmp_path):
+    assert current_name(tmp_path) is None
+    assert current_snapshot(tmp_path) == (UNVERSIONED, tmp_path)
+
+
+def test_publish_swaps_current_and_previous(tmp_path):
+    first = publish(tmp_path, build(tmp_path), chunks=2)
+    assert (first, current_name(tmp_path), previous_name(tmp_path)) == ("v000001", "v000001", None)
+    second = publish(tmp_path, build(tmp_path))
+    assert (current_name(tmp_path), previous_name(tmp_path)) == (second, first)
+    assert current_snapshot(tmp_path) == (second, tmp_path / "snapshots" / second)
+    assert (tmp_path / CURRENT_FILE).read_text() == f"{second}\n"
+    assert not list(tmp_path.glob(".*.tmp"))
+    snapshots = list_snapshots(tmp_path)
+    assert [s["name"] for s in snapshots] == [first, second]
+    assert snapshots[0]["previous"] and snapshots[1]["current"] and snapshots[0]["chunks"] == 2
+
+
+def test_rollback_and_roll_forward(tmp_path):
+    first = publish(tmp_path, build(tmp_path))
+    second = publish(tmp_path, build(tmp_path))
+    assert rollback(tmp_path) == first
+    assert (current_name(tmp_path), previous_name(tmp_path)) == (first, second)
+    # Rolling back again returns to the version just replaced
+    assert rollback(tmp_path) == second
+    assert rollback(tmp_path, version=1) == first
+    assert (current_name(tmp_path), previous_name(tmp_path)) == (first, second)
+    # Pointing CURRENT at the version it already names changes nothing
+    assert rollback(tmp_path, version=1) == first
+    assert previous_name(tmp_path) == second
+
+
+def test_rollback_refuses_unknown_or_unpublished_versions(tmp_path):
+    with pytest.raises(ValueError):
+        rollback(tmp_path)
+    publish(tmp_path, build(tmp_path))
+    unpublished = build(tmp_path)
+    with pytest.raises(ValueError):
+        rollback(tmp_path, version=int(unpublished.name[1:]))
+    with pytest.raises(ValueError):
+        rollback(tmp_path, version=99)
+    assert current_name(tmp_path) == "v000001"
+
+
+def test_publish_rejects_foreign_directories(tmp_path):
+    with pytest.raises(ValueError):
+        publish(tmp_path, tmp_path / "elsewhere" / "v000001")
+
+
+def test_prune_keeps_current_previous_and_running_builds(tmp_path):
+    names = [publish(tmp_path, build(tmp_path), keep=10) for _ in range(4)]
+    rollback(tmp_path, version=1)
+    running = build(tmp_path)
+    removed = prune(tmp_path, keep=1)
+    # v000001 is CURRENT, v000004 is PREVIOUS and the newest; the unpublished build may still be writing
+    assert removed == names[1:3]
+    assert [s["name"] for s in list_snapshots(tmp_path)] == [names[0], names[3], running.name]
+
+
+def test_load_bm25_of_a_snapshot(tmp_path):
+    snapshot = build(tmp_path)
+    bm25, ids = load_bm25(snapshot, open_store=lambda: pytest.fail("a snapshot's postings are on disk"))
+    assert ids == ["c0", "c1", "c2"]
+    assert bm25.get_scores(["robot"])[0] > 0
+
+
+def test_load_bm25_raises_for_a_broken_snapshot(tmp_path):
+    snapshot = build(tmp_path)
+    (snapshot / BM25_FILE).write_bytes(b"not an npz file")
+    with pytest.raises(Exception):
+        load_bm25(snapshot, open_store=lambda: None)
+    (snapshot / BM25_FILE).unlink()
+    with pytest.raises(FileNotFoundError):
+        load_bm25(snapshot, open_store=lambda: None)
+
+
+class FakeStore:
+    def __init__(self, documents=None, error=None):
+        self.documents, self.error = documents or [], error
+
+    def get(self):
+        if self.error:
+            raise self.error
+        return {"ids": [f"c{i}" for i in range(len(self.documents))], "documents": self.documents}
+
+
+def test_load_bm25_builds_an_unversioned_index_from_its_store(tmp_path):
+    bm25, ids = load_bm25(tmp_path, lambda: FakeStore(["brick robot", "crane", "printer"]), versioned=False)
+    assert ids == ["c0", "c1", "c2"] and bm25.get_scores(["crane"])[1] > 0
+    assert load_bm25(tmp_path, lambda: FakeStore(error=RuntimeError("no store")), versioned=False) == (None, [])
+
+
+def test_watcher_loads_each_new_version_once(tmp_path):
+    loaded = []
+    watcher = SnapshotWatcher(tmp_path, lambda name, path: loaded.append((name, path)), interval=0)
+    assert not watcher.check()
+    first = publish(tmp_path, build(tmp_path))
+    assert watcher.check() and not watcher.check()
+    rollback_target = publish(tmp_path, build(tmp_path))
+    assert watcher.check()
+    rollback(tmp_path)
+    assert watcher.check()
+    assert [name for name, _ in loaded] == [first, rollback_target, first]
+    assert loaded[0][1] == tmp_path / "snapshots" / first
+
+
+def test_watcher_retries_a_failed_version_only_after_current_moves(tmp_path):
+    first = publish(tmp_path, build(tmp_path))
+    attempts = []
+
+    def on_change(name, path):
+        attempts.append(name)
+        if name != first:
+            raise RuntimeError("corrupt snapshot")
+    watcher = SnapshotWatcher(tmp_path, on_change, loaded=first, interval=0)
+    broken = publish(tmp_path, build(tmp_path))
+    assert not watcher.check() and not watcher.check() and not watcher.check()
+    assert attempts == [broken] and watcher.seen == first
+    rollback(tmp_path)
+    assert not watcher.check()
+    rollback(tmp_path)
+    assert not watcher.check()
+    assert attempts == [broken, broken]
+    assert (tmp_path / PREVIOUS_FILE).read_text().strip() == first
@@ -0,0 +1,49 @@
+"""ResilientCaller closes the responses of hedged attempts that lose."""
+
+import threading
+import time
+
+import pytest
+
+from resilience import CircuitBreaker, ResilientCaller
+
+
+class FakeStream:
+    def __init__(self, number):
+        self.number = number
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+
+def test_losing_hedged_stream_is_closed():
+    streams = []
+
+    def attempt(timeout):
+        stream = FakeStream(len(streams))
+        streams.append(stream)
+        time.sleep(0.3 if stream.number == 0 else 0.05)
+        return stream
+
+    caller = ResilientCaller("chat", CircuitBreaker("test_hedge"), timeout=2.0, hedge_after=0.05)
+    winner = caller.call(attempt)
+    assert winner.number == 1
+    assert streams[0].closed.wait(1.0)
+    assert not winner.closed.is_set()
+
+
+def test_attempts_finishing_after_the_deadline_are_closed():
+    streams = []
+
+    def attempt(timeout):
+        stream = FakeStream(len(streams))
+        streams.append(stream)
+        time.sleep(0.3)
+        return stream
+
+    caller = ResilientCaller("chat", CircuitBreaker("test_deadline"), timeout=2.0, hedge_after=0.05)
+    with pytest.raises(TimeoutError):
+        caller.call(attempt, timeout=0.15)
+    assert len(streams) == 2
+    assert all(stream.closed.wait(1.0) for stream in streams)
@@ -0,0 +1,121 @@
+"""AdmissionController slot accounting, hand-off and the in-flight gauge."""
+
+import asyncio
+
+import pytest
+
+from serving import AdmissionController, AdmissionRejected, admission_in_flight
+
+
+def in_flight(controller):
+    return admission_in_flight.value(route=controller.name)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_slots_up_to_max_concurrency_then_queue():
+    async def scenario():
+        controller = AdmissionController("t_queue", max_concurrency=2, max_queue=4, queue_timeout=1)
+        await controller.acquire()
+        await controller.acquire()
+        assert controller.active == 2 and in_flight(controller) == 2
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        assert controller.queued() == 1
+        controller.release(0.1)
+        await waiter
+        # The slot went straight to the waiter
+        assert controller.active == 2 and in_flight(controller) == 2
+        assert controller.queued() == 0
+    run(scenario())
+
+
+def test_interactive_waiters_go_before_batch():
+    async def scenario():
+        controller = AdmissionController("t_priority", max_concurrency=1, max_queue=4, queue_timeout=1)
+        await controller.acquire()
+        order = []
+
+        async def wait(priority):
+            await controller.acquire(priority)
+            order.append(priority)
+            controller.release(0.1)
+        tasks = [asyncio.create_task(wait("batch")), asyncio.create_task(wait("interactive"))]
+        await asyncio.sleep(0)
+        controller.release(0.1)
+        await asyncio.gather(*tasks)
+        assert order == ["interactive", "batch"]
+        assert controller.active == 0 and in_flight(controller) == 0
+    run(scenario())
+
+
+def test_full_queue_and_queue_timeout_are_rejected():
+    async def scenario():
+        controller = AdmissionController("t_reject", max_concurrency=1, max_queue=1, queue_timeout=0.05)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as full:
+            await controller.acquire()
+        assert full.value.status_code == 429 and full.value.retry_after >= 1
+        with pytest.raises(AdmissionRejected) as timed_out:
+            await waiter
+        assert timed_out.value.status_code == 503
+        assert controller.active == 1 and in_flight(controller) == 1
+        assert controller.queued() == 0
+    run(scenario())
+
+
+def test_give_back_frees_a_handed_over_slot():
+    async def scenario():
+        controller = AdmissionController("t_give_back", max_concurrency=2, max_queue=4, queue_timeout=1)
+        await controller.acquire()
+        await controller.acquire()
+        # A waiter that was handed a slot but is gone (timed out or disconnected) returns it
+        handed_over = asyncio.get_running_loop().create_future()
+        handed_over.set_result(None)
+        controller._give_back(handed_over)
+        assert controller.active == 1 and in_flight(controller) == 1
+        # A waiter that never got a slot has nothing to return
+        cancelled = asyncio.get_running_loop().create_future()
+        cancelled.cancel()
+        controller._give_back(cancelled)
+        assert controller.active == 1 and in_flight(controller) == 1
+    run(scenario())
+
+
+def test_cancelled_waiter_keeps_accounting_consistent():
+    async def scenario():
+        controller = AdmissionController("t_cancel", max_concurrency=1, max_queue=4, queue_timeout=1)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        # Hand the slot over and cancel the waiter before it resumes
+        controller.release(0.1)
+        waiter.cancel()
+        try:
+            await waiter
+            controller.release(0.1)
+        except asyncio.CancelledError:
+            pass
+        assert controller.active == 0 and in_flight(controller) == 0
+        await controller.acquire()
+        assert controller.active == 1 and in_flight(controller) == 1
+    run(scenario())
+
+
+def test_try_acquire_never_jumps_the_queue():
+    async def scenario():
+        controller = AdmissionController("t_try", max_concurrency=2, max_queue=4, queue_timeout=1)
+        assert controller.try_acquire("batch")
+        assert controller.try_acquire("batch")
+        assert not controller.try_acquire("batch")
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        controller.release(0.1)
+        assert not controller.try_acquire("batch")
+        await waiter
+        assert controller.active == 2 and in_flight(controller) == 2
+    run(scenario())
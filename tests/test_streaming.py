@@ -0,0 +1,62 @@
+"""JSONSectionStream fed in arbitrary pieces, down to one character at a time."""
+
+import json
+
+import pytest
+
+from streaming import JSONSectionStream, format_sse
+
+DESIGN = {
+    "overview": "A brick-laying arm, with a {curly} aside, commas, and a \"quoted\" word",
+    "modules": [{"name": "arm", "parts": ["base", "wrist"]}, {"name": "feeder", "parts": []}],
+    "safety": [{"risk": "Collision \\ pinch", "mitigation": "E-stop ]"}],
+    "bom": [],
+    "cost": 12.5,
+    "ready": True,
+    "notes": None,
+    "unicode": "Ø 12 mm — ±0.5 °C",
+}
+
+
+def stream(text, size):
+    parser = JSONSectionStream()
+    members = []
+    for start in range(0, len(text), size):
+        members.extend(parser.feed(text[start:start + size]))
+    return parser, members
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10000])
+def test_members_complete_in_order(size):
+    text = "Here is the brief:\n```json\n" + json.dumps(DESIGN, indent=2, ensure_ascii=False) + "\n```\n"
+    parser, members = stream(text, size)
+    assert members == list(DESIGN.items())
+    assert parser.finished
+
+
+def test_each_member_is_emitted_once_it_is_complete():
+    text = json.dumps(DESIGN)
+    parser = JSONSectionStream()
+    seen = []
+    for i, ch in enumerate(text):
+        for key, value in parser.feed(ch):
+            seen.append(key)
+            # A member is emitted at the comma (or brace) that closes it, never before
+            assert text[i] in ",}"
+            assert json.dumps(key) + ": " + json.dumps(value) in text[:i]
+    assert seen == list(DESIGN)
+
+
+def test_text_after_the_object_is_ignored():
+    parser = JSONSectionStream()
+    assert parser.feed('{"a": 1}') == [("a", 1)]
+    assert parser.feed(', "b": 2}') == []
+
+
+def test_unparsable_member_is_skipped():
+    _, members = stream('{"a": 1, "b": tru, "c": [1, 2]}', 1)
+    assert members == [("a", 1), ("c", [1, 2])]
+
+
+def test_format_sse():
+    assert format_sse("section", {"key": "bom"}) == 'event: section\ndata: {"key": "bom"}\n\n'
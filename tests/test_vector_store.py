@@ -0,0 +1,163 @@
+"""MmapVectorStore and IVFVectorStore search against brute force, and appends against a reload."""
+
+import numpy as np
+import pytest
+
+from vector_store import IVFVectorStore, MmapVectorStore
+
+DIM = 8
+ROWS = 300
+
+# (where clause, the same condition as a Python predicate over one row's metadata)
+FILTERS = [
+    (None, lambda meta: True),
+    ({"patent_number": "P3"}, lambda meta: meta["patent_number"] == "P3"),
+    ({"year": 2003}, lambda meta: meta["year"] == 2003),
+    ({"year": {"$gte": 2015}}, lambda meta: meta["year"] >= 2015),
+    ({"patent_number": {"$in": ["P1", "P5"]}}, lambda meta: meta["patent_number"] in ("P1", "P5")),
+    ({"$or": [{"patent_number": "P2"}, {"year": {"$lt": 2002}}]}, lambda meta: meta["patent_number"] == "P2" or meta["year"] < 2002),
+]
+
+
+def make_rows(n, start=0, seed=0):
+    rng = np.random.default_rng(seed + start)
+    ids = [f"c{start + i}" for i in range(n)]
+    vectors = rng.normal(size=(n, DIM)).astype(np.float32)
+    metadatas = [{"patent_number": f"P{(start + i) % 7}", "year": 2000 + (start + i) % 20} for i in range(n)]
+    return ids, vectors, [f"doc {doc_id}" for doc_id in ids], metadatas
+
+
+def brute_force(ids, vectors, metadatas, query, k, predicate):
+    dist = ((vectors - query) ** 2).sum(axis=1)
+    rows = [row for row in np.argsort(dist) if predicate(metadatas[row])][:k]
+    return [ids[row] for row in rows], dist[rows]
+
+
+@pytest.fixture
+def store(tmp_path):
+    # Blocks of 40 rows, so a scan merges top-k across several blocks
+    store = MmapVectorStore(str(tmp_path / "mmap"), reset=True, block_bytes=40 * 4 * DIM)
+    store.add(*make_rows(ROWS))
+    return store
+
+
+@pytest.mark.parametrize("where,predicate", FILTERS)
+def test_query_matches_brute_force(store, where, predicate):
+    ids, vectors, _, metadatas = make_rows(ROWS)
+    queries = np.random.default_rng(1).normal(size=(4, DIM)).astype(np.float32)
+    results = store.query(queries, n_results=10, where=where)
+    for query, result_ids, result_dist in zip(queries, results["ids"], results["distances"]):
+        expected_ids, expected_dist = brute_force(ids, vectors, metadatas, query, 10, predicate)
+        assert result_ids == expected_ids
+        np.testing.assert_allclose(result_dist, expected_dist, rtol=1e-4, atol=1e-4)
+
+
+def test_query_skips_deleted_rows(store):
+    ids, vectors, _, metadatas = make_rows(ROWS)
+    deleted = set(ids[::3])
+    store.delete(ids=sorted(deleted))
+    query = np.random.default_rng(2).normal(size=DIM).astype(np.float32)
+    expected_ids, _ = brute_force(ids, vectors, metadatas, query, 10, lambda meta: True)
+    result = store.query([query], n_results=10)["ids"][0]
+    assert not deleted & set(result)
+    live = [i for i, doc_id in enumerate(ids) if doc_id not in deleted]
+    expected_ids, _ = brute_force([ids[i] for i in live], vectors[live], [metadatas[i] for i in live], query, 10, lambda meta: True)
+    assert result == expected_ids
+    assert store.count() == ROWS - len(deleted)
+
+
+def test_get_by_ids_and_where(store):
+    got = store.get(ids=["c5", "missing", "c2"])
+    assert got["ids"] == ["c5", "c2"]
+    assert got["documents"] == ["doc c5", "doc c2"]
+    assert store.get(where={"patent_number": "P0"}, limit=3)["ids"] == ["c0", "c7", "c14"]
+
+
+def assert_same_state(store, reopened):
+    assert store.ids == reopened.ids
+    assert store.documents == reopened.documents
+    assert store.metadatas == reopened.metadatas
+    assert store.positions == reopened.positions
+    np.testing.assert_array_equal(store.live, reopened.live)
+    np.testing.assert_allclose(store.sq_norms, reopened.sq_norms)
+    assert store.vectors.shape == reopened.vectors.shape
+    for where, _ in FILTERS[1:]:
+        np.testing.assert_array_equal(store.filter.mask(where), reopened.filter.mask(where))
+    queries = np.random.default_rng(3).normal(size=(3, DIM)).astype(np.float32)
+    for where, _ in FILTERS:
+        assert store.query(queries, n_results=8, where=where)["ids"] == reopened.query(queries, n_results=8, where=where)["ids"]
+
+
+def apply_writes(store):
+    """Appends, upserts and deletes with the filter caches already built, as a live index sees them."""
+    store.filter.mask({"patent_number": {"$in": ["P1"]}})
+    store.filter.mask({"year": 2001})
+    store.add(*make_rows(25, start=ROWS))
+    ids, vectors, _, _ = make_rows(4, start=10, seed=9)
+    store.upsert(ids, vectors, [f"new {doc_id}" for doc_id in ids], [{"patent_number": "P9", "year": 2030}] * 4)
+    store.delete(ids=["c20", "c21", f"c{ROWS + 3}"])
+    # New field values and a field that changes type
+    store.add(["x1", "x2"], np.ones((2, DIM), dtype=np.float32), ["x1", "x2"], [{"patent_number": "PX"}, {"patent_number": 12345}])
+
+
+def test_append_matches_reload(store):
+    apply_writes(store)
+    assert_same_state(store, MmapVectorStore(str(store.path)))
+    assert store.get(ids=["c10"])["documents"] == ["new c10"]
+
+
+def test_append_to_empty_store(tmp_path):
+    store = MmapVectorStore(str(tmp_path / "mmap"), reset=True)
+    assert store.count() == 0
+    store.add(*make_rows(5))
+    store.add(*make_rows(5, start=5))
+    assert store.count() == 10
+    assert_same_state(store, MmapVectorStore(str(store.path)))
+
+
+def test_duplicate_ids_are_rejected(store):
+    ids, vectors, documents, metadatas = make_rows(2, start=ROWS)
+    with pytest.raises(ValueError):
+        store.upsert(ids * 2, np.concatenate([vectors, vectors]), documents * 2, metadatas * 2)
+
+
+def test_ivf_full_probe_matches_brute_force(tmp_path):
+    store = IVFVectorStore(str(tmp_path / "ivf"), reset=True, nprobe=8)
+    store.add(*make_rows(ROWS))
+    store.train(nlist=8)
+    ids, vectors, _, metadatas = make_rows(ROWS)
+    query = np.random.default_rng(4).normal(size=DIM).astype(np.float32)
+    for where, predicate in FILTERS:
+        expected_ids, _ = brute_force(ids, vectors, metadatas, query, 10, predicate)
+        assert store.query([query], n_results=10, where=where)["ids"][0] == expected_ids
+
+
+def test_ivf_append_matches_reload(tmp_path):
+    store = IVFVectorStore(str(tmp_path / "ivf"), reset=True, nprobe=8)
+    store.add(*make_rows(ROWS))
+    store.train(nlist=8)
+    apply_writes(store)
+    reopened = IVFVectorStore(str(store.path), nprobe=8)
+    assert_same_state(store, reopened)
+    np.testing.assert_array_equal(store.assign, reopened.assign)
+    np.testing.assert_array_equal(store.list_offsets, reopened.list_offsets)
+    np.testing.assert_array_equal(store.list_rows, reopened.list_rows)
+
+
+@pytest.mark.parametrize("codec,options", [("int8", {}), ("pq", {"subvectors": 4})])
+def test_codec_scan_with_rescoring(store, codec, options):
+    store.train_codec(codec, **options)
+    ids, vectors, _, metadatas = make_rows(ROWS)
+    query = np.random.default_rng(5).normal(size=DIM).astype(np.float32)
+    expected_ids, expected_dist = brute_force(ids, vectors, metadatas, query, 10, lambda meta: True)
+    # A shortlist of every row rescored with the stored vectors is exact
+    result = store.query([query], n_results=10, rescore=ROWS // 10)
+    assert result["ids"][0] == expected_ids
+    np.testing.assert_allclose(result["distances"][0], expected_dist, rtol=1e-4, atol=1e-4)
+    # Code distances alone approximate the exact ones
+    approximate = store.query([query], n_results=10, rescore=0)["ids"][0]
+    assert len(set(approximate) & set(expected_ids)) >= 5
+    apply_writes(store)
+    reopened = MmapVectorStore(str(store.path))
+    assert_same_state(store, reopened)
+    np.testing.assert_array_equal(store.codes, reopened.codes)
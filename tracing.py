@@ -0,0 +1,362 @@
+"""
+Lightweight request tracing with OpenTelemetry-compatible output.
+
+Spans are kept in a contextvar so nested stages and outbound calls attach to
+the request's trace; work handed to thread pools keeps its parent when the
+callable is wrapped with bind(). Finished spans are exported in the
+background as OTLP/JSON, either appended to a local JSON-lines file (one span
+per line) or posted to an OTLP/HTTP collector (`/v1/traces`).
+
+Configuration (read by configure_from_env):
+    TRACE_EXPORTER       none | jsonl | otlp (default none)
+    TRACE_SAMPLE_RATE    fraction of requests traced, 0..1 (default 1.0)
+    TRACE_FILE           JSON-lines path (default data/traces/spans.jsonl)
+    OTEL_EXPORTER_OTLP_ENDPOINT   collector base URL (default http://localhost:4318)
+    OTEL_SERVICE_NAME    service.name resource attribute
+
+Run `python tracing.py data/traces/spans.jsonl` to print the slowest traces
+as span trees.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import re
+import random
+import logging
+import argparse
+import threading
+import contextvars
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# W3C trace context: version-trace_id-parent_id-flags, lowercase hex ("ff" is an invalid version)
+TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(?:-.*)?$")
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("current_span", default=None)
+
+
+def _attribute_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = dict(attributes)
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        """Add or overwrite span attributes."""
+        self.attributes.update(attributes)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """The span as an OTLP/JSON span object."""
+        span: Dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": _attribute_value(value)}
+                for key, value in self.attributes.items() if value is not None
+            ],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Tracer:
+    """Create spans and export finished ones from a background thread."""
+
+    def __init__(
+        self,
+        exporter: str = "none",
+        sample_rate: float = 1.0,
+        trace_file: str = "data/traces/spans.jsonl",
+        otlp_endpoint: str = "http://localhost:4318",
+        service_name: str = "patent-design-api",
+        batch_size: int = 256,
+        flush_seconds: float = 1.0
+    ):
+        self.exporter = exporter
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.trace_file = Path(trace_file)
+        self.otlp_url = otlp_endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=100000)
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter in ("jsonl", "otlp") and self.sample_rate > 0
+
+    def sampled(self, traceparent: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Decide whether to trace a request; returns its trace/parent ids or None.
+
+        A valid W3C traceparent header from the caller is honoured, including its
+        sampled flag; otherwise the request is sampled at sample_rate.
+        """
+        if not self.enabled:
+            return None
+        match = TRACEPARENT.match(traceparent.strip()) if traceparent else None
+        # A malformed header is ignored; the request is then sampled as if it had none
+        if match and match.group(1) != "ff" and set(match.group(2)) != {"0"} and set(match.group(3)) != {"0"}:
+            if not int(match.group(4), 16) & 1:
+                return None
+            return {"trace_id": match.group(2), "parent_id": match.group(3)}
+        if random.random() >= self.sample_rate:
+            return None
+        return {"trace_id": "%032x" % random.getrandbits(128), "parent_id": None}
+
+    def finish(self, span: Span):
+        """Queue a finished span for export."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.export(batch)
+            except Exception as e:
+                logger.warning(f"Trace export failed ({len(batch)} spans): {e}")
+
+    def export(self, spans: List[Span]):
+        """Write spans to the configured exporter."""
+        if self.exporter == "jsonl":
+            self.trace_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.trace_file, "a") as f:
+                for span in spans:
+                    f.write(json.dumps(span.to_otlp()) + "\n")
+        elif self.exporter == "otlp":
+            import requests
+
+            payload = {
+                "resourceSpans": [{
+                    "resource": {"attributes": [
+                        {"key": "service.name", "value": {"stringValue": self.service_name}}
+                    ]},
+                    "scopeSpans": [{
+                        "scope": {"name": "patent-design"},
+                        "spans": [span.to_otlp() for span in spans]
+                    }]
+                }]
+            }
+            requests.post(self.otlp_url, json=payload, timeout=5).raise_for_status()
+
+
+tracer = Tracer()
+
+
+def configure_from_env() -> Tracer:
+    """Replace the module tracer with one configured from environment variables."""
+    global tracer
+    tracer = Tracer(
+        exporter=os.getenv("TRACE_EXPORTER", "none").lower(),
+        sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "1.0")),
+        trace_file=os.getenv("TRACE_FILE", "data/traces/spans.jsonl"),
+        otlp_endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318"),
+        service_name=os.getenv("OTEL_SERVICE_NAME", "patent-design-api")
+    )
+    if tracer.enabled:
+        logger.info(f"Tracing {tracer.sample_rate:.0%} of requests to {tracer.exporter}")
+    return tracer
+
+
+@contextmanager
+def trace(name: str, traceparent: Optional[str] = None, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Start a root span for a request if it is sampled; yields None otherwise."""
+    decision = tracer.sampled(traceparent)
+    if decision is None:
+        yield None
+        return
+    root = Span(name, decision["trace_id"], decision["parent_id"], attributes)
+    with _activate(root):
+        yield root
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Child span of the current span; a no-op yielding None outside a sampled trace."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace_id, parent.span_id, attributes)
+    with _activate(child):
+        yield child
+
+
+@contextmanager
+def _activate(current: Span) -> Iterator[Span]:
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        tracer.finish(current)
+
+
+def set_attributes(**attributes: Any):
+    """Add attributes to the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace_id if current is not None else None
+
+
+def bind(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap fn so it runs in the caller's trace context when called on another thread."""
+    context = contextvars.copy_context()
+    if context.get(_current_span) is None:
+        return fn
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+class TraceMiddleware:
+    """ASGI middleware opening a root span per HTTP request.
+
+    The span covers the whole response, including streamed bodies, honours an
+    incoming traceparent header and returns the trace id as X-Trace-Id.
+    """
+
+    def __init__(self, app: Any, skip_paths: Sequence[str] = ("/health", "/ready", "/metrics")):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        traceparent = headers.get(b"traceparent", b"").decode("latin-1") or None
+        with trace(f"{scope['method']} {scope['path']}", traceparent, **{
+            "http.method": scope["method"], "http.target": scope["path"]
+        }) as root:
+            if root is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_trace_id(message: Dict[str, Any]):
+                if message["type"] == "http.response.start":
+                    root.set(**{"http.status_code": message["status"]})
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-trace-id", root.trace_id.encode("latin-1"))
+                    ]
+                await send(message)
+            await self.app(scope, receive, send_with_trace_id)
+
+
+def summarize(path: str, slowest: int = 5):
+    """Print the slowest traces in a JSON-lines span file as indented trees."""
+    spans: Dict[str, List[Dict[str, Any]]] = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                spans.setdefault(record["traceId"], []).append(record)
+
+    def duration_ms(record: Dict[str, Any]) -> float:
+        return (int(record["endTimeUnixNano"]) - int(record["startTimeUnixNano"])) / 1e6
+
+    roots = []
+    for trace_id, records in spans.items():
+        ids = {record["spanId"] for record in records}
+        for record in records:
+            if record.get("parentSpanId") not in ids:
+                roots.append((duration_ms(record), trace_id, record))
+    roots.sort(key=lambda item: item[0], reverse=True)
+
+    for total, trace_id, root in roots[:slowest]:
+        children: Dict[str, List[Dict[str, Any]]] = {}
+        for record in spans[trace_id]:
+            children.setdefault(record.get("parentSpanId", ""), []).append(record)
+        print(f"trace {trace_id}  {total:.1f} ms")
+
+        def show(record: Dict[str, Any], depth: int):
+            attrs = ", ".join(
+                f"{a['key']}={next(iter(a['value'].values()))}" for a in record.get("attributes", [])
+            )
+            error = f"  ERROR {record['status'].get('message')}" if record.get("status", {}).get("code") == 2 else ""
+            print(f"  {'  ' * depth}{record['name']:<{40 - 2 * depth}} {duration_ms(record):>9.1f} ms  {attrs}{error}")
+            for child in sorted(children.get(record["spanId"], []), key=lambda r: int(r["startTimeUnixNano"])):
+                show(child, depth + 1)
+        show(root, 0)
+        print()
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Show the slowest traces from a JSON-lines span file")
+    parser.add_argument("path", nargs="?", default=os.getenv("TRACE_FILE", "data/traces/spans.jsonl"))
+    parser.add_argument("--slowest", type=int, default=5)
+    args = parser.parse_args()
+    if not Path(args.path).exists():
+        print(f"No span file at {args.path}", file=sys.stderr)
+        sys.exit(1)
+    summarize(args.path, args.slowest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Compressed vector codes for the mmap and ivf vector stores.
+
+A codec turns float32 embeddings into compact codes that stay in memory for
+the coarse search, while the full-precision vectors stay on disk
+(vectors.bin) and are read back only to rescore a shortlist:
+
+    int8     1 byte per dimension: per-dimension offset and scale
+             (scalar quantization), fitted on a sample with outliers clipped
+    pq       product quantization: the vector is split into subvectors and
+             each stored as the index of its nearest of 256 k-means
+             centroids, 1 byte per subvector (default dim / 8 of them, 32x
+             smaller than float32). Distances come from per-query lookup
+             tables (asymmetric distance computation).
+    matryoshka
+             the leading dims of each vector (default 256), renormalized.
+             Embeddings trained with Matryoshka representation learning,
+             such as OpenAI's text-embedding-3 models, keep most of their
+             ranking quality in a prefix. Distances are 2 - 2 x cosine
+             over the prefix.
+
+All codecs return approximate squared L2 distances so the stores can merge
+them like exact ones.
+
+There is deliberately no float16 codec: NumPy converts half floats to float32
+in software, so a float16 code scan measured about 6x slower than scanning
+float32, while int8 is half its size and as fast as float32.
+"""
+
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows per block when assigning vectors to centroids
+ASSIGN_BLOCK_ROWS = 16384
+
+# Codes are decoded this many bytes (as float32) at a time so the decoded block stays in cache
+DECODE_BLOCK_BYTES = 2 ** 20
+
+
+def _decode_rows(dim: int) -> int:
+    return max(1, DECODE_BLOCK_BYTES // (4 * dim))
+
+
+def _dot_codes(left: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """left @ codes.T in float32, converting the codes in cache-sized chunks."""
+    out = np.empty((len(left), len(codes)), dtype=np.float32)
+    step = _decode_rows(codes.shape[1])
+    for start in range(0, len(codes), step):
+        out[:, start:start + step] = left @ codes[start:start + step].astype(np.float32).T
+    return out
+
+
+def nearest_centroids(vectors: np.ndarray, centroids: np.ndarray, n: int = 1) -> np.ndarray:
+    """Indices of the n nearest centroids per vector, closest first (n=1: a flat array)."""
+    c_sq = np.einsum("ij,ij->i", centroids, centroids)
+    if n == 1:
+        labels = [
+            (c_sq[None, :] - 2.0 * (vectors[start:start + ASSIGN_BLOCK_ROWS] @ centroids.T)).argmin(axis=1)
+            for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS)
+        ]
+        return np.concatenate(labels).astype(np.int32) if labels else np.empty(0, dtype=np.int32)
+    dist = c_sq[None, :] - 2.0 * (vectors @ centroids.T)
+    nearest = np.argpartition(dist, n - 1, axis=1)[:, :n]
+    return np.take_along_axis(nearest, np.argsort(np.take_along_axis(dist, nearest, axis=1), axis=1), axis=1)
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means; returns k x dim float32 centroids."""
+    data = np.asarray(data, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = nearest_centroids(data, centroids)
+        counts = np.bincount(labels, minlength=k)
+        filled = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        sums = np.add.reduceat(data[np.argsort(labels, kind="stable")], starts, axis=0)
+        centroids[filled] = sums / counts[filled, None]
+        if not filled.all():
+            # Re-seed empty clusters from random points
+            centroids[~filled] = data[rng.choice(len(data), int((~filled).sum()), replace=False)]
+    return centroids
+
+
+class VectorCodec:
+    """Encode float32 vectors and compute approximate squared L2 distances on the codes."""
+
+    name = "base"
+
+    def train(self, sample: np.ndarray, seed: int = 0):
+        """Fit the codec's parameters on a sample of float32 vectors."""
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def row_terms(self, codes: np.ndarray) -> Optional[np.ndarray]:
+        """Per-row values distances() needs, precomputed at encode time (None if unused)."""
+        return None
+
+    def distances(self, queries: np.ndarray, codes: np.ndarray, row_terms: Optional[np.ndarray]) -> np.ndarray:
+        """Approximate squared L2 distances, queries x rows."""
+        raise NotImplementedError
+
+    def code_bytes(self, dim: int) -> int:
+        """Bytes per encoded vector."""
+        raise NotImplementedError
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Trained parameters, saved with np.savez."""
+        return {}
+
+    def load_state(self, state: Dict[str, np.ndarray]):
+        pass
+
+
+class Int8Codec(VectorCodec):
+    """Scalar quantization: each dimension mapped linearly onto 0..255."""
+
+    name = "int8"
+
+    def __init__(self, clip_percentile: float = 0.1):
+        self.clip_percentile = clip_percentile
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    def train(self, sample, seed=0):
+        low = np.percentile(sample, self.clip_percentile, axis=0)
+        high = np.percentile(sample, 100.0 - self.clip_percentile, axis=0)
+        self.offset = low.astype(np.float32)
+        self.scale = np.maximum((high - low) / 255.0, 1e-12).astype(np.float32)
+
+    def encode(self, vectors):
+        return np.clip(np.rint((vectors - self.offset) / self.scale), 0, 255).astype(np.uint8)
+
+    def decode(self, codes):
+        return self.offset + codes.astype(np.float32) * self.scale
+
+    def row_terms(self, codes):
+        scaled = codes.astype(np.float32) * self.scale
+        return np.einsum("ij,ij->i", scaled, scaled)
+
+    def distances(self, queries, codes, row_terms):
+        # |q - (offset + scale*c)|^2 = |q - offset|^2 - 2 ((q - offset) * scale) . c + |scale*c|^2
+        shifted = queries - self.offset
+        q_sq = np.einsum("ij,ij->i", shifted, shifted)[:, None]
+        return row_terms[None, :] - 2.0 * _dot_codes(shifted * self.scale, codes) + q_sq
+
+    def code_bytes(self, dim):
+        return dim
+
+    def state(self):
+        return {"offset": self.offset, "scale": self.scale}
+
+    def load_state(self, state):
+        self.offset = state["offset"]
+        self.scale = state["scale"]
+
+
+class ProductQuantizer(VectorCodec):
+    """Product quantization with 256 centroids per subvector (one byte each)."""
+
+    name = "pq"
+
+    def __init__(self, subvectors: int = 0, iterations: int = 10):
+        self.subvectors = subvectors
+        self.iterations = iterations
+        self.codebooks: Optional[np.ndarray] = None
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """rows x subvectors x subdim view."""
+        return vectors.reshape(len(vectors), self.codebooks.shape[0], self.codebooks.shape[2])
+
+    def train(self, sample, seed=0):
+        dim = sample.shape[1]
+        subvectors = self.subvectors or max(1, dim // 8)
+        if dim % subvectors:
+            raise ValueError(f"Dimension {dim} is not divisible into {subvectors} subvectors")
+        subdim = dim // subvectors
+        parts = sample.reshape(len(sample), subvectors, subdim)
+        codebooks = np.zeros((subvectors, 256, subdim), dtype=np.float32)
+        for j in range(subvectors):
+            centroids = kmeans(parts[:, j, :], 256, iterations=self.iterations, seed=seed + j)
+            codebooks[j, :len(centroids)] = centroids
+        self.codebooks = codebooks
+
+    def encode(self, vectors):
+        parts = self._split(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((len(vectors), self.codebooks.shape[0]), dtype=np.uint8)
+        for j, codebook in enumerate(self.codebooks):
+            codes[:, j] = nearest_centroids(np.ascontiguousarray(parts[:, j, :]), codebook)
+        return codes
+
+    def decode(self, codes):
+        subvectors = np.arange(self.codebooks.shape[0])
+        return self.codebooks[subvectors[None, :], codes].reshape(len(codes), -1)
+
+    def distances(self, queries, codes, row_terms):
+        parts = self._split(queries)
+        # Lookup tables: squared distance from each query subvector to each centroid
+        tables = (
+            np.einsum("qjd,qjd->qj", parts, parts)[:, :, None]
+            - 2.0 * np.einsum("qjd,jcd->qjc", parts, self.codebooks)
+            + np.einsum("jcd,jcd->jc", self.codebooks, self.codebooks)[None, :, :]
+        )
+        # Flattened (subvector, centroid) offsets so one take() gathers every table entry
+        offsets = np.arange(codes.shape[1], dtype=np.intp) * 256
+        out = np.empty((len(queries), len(codes)), dtype=np.float32)
+        step = _decode_rows(codes.shape[1])
+        for start in range(0, len(codes), step):
+            flat = codes[start:start + step].astype(np.intp) + offsets
+            for i, table in enumerate(tables):
+                out[i, start:start + step] = np.take(table.ravel(), flat).sum(axis=1)
+        return out
+
+    def code_bytes(self, dim):
+        return self.codebooks.shape[0] if self.codebooks is not None else max(1, dim // 8)
+
+    def state(self):
+        return {"codebooks": self.codebooks}
+
+    def load_state(self, state):
+        self.codebooks = state["codebooks"]
+
+
+class MatryoshkaCodec(VectorCodec):
+    """A truncated, renormalized low-dimension view of Matryoshka embeddings."""
+
+    name = "matryoshka"
+
+    def __init__(self, dims: int = 256):
+        self.dims = dims
+
+    def train(self, sample, seed=0):
+        if not 0 < self.dims < sample.shape[1]:
+            raise ValueError(f"Matryoshka dims must be between 1 and {sample.shape[1] - 1}, got {self.dims}")
+
+    def encode(self, vectors):
+        view = np.asarray(vectors, dtype=np.float32)[:, :self.dims]
+        return view / np.maximum(np.linalg.norm(view, axis=1, keepdims=True), 1e-12)
+
+    def distances(self, queries, codes, row_terms):
+        return 2.0 - 2.0 * (self.encode(queries) @ codes.T)
+
+    def code_bytes(self, dim):
+        return 4 * self.dims
+
+    def state(self):
+        return {"dims": np.asarray(self.dims)}
+
+    def load_state(self, state):
+        self.dims = int(state["dims"])
+
+
+VECTOR_CODECS = {codec.name: codec for codec in (Int8Codec, ProductQuantizer, MatryoshkaCodec)}
+
+
+def make_codec(name: str, **options) -> VectorCodec:
+    """A codec by name (int8, pq, matryoshka) with its constructor options."""
+    if name not in VECTOR_CODECS:
+        raise ValueError(f"Unknown vector codec: {name} (expected one of {', '.join(VECTOR_CODECS)})")
+    return VECTOR_CODECS[name](**options)
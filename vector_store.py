@@ -0,0 +1,761 @@
+"""
+Vector store backends for the chunk index.
+
+Both backends take and return data in Chroma's shapes (query results are
+lists per query embedding, distances are squared L2) so the retrieval code
+does not care which one is behind it:
+
+    chroma  the existing chromadb.PersistentClient collection (HNSW + SQLite)
+    mmap    exact search over a row-major matrix in a memory-mapped file
+            (float32, or float16 at half the size but a slower scan since
+            NumPy converts each block back to float32), scanned in blocks
+            with NumPy matmul.
+            Documents and metadata live in memory next to it and where
+            clauses are evaluated as NumPy masks. The file is opened
+            read-only, so API workers on one host share its pages through
+            the OS page cache.
+    ivf     the mmap layout plus an inverted file: k-means centroids
+            trained offline (train(), run by ingest.py) and the list each
+            row belongs to. A query scans only the rows of its nprobe
+            nearest lists, so latency grows with nprobe / nlist of the
+            corpus instead of all of it. Rows added after training are
+            assigned to their nearest centroid; retrain when the corpus
+            has drifted far from the one the centroids were trained on.
+
+mmap and ivf can also keep compressed codes of every row in memory
+(vector_codecs.py: int8, pq or a matryoshka prefix). Once
+train_codec() has run, the scan runs on the codes and picks rescore x k
+candidates per query. Those candidates are then re-ranked with the float32
+vectors read from vectors.bin, so only a few pages of that file need to be
+resident.
+
+Mmap index layout (one directory):
+    manifest.json   backend, dim, dtype, rows, codec and codec_options (ivf: nlist)
+    vectors.bin     rows x dim matrix, append-only (compact() rewrites it)
+    norms.npy       squared L2 norm of each stored row (float32)
+    live.npy        False for deleted rows (tombstones)
+    records.jsonl   one {"id", "document", "metadata"} per row, in row order
+    centroids.npy   ivf only: nlist x dim k-means centroids (float32)
+    assign.npy      ivf only: list number of each row
+    codec.npz       codec parameters (manifest "codec" names the codec)
+    codes.npy       encoded rows; code_terms.npy: per-row terms for distances
+"""
+
+import os
+import json
+import shutil
+import logging
+import importlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from vector_codecs import VectorCodec, kmeans, make_codec, nearest_centroids
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "construction_robotics_patents"
+
+VECTOR_BACKENDS = ("chroma", "mmap", "ivf")
+
+# Where the mmap and ivf backends live inside the index directory
+MMAP_SUBDIR = "mmap"
+IVF_SUBDIR = "ivf"
+
+# Filters matching less than this fraction of rows gather them; broader ones scan and mask
+SPARSE_FILTER_FRACTION = 0.1
+
+
+class VectorStore:
+    """Chunk store with vector search; results follow chromadb's layout."""
+
+    backend = "base"
+
+    def add(self, ids: List[str], embeddings: Sequence[Sequence[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def upsert(self, ids: List[str], embeddings: Sequence[Sequence[float]], documents: List[str], metadatas: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        raise NotImplementedError
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        **search_options: Any
+    ) -> Dict[str, Any]:
+        """Nearest chunks per query embedding: {"ids", "distances", "documents", "metadatas"}.
+
+        search_options are backend-specific knobs (nprobe for ivf); backends
+        without them ignore them.
+        """
+        raise NotImplementedError
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Chunks by id and/or where clause (all chunks when both are None)."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+
+class ChromaVectorStore(VectorStore):
+    """The chromadb collection the app has always used."""
+
+    backend = "chroma"
+
+    def __init__(self, path: str, collection_name: str = COLLECTION_NAME, reset: bool = False):
+        chromadb = importlib.import_module("chromadb")
+        Settings = getattr(importlib.import_module("chromadb.config"), "Settings")
+        self.client = chromadb.PersistentClient(path=str(path), settings=Settings(anonymized_telemetry=False))
+        if reset:
+            try:
+                self.client.delete_collection(collection_name)
+            except Exception:
+                pass
+            self.collection = self.client.create_collection(
+                name=collection_name,
+                metadata={"description": "Construction robotics patent documents"}
+            )
+        else:
+            self.collection = self.client.get_collection(collection_name)
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(ids=ids, where=where)
+
+    def query(self, query_embeddings, n_results=10, where=None, **search_options):
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results, where=where)
+
+    def get(self, ids=None, where=None, limit=None):
+        return self.collection.get(ids=ids, where=where, limit=limit)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+class MetadataFilter:
+    """Evaluate Chroma where clauses ($eq, $ne, $gt, $gte, $lt, $lte, $in, $nin,
+    $and, $or) as boolean masks over per-field metadata columns."""
+
+    def __init__(self, metadatas: List[Dict[str, Any]], rows: Optional[int] = None):
+        # The store appends to metadatas in place; a filter only ever sees its first rows
+        self.metadatas = metadatas
+        self.rows = len(metadatas) if rows is None else rows
+        self._columns: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._postings: Dict[str, Dict[str, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def column(self, field: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(values, present) arrays for one metadata field, built on first use."""
+        cached = self._columns.get(field)
+        if cached is not None:
+            return cached
+        with self._lock:
+            values, present = self._arrays([self.metadatas[row].get(field) for row in range(self.rows)])
+            self._columns[field] = (values, present)
+            return values, present
+
+    @staticmethod
+    def _arrays(raw: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+        present = np.asarray([value is not None for value in raw], dtype=bool)
+        known = [value for value in raw if value is not None]
+        if known and all(isinstance(value, str) for value in known):
+            values = np.asarray([value if value is not None else "" for value in raw], dtype=str)
+        elif known and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in known):
+            values = np.asarray([value if value is not None else 0 for value in raw], dtype=np.float64)
+        else:
+            values = np.asarray(raw, dtype=object)
+        return values, present
+
+    def postings(self, field: str) -> Dict[str, np.ndarray]:
+        """Rows per value of a string field, built on first use."""
+        cached = self._postings.get(field)
+        if cached is not None:
+            return cached
+        values, present = self.column(field)
+        with self._lock:
+            self._postings[field] = self._group(values, present)
+            return self._postings[field]
+
+    @staticmethod
+    def _group(values: np.ndarray, present: np.ndarray, offset: int = 0) -> Dict[str, np.ndarray]:
+        rows = np.flatnonzero(present)
+        order = rows[np.argsort(values[rows], kind="stable")]
+        keys, starts = np.unique(values[order], return_index=True)
+        return dict(zip(keys.tolist(), [group + offset for group in np.split(order, starts[1:])]))
+
+    def extended(self, count: int) -> "MetadataFilter":
+        """Filter that also covers the next count rows of metadatas, reusing the caches built so far.
+
+        Cached columns and postings grow by the new rows; a column whose new
+        values change its type is dropped and rebuilt on next use.
+        """
+        grown = MetadataFilter(self.metadatas, rows=self.rows + count)
+        for field, (values, present) in list(self._columns.items()):
+            new_values, new_present = self._arrays([self.metadatas[row].get(field) for row in range(self.rows, grown.rows)])
+            if not new_present.any():
+                new_values = np.full(count, {"U": "", "f": 0}.get(values.dtype.kind), dtype=values.dtype)
+            elif new_values.dtype.kind != values.dtype.kind:
+                continue
+            grown._columns[field] = (np.concatenate([values, new_values]), np.concatenate([present, new_present]))
+            if field in self._postings:
+                postings = dict(self._postings[field])
+                for key, rows in self._group(new_values, new_present, offset=self.rows).items():
+                    postings[key] = np.concatenate([postings[key], rows]) if key in postings else rows
+                grown._postings[field] = postings
+        return grown
+
+    def mask(self, where: Dict[str, Any]) -> np.ndarray:
+        result = np.ones(self.rows, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    result &= self.mask(clause)
+            elif key == "$or":
+                result &= np.logical_or.reduce([self.mask(clause) for clause in condition])
+            else:
+                result &= self._field_mask(key, condition)
+        return result
+
+    def _field_mask(self, field: str, condition: Any) -> np.ndarray:
+        values, present = self.column(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        result = present.copy()
+        for op, operand in condition.items():
+            if op == "$eq":
+                result &= values == operand
+            elif op == "$ne":
+                result &= values != operand
+            elif op == "$gt":
+                result &= values > operand
+            elif op == "$gte":
+                result &= values >= operand
+            elif op == "$lt":
+                result &= values < operand
+            elif op == "$lte":
+                result &= values <= operand
+            elif op == "$in" and values.dtype.kind == "U":
+                # A long $in (e.g. candidate patent numbers) is a postings lookup, not a scan
+                postings = self.postings(field)
+                hits = np.zeros(len(values), dtype=bool)
+                matches = [postings[value] for value in operand if value in postings]
+                if matches:
+                    hits[np.concatenate(matches)] = True
+                result &= hits
+            elif op == "$in":
+                result &= np.isin(values, list(operand))
+            elif op == "$nin":
+                result &= ~np.isin(values, list(operand))
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+        return result
+
+
+def _merge_top_k(
+    best_dist: np.ndarray,
+    best_rows: np.ndarray,
+    dist: np.ndarray,
+    rows: np.ndarray,
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the k smallest distances per query across the running best and a new block."""
+    dist = np.concatenate([best_dist, dist], axis=1)
+    rows = np.concatenate([best_rows, np.broadcast_to(rows, (dist.shape[0], len(rows)))], axis=1)
+    if dist.shape[1] > k:
+        keep = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        dist = np.take_along_axis(dist, keep, axis=1)
+        rows = np.take_along_axis(rows, keep, axis=1)
+    return dist, rows
+
+
+class MmapVectorStore(VectorStore):
+    """Exact nearest-neighbour search over a memory-mapped matrix."""
+
+    backend = "mmap"
+
+    def __init__(
+        self,
+        path: str,
+        dtype: str = "float32",
+        block_bytes: int = 64 * 2 ** 20,
+        reset: bool = False,
+        codec: Optional[str] = None,
+        rescore: int = 4
+    ):
+        self.path = Path(path)
+        self.block_bytes = block_bytes
+        self.rescore = rescore
+        self._write_lock = threading.Lock()
+        if reset and self.path.exists():
+            shutil.rmtree(self.path)
+        if not (self.path / "manifest.json").exists():
+            if not reset:
+                raise FileNotFoundError(f"No vector index at {self.path}")
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._write_manifest({"backend": self.backend, "format_version": 1, "dim": None, "dtype": dtype, "rows": 0,
+                                  "codec": codec})
+        self._load()
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        tmp = self.path / "manifest.json.tmp"
+        tmp.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp, self.path / "manifest.json")
+
+    def _load(self):
+        self.manifest = json.loads((self.path / "manifest.json").read_text())
+        self.dim = self.manifest["dim"]
+        self.dtype = np.dtype(self.manifest["dtype"])
+        rows = self.manifest["rows"]
+        if rows:
+            self.vectors = np.memmap(self.path / "vectors.bin", dtype=self.dtype, mode="r", shape=(rows, self.dim))
+            self.sq_norms = np.load(self.path / "norms.npy")[:rows]
+            self.live = np.load(self.path / "live.npy")[:rows]
+        else:
+            self.vectors = np.empty((0, self.dim or 0), dtype=self.dtype)
+            self.sq_norms = np.empty(0, dtype=np.float32)
+            self.live = np.empty(0, dtype=bool)
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        if rows:
+            with open(self.path / "records.jsonl") as f:
+                for line in f:
+                    if len(self.ids) == rows:
+                        break
+                    record = json.loads(line)
+                    self.ids.append(record["id"])
+                    self.documents.append(record["document"])
+                    self.metadatas.append(record["metadata"])
+        self.positions = {doc_id: row for row, doc_id in enumerate(self.ids) if self.live[row]}
+        self.filter = MetadataFilter(self.metadatas)
+        self.codec: Optional[VectorCodec] = None
+        self.codes: Optional[np.ndarray] = None
+        self.code_terms: Optional[np.ndarray] = None
+        if self.manifest.get("codec") and (self.path / "codec.npz").exists():
+            self.codec = make_codec(self.manifest["codec"], **self.manifest.get("codec_options", {}))
+            with np.load(self.path / "codec.npz") as state:
+                self.codec.load_state(dict(state))
+            self.codes = np.load(self.path / "codes.npy")[:rows]
+            if (self.path / "code_terms.npy").exists():
+                self.code_terms = np.load(self.path / "code_terms.npy")[:rows]
+
+    @property
+    def block_rows(self) -> int:
+        return max(1, self.block_bytes // (4 * max(1, self.dim or 1)))
+
+    def count(self) -> int:
+        return len(self.positions)
+
+    def add(self, ids, embeddings, documents, metadatas):
+        """Append chunks; ids already in the store are skipped, as in Chroma."""
+        with self._write_lock:
+            new = [i for i, doc_id in enumerate(ids) if doc_id not in self.positions]
+            if len(new) < len(ids):
+                logger.warning(f"Skipping {len(ids) - len(new)} ids already in the store")
+            self._append([ids[i] for i in new], np.asarray(embeddings, dtype=np.float32)[new],
+                         [documents[i] for i in new], [metadatas[i] for i in new])
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        """Replace existing ids (tombstone + append) and add new ones."""
+        with self._write_lock:
+            self._tombstone([self.positions[doc_id] for doc_id in ids if doc_id in self.positions])
+            self._append(list(ids), np.asarray(embeddings, dtype=np.float32), list(documents), list(metadatas))
+
+    def delete(self, ids=None, where=None):
+        with self._write_lock:
+            rows = self._select(ids, where)
+            self._tombstone(rows.tolist())
+            self._save_arrays(self.sq_norms, self.live)
+
+    def _tombstone(self, rows: List[int]):
+        if rows:
+            live = self.live.copy()
+            live[rows] = False
+            self.live = live
+            for row in rows:
+                self.positions.pop(self.ids[row], None)
+
+    def _append(self, ids: List[str], vectors: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]):
+        if not ids:
+            self._save_arrays(self.sq_norms, self.live)
+            return
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate ids in one add/upsert call")
+        if vectors.ndim != 2 or (self.dim is not None and vectors.shape[1] != self.dim):
+            raise ValueError(f"Embedding dimension {vectors.shape[-1]} does not match the index ({self.dim})")
+        stored = vectors.astype(self.dtype)
+        rows = self.manifest["rows"]
+        # Appending keeps existing pages valid for readers that still have the file mapped
+        with open(self.path / "vectors.bin", "r+b" if rows else "wb") as f:
+            f.seek(rows * self.dtype.itemsize * vectors.shape[1])
+            f.write(np.ascontiguousarray(stored).tobytes())
+        with open(self.path / "records.jsonl", "a" if rows else "w") as f:
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                f.write(json.dumps({"id": doc_id, "document": document, "metadata": metadata}) + "\n")
+        norms = np.einsum("ij,ij->i", stored.astype(np.float32), stored.astype(np.float32))
+        sq_norms = np.concatenate([self.sq_norms, norms])
+        live = np.concatenate([self.live, np.ones(len(ids), dtype=bool)])
+        if self.codec is not None:
+            new_codes = self.codec.encode(vectors)
+            new_terms = self.codec.row_terms(new_codes)
+            codes = np.concatenate([self.codes, new_codes])
+            terms = None if new_terms is None else new_terms if self.code_terms is None else np.concatenate([self.code_terms, new_terms])
+            self._save_codes(codes, terms=terms)
+        self._save_arrays(sq_norms, live)
+        manifest = dict(self.manifest, dim=int(vectors.shape[1]), rows=rows + len(ids))
+        self._write_manifest(manifest)
+
+        # Extend the loaded state with the new rows rather than re-reading the whole index
+        self.manifest = manifest
+        self.dim = manifest["dim"]
+        self.vectors = np.memmap(self.path / "vectors.bin", dtype=self.dtype, mode="r", shape=(manifest["rows"], self.dim))
+        self.sq_norms = sq_norms
+        if self.codec is not None:
+            self.codes, self.code_terms = codes, terms
+        self.ids.extend(ids)
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+        self.filter = self.filter.extended(len(ids))
+        self.live = live
+        self.positions.update(zip(ids, range(rows, manifest["rows"])))
+
+    def _save_arrays(self, sq_norms: np.ndarray, live: np.ndarray):
+        np.save(self.path / "norms.npy", sq_norms.astype(np.float32))
+        np.save(self.path / "live.npy", live)
+
+    def _save_codes(self, codes: np.ndarray, terms: Optional[np.ndarray] = None):
+        """Write codes and, for codecs that have them, their row terms."""
+        np.save(self.path / "codes.npy", codes)
+        if terms is not None:
+            np.save(self.path / "code_terms.npy", terms.astype(np.float32))
+
+    def train_codec(self, codec: Optional[str] = None, sample_rows: int = 50000, seed: int = 0, **options: Any):
+        """Fit a codec (default: the manifest's) on a sample of live rows and encode every row."""
+        with self._write_lock:
+            name = codec or self.manifest.get("codec")
+            if not name:
+                raise ValueError("No codec configured for this index")
+            live_rows = np.flatnonzero(self.live)
+            if not len(live_rows):
+                raise ValueError("Cannot train a codec on an empty index")
+            rng = np.random.default_rng(seed)
+            sample = np.sort(rng.choice(live_rows, size=min(len(live_rows), sample_rows), replace=False))
+            trained = make_codec(name, **options)
+            trained.train(np.asarray(self.vectors[sample], dtype=np.float32), seed=seed)
+            codes, terms = [], []
+            for start in range(0, len(self.ids), self.block_rows):
+                block_codes = trained.encode(np.asarray(self.vectors[start:start + self.block_rows], dtype=np.float32))
+                codes.append(block_codes)
+                terms.append(trained.row_terms(block_codes))
+            np.savez(self.path / "codec.npz", **trained.state())
+            (self.path / "code_terms.npy").unlink(missing_ok=True)
+            self.code_terms = None
+            self._save_codes(np.concatenate(codes), terms=None if terms[0] is None else np.concatenate(terms))
+            self._write_manifest(dict(self.manifest, codec=name, codec_options=options))
+            self._load()
+            logger.info(f"Encoded {len(self.ids)} rows with the {name} codec "
+                        f"({trained.code_bytes(self.dim)} bytes per row, float32 is {4 * self.dim})")
+
+    def _select(self, ids: Optional[List[str]], where: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Live rows matching ids and where, in ids order when ids are given."""
+        if ids is not None:
+            rows = np.asarray([self.positions[doc_id] for doc_id in ids if doc_id in self.positions], dtype=np.int64)
+            if where:
+                rows = rows[self.filter.mask(where)[rows]]
+            return rows
+        mask = self.live & self.filter.mask(where) if where else self.live
+        return np.flatnonzero(mask)
+
+    def get(self, ids=None, where=None, limit=None):
+        rows = self._select(ids, where)
+        if limit is not None:
+            rows = rows[:limit]
+        return {
+            "ids": [self.ids[row] for row in rows],
+            "documents": [self.documents[row] for row in rows],
+            "metadatas": [self.metadatas[row] for row in rows]
+        }
+
+    def query(self, query_embeddings, n_results=10, where=None, rescore=None, **search_options):
+        """Exact top-k, or with a trained codec a code scan rescored from disk (rescore x k candidates)."""
+        queries = self._queries(query_embeddings)
+        dist, rows = self._search(queries, n_results, self._mask(where), rescore)
+        return self._results(dist, rows)
+
+    def _queries(self, query_embeddings: Sequence[Sequence[float]]) -> np.ndarray:
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if self.dim is not None and queries.shape[1] != self.dim:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match the index ({self.dim})")
+        return queries
+
+    def _mask(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Rows a query may return (live and matching where), or None for all rows."""
+        if where or not self.live.all():
+            return self.live & self.filter.mask(where) if where else self.live
+        return None
+
+    @staticmethod
+    def _is_sparse(mask: Optional[np.ndarray]) -> bool:
+        return mask is not None and mask.sum() < len(mask) * SPARSE_FILTER_FRACTION
+
+    def _search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        mask: Optional[np.ndarray] = None,
+        rescore: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k squared L2 distances over all rows, or the rows where mask is True."""
+        if self._is_sparse(mask):
+            # Few matches: gather just those rows instead of scanning everything
+            return self._scan(queries, k, candidates=np.flatnonzero(mask), rescore=rescore)
+        return self._scan(queries, k, mask=mask, rescore=rescore)
+
+    def _scan(
+        self,
+        queries: np.ndarray,
+        k: int,
+        candidates: Optional[np.ndarray] = None,
+        mask: Optional[np.ndarray] = None,
+        rescore: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k over the candidate rows (all rows when None), skipping rows outside mask.
+
+        Without codes the scan is exact. With codes it returns the best
+        rescore x k by code distance, re-ranked with the stored vectors;
+        rescore=0 returns the code distances as they are.
+        """
+        if self.codes is None:
+            return self._block_scan(queries, k, candidates, mask, self._vector_distances)
+        rescore = self.rescore if rescore is None else rescore
+        if rescore <= 0:
+            return self._block_scan(queries, k, candidates, mask, self._code_distances)
+        _, shortlist = self._block_scan(queries, k * rescore, candidates, mask, self._code_distances)
+        return self._rerank(queries, shortlist, k)
+
+    def _vector_distances(self, queries: np.ndarray, rows: np.ndarray, index: Any) -> np.ndarray:
+        q_sq = np.einsum("ij,ij->i", queries, queries)[:, None]
+        # No copy for float32 storage; float16 blocks are converted here
+        return self.sq_norms[rows][None, :] - 2.0 * (queries @ np.asarray(self.vectors[index], dtype=np.float32).T) + q_sq
+
+    def _code_distances(self, queries: np.ndarray, rows: np.ndarray, index: Any) -> np.ndarray:
+        return self.codec.distances(queries, self.codes[index], None if self.code_terms is None else self.code_terms[index])
+
+    def _rerank(self, queries: np.ndarray, shortlist: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact distances for each query's shortlisted rows, best k first."""
+        dists, rows = [], []
+        for query, candidates in zip(queries, shortlist):
+            candidates = np.sort(candidates)
+            dist = self._vector_distances(query[None, :], candidates, candidates)[0]
+            order = np.argsort(dist)[:k]
+            dists.append(dist[order])
+            rows.append(candidates[order])
+        return np.asarray(dists), np.asarray(rows)
+
+    def _block_scan(self, queries, k, candidates, mask, distances) -> Tuple[np.ndarray, np.ndarray]:
+        """Blocked top-k with distances(queries, rows, index) computed per block."""
+        total = len(self.ids) if candidates is None else len(candidates)
+        k = min(k, total if mask is None else int(mask.sum()))
+        best_dist = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        if k <= 0:
+            return best_dist, best_rows
+        for start in range(0, total, self.block_rows):
+            if candidates is None:
+                rows = np.arange(start, min(start + self.block_rows, total))
+                dist = distances(queries, rows, slice(start, start + len(rows)))
+            else:
+                rows = candidates[start:start + self.block_rows]
+                dist = distances(queries, rows, rows)
+            if mask is not None:
+                dist[:, ~mask[rows]] = np.inf
+            best_dist, best_rows = _merge_top_k(best_dist, best_rows, dist, rows, k)
+        order = np.argsort(best_dist, axis=1)
+        return np.take_along_axis(best_dist, order, axis=1), np.take_along_axis(best_rows, order, axis=1)
+
+    def compact(self, order: Optional[np.ndarray] = None):
+        """Rewrite the index without deleted rows, optionally in a new row order."""
+        with self._write_lock:
+            self._rewrite(np.flatnonzero(self.live) if order is None else order)
+
+    def _rewrite(self, order: np.ndarray):
+        # New files are swapped in whole, so open readers keep their old mapping
+        if self.codes is not None:
+            self._save_codes(self.codes[order], terms=None if self.code_terms is None else self.code_terms[order])
+        with open(self.path / "vectors.bin.tmp", "wb") as f:
+            for start in range(0, len(order), self.block_rows):
+                f.write(np.ascontiguousarray(self.vectors[order[start:start + self.block_rows]]).tobytes())
+        with open(self.path / "records.jsonl.tmp", "w") as f:
+            for row in order:
+                f.write(json.dumps({"id": self.ids[row], "document": self.documents[row], "metadata": self.metadatas[row]}) + "\n")
+        os.replace(self.path / "vectors.bin.tmp", self.path / "vectors.bin")
+        os.replace(self.path / "records.jsonl.tmp", self.path / "records.jsonl")
+        self._save_arrays(self.sq_norms[order], np.ones(len(order), dtype=bool))
+        self._write_manifest(dict(self.manifest, rows=int(len(order))))
+        self._load()
+
+    def _results(self, dist: Sequence[np.ndarray], rows: Sequence[np.ndarray]) -> Dict[str, Any]:
+        return {
+            "ids": [[self.ids[row] for row in query_rows] for query_rows in rows],
+            "distances": [np.maximum(query_dist, 0.0).tolist() for query_dist in dist],
+            "documents": [[self.documents[row] for row in query_rows] for query_rows in rows],
+            "metadatas": [[self.metadatas[row] for row in query_rows] for query_rows in rows]
+        }
+
+
+class IVFVectorStore(MmapVectorStore):
+    """Approximate search over the mmap layout with an inverted file of k-means lists."""
+
+    backend = "ivf"
+
+    def __init__(
+        self,
+        path: str,
+        dtype: str = "float32",
+        block_bytes: int = 64 * 2 ** 20,
+        reset: bool = False,
+        codec: Optional[str] = None,
+        rescore: int = 4,
+        nprobe: int = 16,
+        nlist: Optional[int] = None
+    ):
+        self.nprobe = nprobe
+        self.nlist = nlist
+        super().__init__(path, dtype=dtype, block_bytes=block_bytes, reset=reset, codec=codec, rescore=rescore)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _load(self):
+        super()._load()
+        self.centroids: Optional[np.ndarray] = None
+        if not self.manifest.get("nlist") or not (self.path / "centroids.npy").exists():
+            return
+        self.centroids = np.load(self.path / "centroids.npy")
+        rows = len(self.ids)
+        assign_path = self.path / "assign.npy"
+        assign = np.load(assign_path)[:rows] if assign_path.exists() else np.empty(0, dtype=np.int32)
+        if len(assign) < rows:
+            # Rows appended after the last save: put them in their nearest list
+            assign = np.concatenate([assign, self._assign_rows(len(assign), rows)])
+        self.assign = assign
+        counts = np.bincount(assign, minlength=len(self.centroids))
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.list_rows = np.argsort(assign, kind="stable")
+
+    def _assign_rows(self, start: int, stop: int) -> np.ndarray:
+        labels = [
+            nearest_centroids(np.asarray(self.vectors[first:min(first + self.block_rows, stop)], dtype=np.float32), self.centroids)
+            for first in range(start, stop, self.block_rows)
+        ]
+        return np.concatenate(labels) if labels else np.empty(0, dtype=np.int32)
+
+    def _append(self, ids, vectors, documents, metadatas):
+        start = len(self.ids)
+        super()._append(ids, vectors, documents, metadatas)
+        if self.trained and len(self.ids) > start:
+            # New rows go to the end of their nearest list; rows stay ascending within each list
+            labels = self._assign_rows(start, len(self.ids))
+            order = np.argsort(labels, kind="stable")
+            self.list_rows = np.insert(self.list_rows, self.list_offsets[labels[order] + 1], start + order)
+            self.assign = np.concatenate([self.assign, labels])
+            counts = np.bincount(self.assign, minlength=len(self.centroids))
+            self.list_offsets = np.concatenate([[0], np.cumsum(counts)])
+            np.save(self.path / "assign.npy", self.assign)
+
+    def _rewrite(self, order):
+        if self.trained:
+            np.save(self.path / "assign.npy", self.assign[order])
+        super()._rewrite(order)
+
+    def train(self, nlist: Optional[int] = None, iterations: int = 10, sample_per_list: int = 32, seed: int = 0):
+        """Cluster the live rows with k-means and regroup the index by list.
+
+        nlist defaults to 4 * sqrt(rows). Centroids are fitted on a sample of
+        sample_per_list rows per list; every row is then assigned to its
+        nearest centroid and the file rewritten so each list is contiguous.
+        """
+        with self._write_lock:
+            live_rows = np.flatnonzero(self.live)
+            if not len(live_rows):
+                raise ValueError("Cannot train an empty index")
+            nlist = min(nlist or self.nlist or int(4 * np.sqrt(len(live_rows))), len(live_rows))
+            rng = np.random.default_rng(seed)
+            sample = np.sort(rng.choice(live_rows, size=min(len(live_rows), nlist * sample_per_list), replace=False))
+            self.centroids = kmeans(np.asarray(self.vectors[sample], dtype=np.float32), nlist, iterations=iterations, seed=seed)
+            labels = self._assign_rows(0, len(self.ids))
+            self.assign = labels
+            np.save(self.path / "centroids.npy", self.centroids)
+            self.manifest = dict(self.manifest, nlist=int(nlist))
+            self._rewrite(live_rows[np.argsort(labels[live_rows], kind="stable")])
+            sizes = np.diff(self.list_offsets)
+            logger.info(f"Trained IVF index: {nlist} lists over {len(live_rows)} rows "
+                        f"(list size median {int(np.median(sizes))}, max {int(sizes.max())})")
+
+    def query(self, query_embeddings, n_results=10, where=None, nprobe=None, rescore=None, **search_options):
+        """Top-k from the nprobe nearest lists per query (exact until trained)."""
+        queries = self._queries(query_embeddings)
+        mask = self._mask(where)
+        if not self.trained or self._is_sparse(mask):
+            # Selective filters leave few rows: exact search over them is cheaper than probing
+            dist, rows = self._search(queries, n_results, mask, rescore)
+            return self._results(dist, rows)
+        nlist = len(self.centroids)
+        nprobe = max(1, min(nprobe or self.nprobe, nlist))
+        nearest = nearest_centroids(queries, self.centroids, nlist)
+        dists, rows = [], []
+        for query, lists in zip(queries, nearest):
+            probe = nprobe
+            while True:
+                candidates = self._list_members(lists[:probe])
+                if mask is not None:
+                    candidates = candidates[mask[candidates]]
+                # A filter can empty the probed lists; widen until k matches or every list is probed
+                if len(candidates) >= n_results or probe >= nlist:
+                    break
+                probe = min(nlist, probe * 2)
+            query_dist, query_rows = self._scan(query[None, :], n_results, candidates=candidates, rescore=rescore)
+            dists.append(query_dist[0])
+            rows.append(query_rows[0])
+        return self._results(dists, rows)
+
+    def _list_members(self, lists: np.ndarray) -> np.ndarray:
+        """Rows in the given lists, in file order."""
+        members = [self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists]
+        return np.sort(np.concatenate(members))
+
+
+def open_vector_store(backend: str, index_dir: Path, reset: bool = False, **options: Any) -> VectorStore:
+    """Open (or with reset=True, recreate) the chunk store of the given backend under index_dir.
+
+    For mmap and ivf, dtype="float16" only halves vectors.bin on disk: every
+    block is converted back to float32 as it is scanned, which measured about
+    10x slower than float32 at 100k chunks (benchmarks/vector_store.json). It
+    pays off only behind a codec, where just the rescored rows are read; to
+    save memory, use codec="int8" instead.
+    """
+    if backend == "chroma":
+        return ChromaVectorStore(str(index_dir), reset=reset)
+    if backend == "mmap":
+        return MmapVectorStore(str(Path(index_dir) / MMAP_SUBDIR), reset=reset, **options)
+    if backend == "ivf":
+        return IVFVectorStore(str(Path(index_dir) / IVF_SUBDIR), reset=reset, **options)
+    raise ValueError(f"Unknown vector store backend: {backend} (expected one of {', '.join(VECTOR_BACKENDS)})")